@@ -0,0 +1,743 @@
+# ****************************************************************************
+# * powercollector.benchmark                                                 *
+# * Runs powercollector end to end against emulated endpoints and records    *
+# * wall time, round trips and memory                                        *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import argparse to parse command line arguments
+import argparse
+
+# Import gzip to read the host from a capture file
+import gzip
+
+# Import contextlib and io to keep the OS-level console output out of the results
+import contextlib
+import io
+
+# Import JSON to record the results
+import json
+
+# Import socket to find a free port for the emulated LPAR
+import socket
+
+# Import statistics for the median command latency
+import statistics
+
+# Import logging to quiet paramiko's own logger, failed handshakes are expected in some scenarios
+import logging
+
+# Import os to use file functions
+import os
+
+# Import subprocess to run powercollector as the user would
+import subprocess
+
+# Import sys to find the running interpreter
+import sys
+
+# Import tempfile to run each benchmark in a scratch folder
+import tempfile
+
+# Import time to measure wall time
+import time
+
+# Import zipfile to read the run report from powercollector's archive
+import zipfile
+
+# Import date to timestamp the results
+from datetime import datetime
+
+# Import pathlib to work with paths
+from pathlib import Path
+
+from fakehmc import FakeHMC
+from fakelink import FakeLink
+from fakelpar import start_farm
+from fakessh import parse_command_latency
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+# The OS-level benchmark runs powercollector's functions in this process
+sys.path.insert(0, str(REPO_DIR))
+
+
+def powercollector_command(exe):
+    # Either the frozen executable or the script run by the current interpreter
+    if exe:
+        return [str(exe)]
+    return [sys.executable, str(REPO_DIR / "powercollector.py")]
+
+
+def read_run_report(work_dir):
+    """
+    : Finds RunReport.json in the output folder or in the archive powercollector leaves in the working directory
+    """
+    for zip_file in Path(work_dir).glob("*.zip"):
+        with zipfile.ZipFile(zip_file) as archive:
+            for name in archive.namelist():
+                if name.endswith("RunReport.json"):
+                    return json.loads(archive.read(name))
+    for report in Path(work_dir).rglob("*RunReport.json"):
+        return json.loads(report.read_text())
+    return None
+
+
+def record_result(results_file, result):
+    with open(results_file, "a") as file:
+        file.write(json.dumps(result) + "\n")
+
+
+def print_result(result):
+    for key, value in result.items():
+        if isinstance(value, dict):
+            continue
+        print(f"{key:>28}: {value}")
+
+
+def run_hmc_benchmark(args):
+    hmc = FakeHMC(
+        systems=args.systems,
+        lpars=args.lpars,
+        vios=args.vios,
+        events=args.events,
+        invalid_attributes=[
+            item for item in args.invalid_attributes.split(",") if item
+        ],
+        invalid_parameters=[
+            item for item in args.invalid_parameters.split(",") if item
+        ],
+        latency=args.latency,
+        command_latency=parse_command_latency(args.command_latency),
+        capacity=args.capacity,
+        max_channels=args.max_channels,
+        legacy=args.legacy,
+    ).start()
+    with tempfile.TemporaryDirectory() as work_dir:
+        command = (
+            powercollector_command(args.exe)
+            + [
+                "--hmc",
+                "127.0.0.1",
+                "--port",
+                str(hmc.port),
+                "--user",
+                hmc.user,
+                "--password",
+                hmc.password,
+                "--hmconly",
+                # HMC Scanner is a separate Java program, keep it out of the measurement
+                "--hmcscanpath",
+                str(Path(work_dir) / "NoHMCScanner"),
+                "--output",
+                str(Path(work_dir) / "output"),
+                "--memtrace",
+            ]
+            + args.extra
+        )
+        os.makedirs(Path(work_dir) / "output", exist_ok=True)
+        started = time.time()
+        process = subprocess.run(
+            command,
+            cwd=work_dir,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+        )
+        wall_time = time.time() - started
+        report = read_run_report(work_dir) or {}
+    hmc.stop()
+    stats = hmc.stats()
+    memory = report.get("memory", {}).get("phases", [])
+    result = {
+        "benchmark": "hmc",
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "systems": args.systems,
+        "lpars_per_system": args.lpars,
+        "events": args.events,
+        "latency": args.latency,
+        "exit_code": process.returncode,
+        "wall_time": round(wall_time, 3),
+        "round_trips": stats["round_trips"],
+        "connections": stats["connections"],
+        "bytes_from_hmc": stats["bytes_sent"],
+        "peak_rss": max((phase["peak_rss"] or 0 for phase in memory), default=None),
+        "traced_peak": max((phase["traced_peak"] for phase in memory), default=None),
+        "round_trips_by_command": stats["round_trips_by_command"],
+        "peak_commands": stats["peak_commands"],
+        "rejected_channels": stats["rejected_channels"],
+        "legacy_rejections": stats["legacy_rejections"],
+        "hmc_limiter": report.get("hmc_limiter"),
+        "phases": report.get("phases", []),
+    }
+    if process.returncode != 0:
+        print(process.stdout)
+        print(process.stderr)
+    return result
+
+
+def capture_host(capture_file):
+    # The HMC is the host of the first recorded command, with its port when it isn't 22
+    with gzip.open(capture_file, "rt", encoding="utf-8") as file:
+        host = json.loads(file.readline())["host"]
+    hmc, _, port = host.partition(":")
+    return hmc, port or "22"
+
+
+def run_replay_benchmark(args):
+    """
+    : Replays a --record capture of an --hmconly collection, measuring the parsing and serialization without network
+    """
+    hmc, port = capture_host(args.capture)
+    wall_times = []
+    report = {}
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as work_dir:
+            command = (
+                powercollector_command(args.exe)
+                + [
+                    "--hmc",
+                    hmc,
+                    "--port",
+                    port,
+                    "--user",
+                    "replay",
+                    "--password",
+                    "replay",
+                    "--hmconly",
+                    "--replay",
+                    str(Path(args.capture).resolve()),
+                    "--output",
+                    str(Path(work_dir) / "output"),
+                ]
+                + (["--replaylatency"] if args.latency else [])
+                + args.extra
+            )
+            os.makedirs(Path(work_dir) / "output", exist_ok=True)
+            started = time.time()
+            process = subprocess.run(
+                command,
+                cwd=work_dir,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+            )
+            wall_times.append(time.time() - started)
+            report = read_run_report(work_dir) or {}
+        if process.returncode != 0:
+            print(process.stdout)
+            print(process.stderr)
+            break
+    return {
+        "benchmark": "replay",
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "capture": str(args.capture),
+        "latency": args.latency,
+        "repeat": args.repeat,
+        "exit_code": process.returncode,
+        "wall_time": round(sorted(wall_times)[len(wall_times) // 2], 3),
+        "capture_summary": report.get("capture"),
+        "phases": report.get("phases", []),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_payload(payload_file, size):
+    # Text like the oscollector output, so compression gains what it would on a real tarball
+    with open(payload_file, "w") as file:
+        number = 0
+        while file.tell() < size:
+            file.write(
+                f"hdisk{number % 997} Available 00-00-00 MPIO IBM 2107 FC Disk "
+                f"pvid 00c{number * 7919 % 10 ** 9:09d} rootvg active\n"
+            )
+            number += 1
+
+
+def run_transport_benchmark(args):
+    """
+    : Measures each SSH transport profile against an emulated LPAR, or a real sshd with --host: connection time,
+    : command latency and SCP upload and download throughput, optionally through a link with RTT and a bandwidth limit
+    """
+    # Imported here so the other benchmarks don't load paramiko into the runner
+    from loguru import logger
+    from sshclient import RemoteClient, TRANSPORT_PROFILES
+
+    logger.remove()
+    server = None
+    host, port, user, password = args.host, args.port, args.user, args.password
+    if not host:
+        port = free_port()
+        # The emulated LPAR runs in its own process, so it doesn't compete with the client for the GIL
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                str(Path(__file__).parent / "fakelpar.py"),
+                "--base-port",
+                str(port),
+                "--vios-ratio",
+                "0",
+            ],
+            stdout=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            text=True,
+        )
+        server.stdout.readline()
+        host, user, password = "127.0.0.1", "root", "password"
+    link = None
+    if args.rtt or args.bandwidth:
+        link = FakeLink(
+            port, rtt=args.rtt, bandwidth=args.bandwidth * 1000 * 1000
+        ).start()
+        host, port = "127.0.0.1", link.port
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        payload_file = str(Path(work_dir) / "powercollector-transport.txt")
+        write_payload(payload_file, args.size * 1000 * 1000)
+        size = os.path.getsize(payload_file)
+        download_dir = Path(work_dir) / "download"
+        for profile in args.profiles.split(","):
+            if profile not in TRANSPORT_PROFILES:
+                print(f"Unknown transport profile {profile}, skipped.")
+                continue
+            client = RemoteClient(
+                host, user, password, ".", port=port, transport=profile
+            )
+            started = time.time()
+            client.execute_command("hostname", 60)
+            connect_time = time.time() - started
+            latencies = []
+            for _ in range(args.commands):
+                started = time.time()
+                client.execute_command("hostname", 60)
+                latencies.append(time.time() - started)
+            started = time.time()
+            client.upload_file(payload_file)
+            upload_time = time.time() - started
+            os.makedirs(download_dir, exist_ok=True)
+            started = time.time()
+            client.download_file(Path(payload_file).name, str(download_dir))
+            download_time = time.time() - started
+            downloaded = download_dir / Path(payload_file).name
+            complete = downloaded.exists() and os.path.getsize(downloaded) == size
+            transport = client.client.get_transport()
+            results.append(
+                {
+                    "benchmark": "transport",
+                    "date": datetime.now().isoformat(timespec="seconds"),
+                    "profile": profile,
+                    "server": "sshd" if args.host else "emulated",
+                    "rtt": args.rtt,
+                    "bandwidth": args.bandwidth,
+                    "size": size,
+                    "cipher": transport.remote_cipher,
+                    "compression": transport.remote_compression,
+                    "connect_time": round(connect_time, 3),
+                    "command_latency": (
+                        round(statistics.median(latencies), 4) if latencies else None
+                    ),
+                    "upload_mb_per_second": round(size / upload_time / 1000 / 1000, 2),
+                    "download_mb_per_second": (
+                        round(size / download_time / 1000 / 1000, 2)
+                        if complete
+                        else None
+                    ),
+                }
+            )
+            print_result(results[-1])
+            if downloaded.exists():
+                downloaded.unlink()
+            client.execute_command("rm " + Path(payload_file).name, 60)
+            client.disconnect()
+    if link:
+        link.stop()
+    if server:
+        server.kill()
+        server.wait()
+    return results
+
+
+def run_startup_benchmark(args):
+    """
+    : Measures how long powercollector takes to answer --help and to send its first command to an emulated HMC
+    """
+    help_times = []
+    for _ in range(args.repeat):
+        started = time.time()
+        subprocess.run(
+            powercollector_command(args.exe) + ["--help"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+        )
+        help_times.append(time.time() - started)
+    hmc = FakeHMC(systems=1, lpars=1, vios=0, events=1).start()
+    first_command_times = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for _ in range(args.repeat):
+            hmc.first_command_time = None
+            command = powercollector_command(args.exe) + [
+                "--hmc",
+                "127.0.0.1",
+                "--port",
+                str(hmc.port),
+                "--user",
+                hmc.user,
+                "--password",
+                hmc.password,
+                "--hmconly",
+                "--output",
+                str(Path(work_dir) / "output"),
+            ]
+            os.makedirs(Path(work_dir) / "output", exist_ok=True)
+            started = time.time()
+            process = subprocess.Popen(
+                command,
+                cwd=work_dir,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            # The rest of the collection is not part of the startup, stop as soon as the HMC sees a command
+            while hmc.first_command_time is None and process.poll() is None:
+                time.sleep(0.005)
+            if hmc.first_command_time is not None:
+                first_command_times.append(hmc.first_command_time - started)
+            process.kill()
+            process.wait()
+    hmc.stop()
+    return {
+        "benchmark": "startup",
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "build": "frozen" if args.exe else "script",
+        "repeat": args.repeat,
+        "help_time": round(sorted(help_times)[len(help_times) // 2], 3),
+        "first_command_time": (
+            round(sorted(first_command_times)[len(first_command_times) // 2], 3)
+            if first_command_times
+            else None
+        ),
+        "first_command_failures": args.repeat - len(first_command_times),
+    }
+
+
+def run_os_benchmark_size(args, count):
+    # Imported here so the HMC benchmark doesn't load powercollector's modules into the runner
+    from loguru import logger
+    from common import LPAR, ManagedSystem, save_os_level_data_for_sys
+    from instrumentation import peak_rss
+
+    farm = start_farm(
+        count,
+        vios_ratio=args.vios_ratio,
+        auth_failure_ratio=args.auth_failure_ratio,
+        hang_ratio=args.hang_ratio,
+        legacy_ratio=args.legacy_ratio,
+        runtime=args.runtime,
+        tarball_size=args.tarball_size,
+        latency=args.latency,
+        command_latency=parse_command_latency(args.command_latency),
+    )
+    system = ManagedSystem(
+        name="Server-9009-42A-SN7800000", mt="9009-42A", serial="7800000"
+    )
+    for number, endpoint in enumerate(farm):
+        system.partition_list.append(
+            LPAR(
+                name=endpoint.name,
+                lpar_id=str(number + 1),
+                # Without an env, save_lpar_os_data detects AIX or VIOS with extra round trips
+                lpar_env=(
+                    ""
+                    if args.detect
+                    else ("vioserver" if endpoint.vios else "aixlinux")
+                ),
+                state="Running",
+                rmc_ip="127.0.0.1",
+                ssh_port=endpoint.port,
+            )
+        )
+    with tempfile.TemporaryDirectory() as work_dir:
+        with open(Path(work_dir) / "oscollector.v1.0.ksh", "w") as file:
+            file.write("#!/bin/ksh\n# emulated oscollector\n")
+        output_dir = Path(work_dir) / "output"
+        os.makedirs(output_dir, exist_ok=True)
+        logger.remove()
+        logger.add(str(Path(work_dir) / "benchmark.log"), level="INFO")
+        started = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_os_level_data_for_sys(
+                managed_systems=[system],
+                base_dir=work_dir,
+                output_dir=str(output_dir),
+                today=datetime.now().strftime("%Y%m%d-%H-%M"),
+                interactive=False,
+            )
+        wall_time = time.time() - started
+        logger.remove()
+        collected = len(list(output_dir.glob("*.tar")))
+    for endpoint in farm:
+        endpoint.stop()
+    stats = [endpoint.stats() for endpoint in farm]
+    return {
+        "benchmark": "os",
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "lpars": count,
+        "runtime": args.runtime,
+        "tarball_size": args.tarball_size,
+        "latency": args.latency,
+        "wall_time": round(wall_time, 3),
+        "collected": collected,
+        "failed": count - collected,
+        "lpars_per_minute": round(collected * 60 / wall_time, 2) if wall_time else None,
+        "round_trips": sum(stat["round_trips"] for stat in stats),
+        "connections": sum(stat["connections"] for stat in stats),
+        "legacy_rejections": sum(stat["legacy_rejections"] for stat in stats),
+        "bytes_downloaded": sum(stat["bytes_sent"] for stat in stats),
+        "bytes_uploaded": sum(stat["bytes_received"] for stat in stats),
+        "peak_rss": peak_rss(),
+    }
+
+
+def run_os_benchmark(args):
+    results = []
+    for count in [int(item) for item in args.lpars.split(",")]:
+        print(f"OS-level benchmark with {count} emulated LPARs.")
+        result = run_os_benchmark_size(args, count)
+        print_result(result)
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="Benchmark powercollector against emulated endpoints on localhost.",
+    )
+    parser.add_argument(
+        "--exe",
+        metavar="Path",
+        type=Path,
+        help="Frozen powercollector executable to benchmark. Defaults to powercollector.py "
+        "run by this interpreter.",
+    )
+    parser.add_argument(
+        "--results",
+        metavar="Path",
+        type=Path,
+        default=Path("benchmark-results.jsonl"),
+        help="File the results are appended to, one JSON object per run.",
+    )
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    hmc_parser = subparsers.add_parser(
+        "hmc", help="Full HMC-level collection (--hmconly) against an emulated HMC."
+    )
+    hmc_parser.add_argument(
+        "--systems", type=int, default=10, help="Number of Managed Systems."
+    )
+    hmc_parser.add_argument(
+        "--lpars", type=int, default=20, help="LPARs per Managed System."
+    )
+    hmc_parser.add_argument(
+        "--vios", type=int, default=2, help="VIOS among the LPARs of each system."
+    )
+    hmc_parser.add_argument(
+        "--events", type=int, default=1000, help="Number of hardware service events."
+    )
+    hmc_parser.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds added to every command."
+    )
+    hmc_parser.add_argument(
+        "--command-latency",
+        metavar="lssyscfg=0.2,viosvrcmd=1.5",
+        help="Per-command latency in seconds, overrides --latency.",
+    )
+    hmc_parser.add_argument(
+        "--capacity",
+        type=int,
+        default=0,
+        help="Commands the HMC serves at full speed, more slow it down.",
+    )
+    hmc_parser.add_argument(
+        "--max-channels",
+        type=int,
+        default=0,
+        help="Concurrent channels before the HMC refuses new ones.",
+    )
+    hmc_parser.add_argument(
+        "--legacy",
+        action="store_true",
+        help="The HMC only accepts logins with the SHA2 RSA signatures disabled.",
+    )
+    hmc_parser.add_argument(
+        "--invalid-attributes",
+        metavar="analyzing_mtms",
+        default="",
+        help="-F attributes the emulated HMC rejects.",
+    )
+    hmc_parser.add_argument(
+        "--invalid-parameters",
+        metavar="--osrefresh",
+        default="",
+        help="Parameters the emulated HMC rejects.",
+    )
+    hmc_parser.add_argument(
+        "extra",
+        nargs=argparse.REMAINDER,
+        help="Additional powercollector arguments, after --.",
+    )
+    hmc_parser.set_defaults(run=run_hmc_benchmark)
+
+    startup_parser = subparsers.add_parser(
+        "startup",
+        help="Time to answer --help and to send the first command to an emulated HMC.",
+    )
+    startup_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Runs of each measurement, the median is recorded.",
+    )
+    startup_parser.set_defaults(run=run_startup_benchmark)
+
+    transport_parser = subparsers.add_parser(
+        "transport",
+        help="SCP throughput and command latency of each SSH transport profile.",
+    )
+    transport_parser.add_argument(
+        "--profiles",
+        default="default,interactive,bulk,compressed",
+        help="Comma separated profiles to measure.",
+    )
+    transport_parser.add_argument(
+        "--size", type=int, default=50, help="Megabytes uploaded and downloaded."
+    )
+    transport_parser.add_argument(
+        "--commands", type=int, default=20, help="Commands timed for the latency."
+    )
+    transport_parser.add_argument(
+        "--rtt",
+        type=float,
+        default=0.0,
+        help="Seconds of round trip time added by a relay between client and server.",
+    )
+    transport_parser.add_argument(
+        "--bandwidth",
+        type=float,
+        default=0,
+        help="Megabytes per second the relay lets through in each direction.",
+    )
+    transport_parser.add_argument(
+        "--host", help="Real sshd to measure instead of an emulated LPAR."
+    )
+    transport_parser.add_argument(
+        "--port", type=int, default=22, help="Port of the --host sshd."
+    )
+    transport_parser.add_argument("--user", help="User of the --host sshd.")
+    transport_parser.add_argument("--password", help="Password of the --host sshd.")
+    transport_parser.set_defaults(run=run_transport_benchmark)
+
+    replay_parser = subparsers.add_parser(
+        "replay",
+        help="--hmconly collection replayed from a powercollector --record capture, without network.",
+    )
+    replay_parser.add_argument(
+        "--capture",
+        metavar="Path",
+        type=Path,
+        required=True,
+        help="Capture file written by powercollector --record.",
+    )
+    replay_parser.add_argument(
+        "--latency",
+        action="store_true",
+        help="Wait the recorded duration of each command.",
+    )
+    replay_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Replays of the capture, the median wall time is recorded.",
+    )
+    replay_parser.add_argument(
+        "extra",
+        nargs=argparse.REMAINDER,
+        help="Additional powercollector arguments, after --.",
+    )
+    replay_parser.set_defaults(run=run_replay_benchmark)
+
+    os_parser = subparsers.add_parser(
+        "os",
+        help="OS-level collection (save_os_level_data_for_sys) against emulated LPARs.",
+    )
+    os_parser.add_argument(
+        "--lpars",
+        default="1,10,100,500",
+        help="Comma separated LPAR counts to measure.",
+    )
+    os_parser.add_argument(
+        "--vios-ratio",
+        type=float,
+        default=0.1,
+        help="Fraction of the LPARs that are VIOS.",
+    )
+    os_parser.add_argument(
+        "--runtime", type=float, default=1.0, help="Seconds oscollector takes to run."
+    )
+    os_parser.add_argument(
+        "--tarball-size",
+        type=int,
+        default=1024 * 1024,
+        help="Size of the generated tar in bytes.",
+    )
+    os_parser.add_argument(
+        "--auth-failure-ratio",
+        type=float,
+        default=0.0,
+        help="Fraction of the LPARs that reject every login.",
+    )
+    os_parser.add_argument(
+        "--hang-ratio",
+        type=float,
+        default=0.0,
+        help="Fraction of the LPARs that never answer a command.",
+    )
+    os_parser.add_argument(
+        "--legacy-ratio",
+        type=float,
+        default=0.0,
+        help="Fraction of the LPARs that only accept logins with the SHA2 RSA signatures disabled.",
+    )
+    os_parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every command."
+    )
+    os_parser.add_argument(
+        "--command-latency", metavar="ksh=1.0", help="Per-command latency in seconds."
+    )
+    os_parser.add_argument(
+        "--detect",
+        action="store_true",
+        help="Leave the LPAR env empty so the OS is detected over SSH.",
+    )
+    os_parser.set_defaults(run=run_os_benchmark)
+
+    args = parser.parse_args()
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+    if getattr(args, "extra", None) and args.extra[0] == "--":
+        args.extra = args.extra[1:]
+    results = args.run(args)
+    if isinstance(results, dict):
+        print_result(results)
+        results = [results]
+    for result in results:
+        record_result(args.results, result)
+    print(f"Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+# ****************************************************************************
+# * powercollector.benchmark.fakehmc                                         *
+# * Emulated HMC CLI over SSH, used to benchmark powercollector without a    *
+# * real HMC                                                                 *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import argparse to run the emulated HMC on its own
+import argparse
+
+# Import random to generate a reproducible inventory
+import random
+
+# Import shlex to split the HMC commands like the HMC's shell does
+import shlex
+
+# Import time to keep the standalone server running
+import time
+
+# Import datetime to generate event timestamps
+from datetime import datetime, timedelta
+
+from fakessh import FakeSSHServer, parse_command_latency
+
+HMC_HOSTNAME = "fakehmc"
+HMC_FIELDS = {
+    "hostname": HMC_HOSTNAME,
+    "domain": "example.com",
+}
+
+EVENT_FIELDS = [
+    "problem_num",
+    "pmh_num",
+    "refcode",
+    "status",
+    "first_time",
+    "last_time",
+    "sys_name",
+    "sys_mtms",
+    "enclosure_mtms",
+    "text",
+    "analyzing_mtms",
+    "ref_code_extn",
+    "sys_refcode",
+    "fru_details",
+]
+
+
+class FakeHMC(FakeSSHServer):
+    # Answers the subset of the HMC CLI used by powercollector from a generated inventory.
+    # invalid_attributes and invalid_parameters emulate older HMC levels that reject newer -F attributes or flags.
+
+    def __init__(
+        self,
+        systems=2,
+        lpars=10,
+        vios=2,
+        events=100,
+        errlog_entries=20,
+        invalid_attributes=None,
+        invalid_parameters=None,
+        user="hscroot",
+        password="abc123",
+        seed=0,
+        **kwargs,
+    ):
+        super().__init__(user=user, password=password, **kwargs)
+        self.invalid_attributes = set(invalid_attributes or [])
+        self.invalid_parameters = set(invalid_parameters or [])
+        self.errlog_entries = errlog_entries
+        generator = random.Random(seed)
+        self.systems = [
+            self._make_system(generator, number, lpars, vios)
+            for number in range(systems)
+        ]
+        self.events = self._make_events(generator, events)
+
+    @staticmethod
+    def _make_system(generator, number, lpars, vios):
+        name = f"Server-9009-42A-SN78{number:05d}"
+        serial = f"78{number:05d}"
+        system = {
+            "name": name,
+            "type_model": "9009-42A",
+            "serial_num": serial,
+            "state": "Operating",
+            "capabilities": "active_lpar_mobility_capable,cod_mem_capable,huge_page_mem_capable",
+            "temp_ecnumber_primary": "01VL940",
+            "temp_level_primary": "50",
+            "perm_ecnumber_primary": "01VL940",
+            "perm_level_primary": "50",
+            "temp_ecnumber_secondary": "01VL940",
+            "temp_level_secondary": "50",
+            "perm_ecnumber_secondary": "01VL940",
+            "perm_level_secondary": "50",
+            "lpars": [],
+            "io_slots": [],
+            "iotopo": [],
+        }
+        for slot in range(8):
+            system["io_slots"].append(
+                {
+                    "feature_codes": f"EN0{generator.randint(0, 9)}",
+                    "description": "PCIe2 4-port 1GbE Adapter",
+                    "unit_phys_loc": f"U78D2.001.WZS{number:05d}",
+                    "phys_loc": f"C{slot + 1}",
+                    "drc_name": f"U78D2.001.WZS{number:05d}-P1-C{slot + 1}",
+                }
+            )
+        system["iotopo"].append(
+            {
+                "slot_enclosure": f"U78D2.001.WZS{number:05d}",
+                "leading_hub_port": "none",
+                "trailing_hub_port": "none",
+            }
+        )
+        for lpar_id in range(1, lpars + 1):
+            is_vios = lpar_id <= vios
+            system["lpars"].append(
+                {
+                    "lpar_id": str(lpar_id),
+                    "name": f"{'vios' if is_vios else 'lpar'}{number:03d}{lpar_id:03d}",
+                    "lpar_env": "vioserver" if is_vios else "aixlinux",
+                    "state": "Running" if generator.random() > 0.1 else "Not Activated",
+                    "os_version": (
+                        "VIOS 3.1.4.10" if is_vios else "AIX 7.3 7300-02-01-2346"
+                    ),
+                    "rmc_ipaddr": f"10.{number // 250}.{number % 250}.{lpar_id}",
+                }
+            )
+        return system
+
+    def _make_events(self, generator, count):
+        events = []
+        now = datetime(2026, 1, 1)
+        for number in range(count):
+            system = self.systems[number % len(self.systems)] if self.systems else None
+            first = now - timedelta(minutes=generator.randint(0, 60 * 24 * 365))
+            events.append(
+                {
+                    "problem_num": str(number + 1),
+                    "pmh_num": "",
+                    "refcode": f"B7006{generator.randint(100, 999)}",
+                    "status": "open" if generator.random() < 0.2 else "closed",
+                    "first_time": first.strftime("%m/%d/%Y %H:%M:%S"),
+                    "last_time": first.strftime("%m/%d/%Y %H:%M:%S"),
+                    "sys_name": system["name"] if system else "",
+                    "sys_mtms": f"9009-42A/{system['serial_num']}" if system else "",
+                    "enclosure_mtms": "",
+                    "text": "Service processor failover was disabled",
+                    "analyzing_mtms": (
+                        f"9009-42A/{system['serial_num']}" if system else ""
+                    ),
+                    "ref_code_extn": "",
+                    "sys_refcode": "",
+                    "fru_details": "",
+                }
+            )
+        events.sort(
+            key=lambda event: datetime.strptime(
+                event["first_time"], "%m/%d/%Y %H:%M:%S"
+            )
+        )
+        return events
+
+    def _system(self, name):
+        for system in self.systems:
+            if system["name"] == name:
+                return system
+        return None
+
+    @staticmethod
+    def _option(args, option):
+        if option in args:
+            position = args.index(option)
+            if position + 1 < len(args):
+                return args[position + 1]
+        return None
+
+    @staticmethod
+    def _fields(args):
+        # -F with no attribute list returns every attribute
+        if "-F" not in args:
+            return None
+        value = FakeHMC._option(args, "-F")
+        if value is None or value.startswith("-"):
+            return []
+        return value.split(":")
+
+    def _format(self, records, args, all_fields):
+        # Emulates -F (colon separated values) and the default attr=value output, including --header
+        fields = self._fields(args)
+        if fields is not None:
+            fields = fields or all_fields
+            for field in fields:
+                if field in self.invalid_attributes or field not in all_fields:
+                    return [
+                        "An invalid attribute was entered. The invalid attribute is "
+                        + field
+                        + "."
+                    ]
+            lines = [":".join(fields)] if "--header" in args else []
+            for record in records:
+                lines.append(":".join(record.get(field, "") for field in fields))
+            return lines
+        return [
+            ",".join(f"{field}={record.get(field, '')}" for field in all_fields)
+            for record in records
+        ]
+
+    @staticmethod
+    def _filter(records, args):
+        text = FakeHMC._option(args, "--filter")
+        if not text:
+            return records
+        for condition in text.split(","):
+            key, _, value = condition.partition("=")
+            key = {"lpar_names": "name"}.get(key, key)
+            records = [record for record in records if record.get(key) == value]
+        return records
+
+    def _events(self, args):
+        records = self.events
+        days = self._option(args, "-d")
+        if days:
+            # The generated events end on 2026/01/01, the emulated HMC's "today"
+            newest = datetime(2026, 1, 1)
+            oldest = newest - timedelta(days=int(days))
+            records = [
+                event
+                for event in records
+                if datetime.strptime(event["last_time"], "%m/%d/%Y %H:%M:%S") >= oldest
+            ]
+        if self._option(args, "-t") == "console":
+            return (
+                [
+                    {
+                        "time": event["first_time"],
+                        "name": "hscroot",
+                        "text": "User logged in",
+                    }
+                    for event in records
+                ],
+                ["time", "name", "text"],
+            )
+        return self._filter(records, args), EVENT_FIELDS
+
+    def _errlog(self, system, lpar_id, detailed=False):
+        lines = []
+        if not detailed:
+            lines.append("IDENTIFIER TIMESTAMP  T C RESOURCE_NAME  DESCRIPTION")
+        for number in range(self.errlog_entries):
+            identifier = ["A924A5FC", "DE3B8540", "B6267342", "E86653C3"][number % 4]
+            timestamp = f"01{(number % 28) + 1:02d}120026"
+            if detailed:
+                lines += [
+                    "---------------------------------------------------------------------------",
+                    "LABEL:          "
+                    + ["CORE_DUMP", "SC_DISK_ERR4", "DISK_ERR7", "SRC_RSTRT"][
+                        number % 4
+                    ],
+                    "IDENTIFIER:     " + identifier,
+                    "",
+                    f"Date/Time:       Thu Jan {(number % 28) + 1:2d} 12:00:00 2026",
+                    f"Sequence Number: {number + 1}",
+                    "Node Id:         " + system["name"][-8:] + lpar_id,
+                    "Class:           H",
+                    "Type:            PERM",
+                    "Resource Name:   hdisk" + str(number % 4),
+                    "",
+                    "Description",
+                    "DISK OPERATION ERROR",
+                ]
+            else:
+                lines.append(
+                    f"{identifier}   {timestamp} P H hdisk{number % 4}         DISK OPERATION ERROR"
+                )
+        return lines
+
+    def _viosvrcmd(self, args):
+        system = self._system(self._option(args, "-m"))
+        lpar_id = self._option(args, "--id")
+        command = self._option(args, "-c") or ""
+        if system is None:
+            return ["HSCL8012 The managed system was not found."]
+        vios = [
+            lpar
+            for lpar in system["lpars"]
+            if lpar["lpar_id"] == lpar_id and lpar["lpar_env"] == "vioserver"
+        ]
+        if not vios:
+            return ["HSCL2970 The partition is not a Virtual I/O Server partition."]
+        # Like the HMC, -c takes one VIOS command without ;, > or |
+        if any(character in command for character in ";>|"):
+            return [
+                "The command cannot contain the semicolon (;), greater than (>), or vertical bar (|) characters."
+            ]
+        command = command.strip()
+        if command == "errlog":
+            return self._errlog(system, lpar_id)
+        if command == "errlog -ls":
+            return self._errlog(system, lpar_id, detailed=True)
+        if command == "lsdev -vpd":
+            return [
+                "INSTALLED RESOURCE LIST WITH VPD",
+                "",
+                "  sys0                                                             System Object",
+                "  ent0             U78D2.001.WZS00001-P1-C1-T1  4-Port Gigabit Ethernet PCI-Express Adapter",
+                "        Network Address.............98BE94000000",
+                "        Part Number.................00E2715",
+                "  hdisk0           U78D2.001.WZS00001-P1-C2-T1-L0  MPIO IBM 2076 FC Disk",
+                "        Serial Number...............600507680C808",
+            ]
+        return [f"rksh: {command.split(' ', 1)[0]}: not found"]
+
+    def answer(self, command):
+        """
+        : Returns the output lines of an HMC command.
+        """
+        if "|" in command and not command.startswith("viosvrcmd"):
+            command, _, grep = command.partition("|")
+            pattern = grep.strip().replace("grep ", "", 1).strip("'\"")
+            return [line for line in self.answer(command.strip()) if pattern in line]
+        args = shlex.split(command)
+        for parameter in self.invalid_parameters:
+            if parameter in args:
+                return [
+                    "An invalid parameter was entered. Invalid parameters " + parameter
+                ]
+        name = args[0]
+        if name == "lshmc":
+            if "-n" in args:
+                return [",".join(f"{key}={value}" for key, value in HMC_FIELDS.items())]
+            if "-V" in args:
+                return [
+                    '"version= Version: 10',
+                    " Release: 2",
+                    " Service Pack: 1030",
+                    '"',
+                ]
+            return [
+                "vpd=*FC ????????",
+                "*VC 20.0",
+                "*N2 Fri Jan 01 00:00:00 UTC 2026",
+                "*FC ????????",
+                "*DS Hardware Management Console",
+                "*TM 7063-CR2",
+                "*SE FAKE001",
+                "*MN IBM",
+                "*PN N/A",
+                "*SZ 33470111744",
+                "*OS Embedded Operating Systems",
+                "*NA 127.0.0.1",
+                "*FC ????????",
+                "*DS Platform Firmware",
+                "*RM V10R2M1030",
+            ]
+        if name == "lssysconn":
+            return [
+                f"resource_type=sys,type_model_serial_num={system['type_model']}*{system['serial_num']},"
+                f"sp=primary,sp_phys_loc=U78D2.001.WZS00001-P1-C1,ipaddr=192.168.1.{number + 1},"
+                f"alt_ipaddr=unavailable,state=Connected"
+                for number, system in enumerate(self.systems)
+            ]
+        if name == "lssvcevents":
+            records, fields = self._events(args)
+            return self._format(records, args, fields)
+        if name == "lssyscfg":
+            resource = self._option(args, "-r")
+            managed = self._option(args, "-m")
+            if resource == "sys":
+                systems = self.systems if managed is None else [self._system(managed)]
+                if None in systems:
+                    return ["HSCL8012 The managed system was not found."]
+                return self._format(
+                    systems,
+                    args,
+                    ["name", "type_model", "serial_num", "state", "capabilities"],
+                )
+            if resource == "lpar":
+                system = self._system(managed)
+                if system is None:
+                    return ["HSCL8012 The managed system was not found."]
+                lpars = [
+                    dict(
+                        lpar,
+                        os_version=(
+                            lpar["os_version"]
+                            if lpar["state"] == "Running"
+                            else "Unknown"
+                        ),
+                    )
+                    for lpar in self._filter(system["lpars"], args)
+                ]
+                return self._format(
+                    lpars,
+                    args,
+                    [
+                        "lpar_id",
+                        "name",
+                        "lpar_env",
+                        "state",
+                        "os_version",
+                        "rmc_ipaddr",
+                    ],
+                )
+        if name == "lslic":
+            system = self._system(self._option(args, "-m"))
+            if system is None:
+                return ["HSCL8012 The managed system was not found."]
+            return self._format(
+                [system],
+                args,
+                [key for key in system if "ecnumber" in key or "level" in key],
+            )
+        if name == "lshwres":
+            system = self._system(self._option(args, "-m"))
+            if system is None:
+                return ["HSCL8012 The managed system was not found."]
+            return self._format(
+                system["io_slots"],
+                args,
+                [
+                    "feature_codes",
+                    "description",
+                    "unit_phys_loc",
+                    "phys_loc",
+                    "drc_name",
+                ],
+            )
+        if name == "lsiotopo":
+            system = self._system(self._option(args, "-m"))
+            if system is None:
+                return ["HSCL8012 The managed system was not found."]
+            return self._format(
+                system["iotopo"],
+                args,
+                ["slot_enclosure", "leading_hub_port", "trailing_hub_port"],
+            )
+        if name == "viosvrcmd":
+            return self._viosvrcmd(args)
+        return [f"rbash: {name}: command not found"]
+
+    def handle_command(self, channel, command):
+        self.send_lines(channel, self.answer(command))
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="fakehmc",
+        description="Run an emulated HMC on localhost for benchmarking powercollector.",
+    )
+    parser.add_argument("--port", type=int, default=2222, help="Port to listen on.")
+    parser.add_argument("--user", default="hscroot", help="Accepted username.")
+    parser.add_argument("--password", default="abc123", help="Accepted password.")
+    parser.add_argument(
+        "--systems", type=int, default=2, help="Number of Managed Systems."
+    )
+    parser.add_argument(
+        "--lpars", type=int, default=10, help="LPARs per Managed System."
+    )
+    parser.add_argument(
+        "--vios", type=int, default=2, help="VIOS among the LPARs of each system."
+    )
+    parser.add_argument(
+        "--events", type=int, default=100, help="Number of hardware service events."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every command."
+    )
+    parser.add_argument(
+        "--command-latency",
+        metavar="lssyscfg=0.2,viosvrcmd=1.5",
+        help="Per-command latency in seconds, overrides --latency.",
+    )
+    parser.add_argument(
+        "--capacity",
+        type=int,
+        default=0,
+        help="Commands served at full speed, more slow every command down.",
+    )
+    parser.add_argument(
+        "--max-channels",
+        type=int,
+        default=0,
+        help="Concurrent channels before new ones are refused.",
+    )
+    parser.add_argument(
+        "--legacy",
+        action="store_true",
+        help="Only accept logins with the SHA2 RSA signatures disabled.",
+    )
+    parser.add_argument(
+        "--invalid-attributes",
+        metavar="analyzing_mtms,rmc_ipaddr",
+        default="",
+        help="-F attributes answered with An invalid attribute was entered.",
+    )
+    parser.add_argument(
+        "--invalid-parameters",
+        metavar="--osrefresh",
+        default="",
+        help="Parameters answered with An invalid parameter was entered.",
+    )
+    args = parser.parse_args()
+    hmc = FakeHMC(
+        systems=args.systems,
+        lpars=args.lpars,
+        vios=args.vios,
+        events=args.events,
+        invalid_attributes=[
+            item for item in args.invalid_attributes.split(",") if item
+        ],
+        invalid_parameters=[
+            item for item in args.invalid_parameters.split(",") if item
+        ],
+        user=args.user,
+        password=args.password,
+        port=args.port,
+        latency=args.latency,
+        command_latency=parse_command_latency(args.command_latency),
+        capacity=args.capacity,
+        max_channels=args.max_channels,
+        legacy=args.legacy,
+    ).start()
+    print(f"Emulated HMC listening on 127.0.0.1:{hmc.port}, press ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(hmc.stats())
+        hmc.stop()
+
+
+if __name__ == "__main__":
+    main()
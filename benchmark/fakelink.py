@@ -0,0 +1,106 @@
+# ****************************************************************************
+# * powercollector.benchmark.fakelink                                        *
+# * TCP relay on localhost that adds round trip time and a bandwidth limit,  *
+# * to measure the SSH transport like over a WAN link                        *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import socket to relay the connections
+import socket
+
+# Import threading to relay both directions at once
+import threading
+
+# Import time to delay and pace the data
+import time
+
+# Import deque to hold the data in flight
+from collections import deque
+
+
+class FakeLink:
+    # Every connection to the link's port is relayed to target_port. Each direction delays its data by half the
+    # round trip time and, with a bandwidth in bytes per second, sends no faster than it.
+
+    def __init__(self, target_port, rtt=0.0, bandwidth=0, port=0):
+        self.target_port = target_port
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.port = port
+        self.sock = None
+        self.running = False
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", self.port))
+        self.sock.listen(20)
+        self.port = self.sock.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.sock:
+            self.sock.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                break
+            server = socket.create_connection(("127.0.0.1", self.target_port))
+            for sock in (client, server):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for source, target in ((client, server), (server, client)):
+                queue = deque()
+                ready = threading.Condition()
+                threading.Thread(
+                    target=self._receive,
+                    args=(source, target, queue, ready),
+                    daemon=True,
+                ).start()
+                threading.Thread(
+                    target=self._send, args=(target, queue, ready), daemon=True
+                ).start()
+
+    def _receive(self, source, target, queue, ready):
+        # Data read is stamped with the time it may leave the other side
+        while True:
+            try:
+                data = source.recv(65536)
+            except OSError:
+                data = b""
+            with ready:
+                queue.append((time.monotonic() + self.rtt / 2, data))
+                ready.notify()
+            if not data:
+                return
+
+    def _send(self, target, queue, ready):
+        sent_until = time.monotonic()
+        while True:
+            with ready:
+                while not queue:
+                    ready.wait()
+                due, data = queue.popleft()
+            if not data:
+                try:
+                    target.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                return
+            if self.bandwidth:
+                # The link is busy until the previous data has gone through
+                sent_until = max(sent_until, due) + len(data) / self.bandwidth
+                due = sent_until
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                target.sendall(data)
+            except OSError:
+                return
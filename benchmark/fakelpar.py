@@ -0,0 +1,367 @@
+# ****************************************************************************
+# * powercollector.benchmark.fakelpar                                        *
+# * Emulated AIX and VIOS LPARs over SSH and SCP, used to benchmark the      *
+# * OS-level collection without real hosts                                   *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import argparse to run the emulated LPARs on their own
+import argparse
+
+# Import io to build the oscollector tarball in memory
+import io
+
+# Import random to pick which instances fail or hang
+import random
+
+# Import shlex to split the commands like the LPAR's shell does
+import shlex
+
+# Import tarfile to generate oscollector-like tarballs
+import tarfile
+
+# Import threading to make the hang wait interruptible
+import threading
+
+# Import time to emulate the oscollector runtime
+import time
+
+from fakessh import FakeSSHServer, parse_command_latency
+
+
+class FakeLPAR(FakeSSHServer):
+    # Emulates the commands save_lpar_os_data sends to an AIX or VIOS LPAR, with an in-memory filesystem.
+    # On a VIOS the padmin restricted shell does not answer uname, commands run as root through ioscli oem_setup_env.
+
+    def __init__(
+        self,
+        name="lpar",
+        vios=False,
+        user=None,
+        password=None,
+        runtime=0.0,
+        tarball_size=1024 * 1024,
+        fail_auth=False,
+        hang=False,
+        **kwargs,
+    ):
+        super().__init__(
+            user=user or ("padmin" if vios else "root"),
+            password=password or ("padmin" if vios else "password"),
+            **kwargs,
+        )
+        self.name = name
+        self.vios = vios
+        self.runtime = runtime
+        self.tarball_size = tarball_size
+        self.fail_auth = fail_auth
+        self.hang = hang
+        self.files = {}
+        self.bytes_received = 0
+        self.stopped = threading.Event()
+
+    def check_auth(self, username, password):
+        if self.fail_auth:
+            with self.lock:
+                self.auth_failures += 1
+            return False
+        return super().check_auth(username, password)
+
+    def stop(self):
+        self.stopped.set()
+        super().stop()
+
+    @staticmethod
+    def _recv_line(channel):
+        line = b""
+        while not line.endswith(b"\n"):
+            data = channel.recv(1)
+            if not data:
+                break
+            line += data
+        return line.decode("utf-8", errors="replace").rstrip("\n")
+
+    @staticmethod
+    def _recv_exact(channel, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = channel.recv(min(32768, size - len(data)))
+            if not chunk:
+                break
+            data += chunk
+        return bytes(data)
+
+    def _scp_sink(self, channel):
+        # scp -t: receive files uploaded by the client
+        channel.sendall(b"\x00")
+        while True:
+            line = self._recv_line(channel)
+            if not line:
+                break
+            if line.startswith("C"):
+                _, size, name = line[1:].split(" ", 2)
+                channel.sendall(b"\x00")
+                data = self._recv_exact(channel, int(size))
+                self._recv_exact(channel, 1)
+                self.files[name] = data
+                with self.lock:
+                    self.bytes_received += len(data)
+            channel.sendall(b"\x00")
+        return 0
+
+    def _scp_source(self, channel, name):
+        # scp -f: send a file to the client
+        if name not in self.files:
+            channel.sendall(
+                b"\x01scp: " + name.encode() + b": No such file or directory\n"
+            )
+            return 1
+        data = self.files[name]
+        self._recv_exact(channel, 1)
+        channel.sendall(f"C0644 {len(data)} {name}\n".encode())
+        self._recv_exact(channel, 1)
+        channel.sendall(data)
+        channel.sendall(b"\x00")
+        self._recv_exact(channel, 1)
+        with self.lock:
+            self.bytes_sent += len(data)
+        return 0
+
+    def run_shell_command(self, command):
+        """
+        : Runs one command as root and returns (stdout, stderr) lines.
+        """
+        if "|" in command:
+            command, _, grep = command.partition("|")
+            pattern = grep.strip().replace("grep ", "", 1).strip("'\"")
+            out, err = self.run_shell_command(command.strip())
+            return [line for line in out if pattern in line], err
+        args = shlex.split(command)
+        if not args:
+            return [], []
+        name = args[0]
+        if name == "hostname":
+            return [self.name], []
+        if name == "uname":
+            return ["AIX"], []
+        if name == "lsdev":
+            return (
+                ["vios0            Available  Virtual I/O Server"] if self.vios else []
+            ), []
+        if name == "chmod":
+            missing = [f for f in args[2:] if f not in self.files]
+            return [], [
+                f"chmod: {f}: A file or directory in the path name does not exist."
+                for f in missing
+            ]
+        if name == "rm":
+            errors = []
+            for file in args[1:]:
+                if file.startswith("/") and file not in self.files:
+                    continue
+                if self.files.pop(file, None) is None:
+                    errors.append(
+                        f"rm: {file}: A file or directory in the path name does not exist."
+                    )
+            return [], errors
+        if name == "mv" and len(args) == 3:
+            if args[1] not in self.files:
+                return [], [f"mv: 0653-401 Cannot rename {args[1]}"]
+            self.files[args[2]] = self.files.pop(args[1])
+            return [], []
+        if name == "ksh":
+            script = args[1].replace("./", "", 1) if len(args) > 1 else ""
+            if script not in self.files:
+                return [], [f"ksh: {script}: not found"]
+            if self.runtime:
+                time.sleep(self.runtime)
+            stem = f"{self.name}_{time.strftime('%Y%m%d%H%M%S')}"
+            self.files[stem + ".tar"] = self.tarball(stem)
+            for suffix in ("-config.txt", "-error.txt", "-lsgcl.txt"):
+                self.files[stem + suffix] = b""
+            return [
+                "oscollector: collecting configuration",
+                "oscollector: collecting error log",
+                f"Se genero el archivo {stem}.tar",
+            ], []
+        return [], [f"ksh: {name}: not found"]
+
+    def tarball(self, stem):
+        """
+        : Builds a tar with the -config.txt, -error.txt and -lsgcl.txt members of oscollector, about tarball_size long
+        : The content only depends on the LPAR name, so it is the same on every run like an unchanged configuration.
+        """
+        config = (
+            f"{self.name} oscollector configuration\n".encode()
+            * (self.tarball_size // 40 + 1)
+        )[: max(self.tarball_size - 4096, 0)]
+        members = {
+            "-config.txt": config,
+            "-error.txt": b"IDENTIFIER TIMESTAMP  T C RESOURCE_NAME  DESCRIPTION\n",
+            "-lsgcl.txt": f"{self.name} root oscollector\n".encode(),
+        }
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for suffix, data in members.items():
+                info = tarfile.TarInfo(stem + suffix)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def handle_command(self, channel, command):
+        if self.hang:
+            # Never answer, the client is expected to time out
+            self.stopped.wait()
+            return 1
+        args = shlex.split(command)
+        if args[0] == "scp":
+            if "-t" in args:
+                return self._scp_sink(channel)
+            if "-f" in args:
+                return self._scp_source(channel, args[-1])
+        if self.vios:
+            if command == "ioscli oem_setup_env":
+                # The root shell reads commands from stdin until exit
+                while True:
+                    line = self._recv_line(channel)
+                    if not line or line.strip() == "exit":
+                        break
+                    out, err = self.run_shell_command(line.strip())
+                    self.send_lines(channel, out)
+                    self.send_lines(channel, err, stderr=True)
+                return 0
+            if args[0] not in ("hostname", "ioscli"):
+                # padmin's restricted shell only runs ioscli commands
+                self.send_lines(channel, [f"rksh: {args[0]}: not found"], stderr=True)
+                return 127
+        out, err = self.run_shell_command(command)
+        self.send_lines(channel, out)
+        self.send_lines(channel, err, stderr=True)
+        return 1 if err else 0
+
+    def stats(self):
+        stats = super().stats()
+        stats["bytes_received"] = self.bytes_received
+        return stats
+
+
+def start_farm(
+    count,
+    base_port=0,
+    vios_ratio=0.1,
+    auth_failure_ratio=0.0,
+    hang_ratio=0.0,
+    legacy_ratio=0.0,
+    seed=0,
+    **kwargs,
+):
+    """
+    : Starts count emulated LPARs, each one on its own port, and returns them.
+    : With base_port 0 every instance gets a free port from the OS.
+    """
+    generator = random.Random(seed)
+    farm = []
+    for number in range(count):
+        farm.append(
+            FakeLPAR(
+                name=f"lpar{number:03d}",
+                vios=generator.random() < vios_ratio,
+                fail_auth=generator.random() < auth_failure_ratio,
+                hang=generator.random() < hang_ratio,
+                # Only drawn when asked for, so the other ratios pick the same LPARs as before
+                legacy=legacy_ratio > 0 and generator.random() < legacy_ratio,
+                port=base_port + number if base_port else 0,
+                **kwargs,
+            ).start()
+        )
+    return farm
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="fakelpar",
+        description="Run emulated AIX/VIOS LPARs on localhost for benchmarking the OS-level collection.",
+    )
+    parser.add_argument(
+        "--count", type=int, default=1, help="Number of LPARs to emulate."
+    )
+    parser.add_argument(
+        "--base-port", type=int, default=2300, help="Port of the first LPAR."
+    )
+    parser.add_argument(
+        "--vios-ratio",
+        type=float,
+        default=0.1,
+        help="Fraction of the LPARs that are VIOS.",
+    )
+    parser.add_argument(
+        "--runtime", type=float, default=5.0, help="Seconds oscollector takes to run."
+    )
+    parser.add_argument(
+        "--tarball-size",
+        type=int,
+        default=1024 * 1024,
+        help="Size of the generated tar in bytes.",
+    )
+    parser.add_argument(
+        "--auth-failure-ratio",
+        type=float,
+        default=0.0,
+        help="Fraction of the LPARs that reject every login.",
+    )
+    parser.add_argument(
+        "--hang-ratio",
+        type=float,
+        default=0.0,
+        help="Fraction of the LPARs that never answer a command.",
+    )
+    parser.add_argument(
+        "--legacy-ratio",
+        type=float,
+        default=0.0,
+        help="Fraction of the LPARs that only accept logins with the SHA2 RSA signatures disabled.",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every command."
+    )
+    parser.add_argument(
+        "--command-latency",
+        metavar="ksh=1.0,scp=0.5",
+        help="Per-command latency in seconds.",
+    )
+    args = parser.parse_args()
+    farm = start_farm(
+        args.count,
+        base_port=args.base_port,
+        vios_ratio=args.vios_ratio,
+        auth_failure_ratio=args.auth_failure_ratio,
+        hang_ratio=args.hang_ratio,
+        legacy_ratio=args.legacy_ratio,
+        runtime=args.runtime,
+        tarball_size=args.tarball_size,
+        latency=args.latency,
+        command_latency=parse_command_latency(args.command_latency),
+    )
+    for lpar in farm:
+        kind = "VIOS" if lpar.vios else "AIX"
+        flags = (
+            " (rejects logins)" if lpar.fail_auth else " (hangs)" if lpar.hang else ""
+        )
+        if lpar.legacy:
+            flags += " (legacy)"
+        print(
+            f"{lpar.name}: {kind} on 127.0.0.1:{lpar.port} user {lpar.user}/{lpar.password}{flags}"
+        )
+    print("Press ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for lpar in farm:
+            lpar.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# ****************************************************************************
+# * powercollector.benchmark.fakessh                                         *
+# * Minimal paramiko SSH server used by the emulated HMC and LPAR endpoints  *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import socket to listen for connections
+import socket
+
+# Import threading to serve each connection and command in its own thread
+import threading
+
+# Import time to measure and inject latency
+import time
+
+# Import Counter to count round trips per command
+from collections import Counter
+
+# Import logger for the main log file
+from loguru import logger
+
+# Import paramiko's server side classes
+import paramiko
+
+# Generating an RSA key takes a while, every emulated endpoint in the process shares the same one.
+_host_key = None
+_legacy_host_key = None
+_host_key_lock = threading.Lock()
+
+# Offered by clients that have not disabled the SHA2 RSA signatures
+SHA2_RSA_KEYS = ("rsa-sha2-256", "rsa-sha2-512")
+
+
+def get_host_key():
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+
+def get_legacy_host_key():
+    # Newer paramiko releases have no ssh-rsa, a client with SHA2 disabled negotiates this key instead
+    global _legacy_host_key
+    with _host_key_lock:
+        if _legacy_host_key is None:
+            _legacy_host_key = paramiko.ECDSAKey.generate()
+        return _legacy_host_key
+
+
+class _Transport(paramiko.Transport):
+    # Keeps the host key algorithms offered by the client, the legacy emulation depends on them
+
+    offered_keys = ()
+
+    def _really_parse_kex_init(self, *args, **kwargs):
+        parsed = super()._really_parse_kex_init(*args, **kwargs)
+        self.offered_keys = parsed["server_key_algo_list"]
+        return parsed
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    # Accepts password logins and hands every exec request to the owning FakeSSHServer.
+
+    def __init__(self, server, transport):
+        self.server = server
+        self.transport = transport
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if self.server.legacy and any(
+            key in self.transport.offered_keys for key in SHA2_RSA_KEYS
+        ):
+            # Like an older sshd, the login only works once the client disables the SHA2 RSA signatures
+            with self.server.lock:
+                self.server.legacy_rejections += 1
+            return paramiko.AUTH_FAILED
+        if self.server.check_auth(username, password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind != "session":
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+        with self.server.lock:
+            if (
+                self.server.max_channels
+                and self.server.channels >= self.server.max_channels
+            ):
+                # Like an HMC that ran out of sessions
+                self.server.rejected_channels += 1
+                return paramiko.OPEN_FAILED_RESOURCE_SHORTAGE
+            self.server.channels += 1
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        command = command.decode("utf-8", errors="replace")
+        # Commands are answered from their own thread, the transport thread must not block.
+        threading.Thread(
+            target=self.server._run_command, args=(channel, command), daemon=True
+        ).start()
+        return True
+
+
+class FakeSSHServer:
+    # Listens on localhost and runs handle_command() for every exec request.
+    # Subclasses implement handle_command(channel, command) and return the exit status.
+    # With a capacity, commands running beyond it make every command slower, like an overloaded HMC, and
+    # max_channels refuses channels over that number. A legacy server only accepts clients with SHA2 disabled.
+
+    def __init__(
+        self,
+        user,
+        password,
+        port=0,
+        latency=0.0,
+        command_latency=None,
+        capacity=0,
+        max_channels=0,
+        legacy=False,
+    ):
+        self.user = user
+        self.password = password
+        self.port = port
+        self.latency = latency
+        self.command_latency = command_latency or {}
+        self.capacity = capacity
+        self.max_channels = max_channels
+        self.legacy = legacy
+        self.legacy_rejections = 0
+        self.channels = 0
+        self.rejected_channels = 0
+        self.running_commands = 0
+        self.peak_commands = 0
+        self.round_trips = Counter()
+        self.connections = 0
+        self.auth_failures = 0
+        self.first_command_time = None
+        self.bytes_sent = 0
+        self.sock = None
+        self.running = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", self.port))
+        self.sock.listen(100)
+        self.port = self.sock.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.sock:
+            self.sock.close()
+
+    def check_auth(self, username, password):
+        ok = username == self.user and password == self.password
+        if not ok:
+            with self.lock:
+                self.auth_failures += 1
+        return ok
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(
+                target=self._serve_connection, args=(client,), daemon=True
+            ).start()
+
+    def _serve_connection(self, client):
+        with self.lock:
+            self.connections += 1
+        transport = _Transport(client)
+        transport.add_server_key(get_host_key())
+        if self.legacy:
+            transport.add_server_key(get_legacy_host_key())
+        # Like OpenSSH's sshd, zlib is offered to the clients that ask for compression
+        transport.use_compression(True)
+        try:
+            transport.start_server(server=_ServerInterface(self, transport))
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            logger.info(f"Fake SSH negotiation failed: {e}")
+            transport.close()
+            return
+        # Keep the transport referenced until the client goes away.
+        while transport.is_active() and self.running:
+            time.sleep(0.5)
+        transport.close()
+
+    def _run_command(self, channel, command):
+        kind = command.split(" ", 1)[0]
+        with self.lock:
+            self.round_trips[kind] += 1
+            if self.first_command_time is None:
+                self.first_command_time = time.time()
+            self.running_commands += 1
+            self.peak_commands = max(self.peak_commands, self.running_commands)
+            running = self.running_commands
+        delay = self.command_latency.get(kind, self.latency)
+        if delay and self.capacity and running > self.capacity:
+            delay *= running / self.capacity
+        if delay:
+            time.sleep(delay)
+        try:
+            status = self.handle_command(channel, command)
+        except Exception as e:
+            logger.exception(e)
+            status = 1
+        try:
+            channel.send_exit_status(status or 0)
+            channel.shutdown_write()
+            # Closing now could beat the transport's reply to the exec request and the client would see
+            # "Channel closed", so wait for the client to close its side first.
+            channel.settimeout(60)
+            while channel.recv(1024):
+                pass
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
+        channel.close()
+        with self.lock:
+            self.running_commands -= 1
+            self.channels -= 1
+
+    def send_lines(self, channel, lines, stderr=False):
+        data = "".join(line + "\n" for line in lines).encode("utf-8")
+        with self.lock:
+            self.bytes_sent += len(data)
+        if stderr:
+            channel.sendall_stderr(data)
+        else:
+            channel.sendall(data)
+
+    def handle_command(self, channel, command):
+        raise NotImplementedError
+
+    def stats(self):
+        with self.lock:
+            return {
+                "connections": self.connections,
+                "auth_failures": self.auth_failures,
+                "round_trips": sum(self.round_trips.values()),
+                "round_trips_by_command": dict(self.round_trips),
+                "bytes_sent": self.bytes_sent,
+                "first_command_time": self.first_command_time,
+                "peak_commands": self.peak_commands,
+                "rejected_channels": self.rejected_channels,
+                "legacy_rejections": self.legacy_rejections,
+            }
+
+
+def parse_command_latency(text):
+    """
+    : Parses "lssyscfg=0.2,viosvrcmd=1.5" into a dictionary of per-command latencies in seconds.
+    """
+    latencies = {}
+    if not text:
+        return latencies
+    for item in text.split(","):
+        command, _, seconds = item.partition("=")
+        latencies[command.strip()] = float(seconds)
+    return latencies
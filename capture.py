@@ -0,0 +1,177 @@
+# ****************************************************************************
+# * powercollector.capture                                                   *
+# * Records every SSH command with its output and duration to a gzipped      *
+# * JSON lines file, and replays them in place of the hosts                  *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import atexit to close the capture when the program ends through sys.exit()
+import atexit
+
+# Import gzip to compress the capture
+import gzip
+
+# Import JSON to write and read the records
+import json
+
+# Import threading to record from several sessions
+import threading
+
+# Import time to replay the recorded durations
+import time
+
+# Import logger for the main log file
+from loguru import logger
+
+
+class CaptureMissError(Exception):
+    # The replayed command was not recorded for that host
+    pass
+
+
+class ReplayedFailure(Exception):
+    # The command failed when it was recorded
+    pass
+
+
+class Recorder:
+    # One JSON line per command, appended to a gzip stream that is flushed after every record,
+    # so a run that is killed leaves a capture that can be replayed up to its last command
+
+    def __init__(self, capture_file):
+        self.capture_file = capture_file
+        self.lock = threading.Lock()
+        self.file = gzip.open(capture_file, "at", encoding="utf-8")
+        self.commands = 0
+        self.failures = 0
+
+    def record(self, host, command, vios, output, error, seconds, failure=None):
+        line = json.dumps(
+            {
+                "host": host,
+                "command": command,
+                "vios": vios,
+                "stdout": output,
+                "stderr": error,
+                "seconds": round(seconds, 3),
+                "failure": failure,
+            }
+        )
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line + "\n")
+            self.file.flush()
+            self.commands += 1
+            if failure:
+                self.failures += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def summary(self):
+        return {
+            "mode": "record",
+            "file": self.capture_file,
+            "commands": self.commands,
+            "failures": self.failures,
+        }
+
+
+class Replayer:
+    # The answers of each host and command are replayed in the order they were recorded, the last one is
+    # repeated once they run out
+
+    def __init__(self, capture_file, latency=False):
+        self.capture_file = capture_file
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.records = {}
+        self.positions = {}
+        self.replayed = 0
+        self.missed = 0
+        loaded = 0
+        with gzip.open(capture_file, "rt", encoding="utf-8") as file:
+            try:
+                for line in file:
+                    record = json.loads(line)
+                    key = (record["host"], record["command"], record["vios"])
+                    self.records.setdefault(key, []).append(record)
+                    loaded += 1
+            except (EOFError, OSError, ValueError) as e:
+                # The recording run was stopped, everything before its last record is still usable
+                logger.info(f"Capture ends early after {loaded} commands: {e}")
+        logger.info(f"Replaying {loaded} commands from {capture_file}")
+
+    def replay(self, host, command, vios):
+        key = (host, command, vios)
+        with self.lock:
+            records = self.records.get(key)
+            if not records:
+                self.missed += 1
+                raise CaptureMissError(f"{command} was not recorded for {host}")
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            record = records[min(position, len(records) - 1)]
+            self.replayed += 1
+        if self.latency:
+            time.sleep(record["seconds"])
+        return record
+
+    def summary(self):
+        return {
+            "mode": "replay",
+            "file": self.capture_file,
+            "latency": self.latency,
+            "commands": sum(len(records) for records in self.records.values()),
+            "replayed": self.replayed,
+            "missed": self.missed,
+        }
+
+
+# Without enable_recording() or enable_replay() every command goes to its host and nothing is recorded.
+recorder = None
+replayer = None
+
+
+def enable_recording(capture_file):
+    """
+    : Appends every command sent, with its output and duration, to capture_file
+    """
+    global recorder
+    recorder = Recorder(str(capture_file))
+    atexit.register(recorder.close)
+    return recorder
+
+
+def enable_replay(capture_file, latency=False):
+    """
+    : Answers every command from capture_file instead of its host, at once or, with latency, after the
+    : recorded duration
+    """
+    global replayer
+    replayer = Replayer(str(capture_file), latency)
+    return replayer
+
+
+def replaying():
+    return replayer is not None
+
+
+def record(host, command, vios, output, error, seconds, failure=None):
+    if recorder is not None:
+        recorder.record(host, command, vios, output, error, seconds, failure)
+
+
+def replay(host, command, vios):
+    return replayer.replay(host, command, vios)
+
+
+def summary():
+    if recorder is not None:
+        return recorder.summary()
+    return replayer.summary() if replayer is not None else None
@@ -7,6 +7,9 @@
 
 # Import copy to deepcopy modules
 import copy
+
+# Import hashlib to fingerprint the collected inventory
+import hashlib
 import json
 
 # Import os to use file functions
@@ -15,23 +18,41 @@ import os
 # Import re to work with regular expressions
 import re
 
+# Import shutil to copy the HMC Scanner results and find the system Java
+import shutil
+
 # Import socket to do low-level networking
 import socket
 
 # Import subprocess to run external processes
 import subprocess
 
+# Import threading to give each HMC worker its own session and watch HMC Scanner
+import threading
+
+# Import time to measure HMC Scanner's duration
+import time
+
+# Import datetime to read the NTP date
+from datetime import datetime
+
+# Import the thread pool to collect Managed Systems concurrently
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 # Import Jsonizable to store and read the data
 from jsonizable import Jsonizable
 
 # Import logger for the main log file
 from loguru import logger
 
-# Import the RemoteClient class from the sshclient file
-from paramiko import AuthenticationException
+# Import metrics to count the LPARs collected
+import metrics
+
+# Import capture to skip the network checks and files when replaying a capture
+import capture
 
-# Import the RemoteClient to connect to HMC and LPAR
-from sshclient import RemoteClient
+# sshclient (and paramiko with it) is imported by the functions that connect, it is slow to load and not needed
+# to parse arguments or read a JSON file
 
 
 ##TODO add __str__ method to each class
@@ -42,7 +63,7 @@ from sshclient import RemoteClient
 class LPAR(Jsonizable):
     # Use slots to make Python reduce RAM usage, since it doesn't use a dict to store attributes and
     # the attributes are defined from the start.
-    __slots__ = ["name", "id", "env", "os_level", "rmc_ip", "state"]
+    __slots__ = ["name", "id", "env", "os_level", "rmc_ip", "state", "ssh_port"]
 
     # All of our inits will now also accept a json object, which we'll use to call the parent class' init
     def __init__(
@@ -54,6 +75,7 @@ class LPAR(Jsonizable):
         lpar_os_level=None,
         state=None,
         rmc_ip=None,
+        ssh_port=None,
     ):
         self.name = name or ""
         self.id = lpar_id or ""
@@ -61,6 +83,8 @@ class LPAR(Jsonizable):
         self.rmc_ip = rmc_ip or ""
         self.state = state or ""
         self.env = lpar_env or ""
+        # Only set when the LPAR's sshd doesn't listen on port 22, so it's only written when present.
+        self.ssh_port = ssh_port
         super().__init__(json_in)
 
     class Meta:
@@ -72,6 +96,7 @@ class LPAR(Jsonizable):
             "os_level": str,
             "rmc_ip": str,
             "state": str,
+            "ssh_port?": int,
         }
 
 
@@ -240,8 +265,11 @@ def print_red(text):
     print(f"\033[91m{text}\033[00m")
 
 
-def check_java(base_dir):
-    # Check for bundled Java or fallback to installed
+def find_java(base_dir):
+    """
+    : Looks for the bundled JRE in base_dir or falls back to the system Java
+    : Returns the Java command, the resolved executable and the version text, or (False, None, None)
+    """
     java = None
     regex = re.compile(r".*jre")
     # Search the base_dir for the jre directory
@@ -249,13 +277,13 @@ def check_java(base_dir):
         if regex.search(file):
             try:
                 # Search the JRE directory for the Java exe and return it
-                if os.path.exists(file + "\\bin\\" + "java.exe"):
+                if os.path.exists(base_dir + "\\" + file + "\\bin\\" + "java.exe"):
                     java = base_dir + "\\" + file + "\\bin\\" + "java.exe"
                 outputs = subprocess.run(
                     java + " -version", capture_output=True, text=True
                 )
                 logger.info(f"Bundled Java is available: {outputs.stderr}")
-                return java
+                return java, java, outputs.stderr
             except (FileNotFoundError, TypeError) as e:
                 logger.info(f"Tried {file} but got an error: {e}")
                 continue
@@ -263,17 +291,110 @@ def check_java(base_dir):
     try:
         outputs = subprocess.run("java -version", capture_output=True, text=True)
     except FileNotFoundError:
-        return False
+        return False, None, None
     # TODO do we need to check for an specific Java version?
     regex = re.compile(' version.".*"', re.IGNORECASE)
     result = regex.search(str(outputs.stderr))
     if not result:
-        return False
+        return False, None, None
     else:
         if result.group(0) < ' version "1.8':
             logger.info(f"Default System Java is not compatible: {result.string}")
         logger.info(f"System Java is available: {result.string}")
-        return "java"
+        return "java", shutil.which("java"), result.string
+
+
+def check_java(base_dir):
+    """
+    : Returns the Java command to run HMC Scanner with, or False if there is none
+    : The result is cached in JavaCache.json and reused while the executable's path and mtime are unchanged,
+    : so java -version only runs when Java was installed, updated or moved
+    """
+    cache_file = base_dir + "\\" + "JavaCache.json"
+    try:
+        with open(cache_file, "r") as file:
+            cache = json.load(file)
+        path = cache["path"]
+        # The system Java can change with PATH, the bundled one only with its file
+        if cache["java"] != "java" or shutil.which("java") == path:
+            if os.path.getmtime(path) == cache["mtime"]:
+                logger.info(f"Cached Java is available: {cache['version']}")
+                return cache["java"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    java, path, version = find_java(base_dir)
+    if java and path:
+        try:
+            with open(cache_file, "w") as file:
+                json.dump(
+                    {
+                        "java": java,
+                        "path": path,
+                        "version": version.strip(),
+                        "mtime": os.path.getmtime(path),
+                    },
+                    file,
+                    indent=4,
+                )
+        except OSError as e:
+            logger.info(f"Java cache could not be saved: {e}")
+    return java
+
+
+def probe_java(base_dir):
+    """
+    : Runs check_java in a background thread and returns its Future, for run_hmc_scan's java_probe
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="java")
+    future = executor.submit(check_java, base_dir)
+    executor.shutdown(wait=False)
+    return future
+
+
+def probe_ntp_date(server="pool.ntp.org", timeout=2):
+    """
+    : Asks the NTP server for the date in a background thread and returns its Future
+    : The result is the NTP date, or None if the server couldn't be reached within timeout seconds
+    """
+
+    def request():
+        # ntplib is only needed here
+        import ntplib
+
+        try:
+            response = ntplib.NTPClient().request(server, timeout=timeout)
+            return datetime.fromtimestamp(response.tx_time)
+        except Exception as e:
+            logger.info(f"NTP request to {server} failed: {e}")
+            return None
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ntp")
+    future = executor.submit(request)
+    executor.shutdown(wait=False)
+    return future
+
+
+def check_ntp_date(ntp_probe, target_date, build_date, timeout=2):
+    """
+    : Waits up to timeout seconds for probe_ntp_date's result, returns False if the NTP date is outside the
+    : program's validity. A missing or late answer is logged and accepted.
+    """
+    try:
+        ntp_date = ntp_probe.result(timeout=timeout)
+    except Exception:
+        ntp_date = None
+    if ntp_date is None:
+        logger.info("System date seems valid but could not verify with NTP.")
+        return True
+    if ntp_date > target_date or ntp_date < build_date:
+        print_red(
+            "This program has expired. Please ask your technical support for a current version"
+        )
+        logger.error(
+            "This program has expired. Please ask your technical support for a current version"
+        )
+        return False
+    return True
 
 
 def save_hmc_data(hmc_src, hmc, output_dir):
@@ -298,15 +419,149 @@ def save_hmc_data(hmc_src, hmc, output_dir):
         return False
 
 
-def read_hmc_data(input_file):
+def write_json_atomic(output_file, data):
+    # Written next to the file and renamed over it, a reader never sees half a file
+    with open(output_file + ".tmp", "w") as file:
+        file.write(json.dumps(data, indent=4))
+    os.replace(output_file + ".tmp", output_file)
+
+
+def shard_name(text):
+    # System names and serials become part of the file name
+    return re.sub(r"[^\w.-]", "_", text)
+
+
+class ShardedHMCWriter:
+    """
+    : Writes the HMC to a header file and each Managed System to its own file as soon as it is collected,
+    : listed in order by a manifest in place of the SystemsManagedByHMC file. The manifest is rewritten with
+    : every system, so an interrupted run leaves the systems that were finished readable by read_hmc_data.
+    """
+
+    def __init__(self, hmc_src, hmc, output_dir):
+        self.hmc_src = hmc_src
+        self.hmc = hmc
+        self.output_dir = output_dir
+        self.manifest_file = (
+            output_dir
+            + "\\"
+            + hmc_src
+            + "-SystemsManagedByHMC-"
+            + hmc.hostname
+            + ".json"
+        )
+        self.header_file = hmc_src + "-HMC-" + hmc.hostname + ".json"
+        self.files = {}
+        header = hmc.write()
+        header.pop("managed_systems", None)
+        write_json_atomic(output_dir + "\\" + self.header_file, header)
+        self.write_manifest(False)
+
+    def add(self, system):
+        """
+        : Writes system's file and adds it to the manifest, called from one thread as each system finishes
+        """
+        system_file = (
+            self.hmc_src
+            + "-System-"
+            + shard_name(system.mt)
+            + "-"
+            + shard_name(system.serial or system.name)
+            + ".json"
+        )
+        write_json_atomic(self.output_dir + "\\" + system_file, system.write())
+        self.files[id(system)] = system_file
+        self.write_manifest(False)
+        logger.info(f"System: {system.name} written to {system_file}")
+
+    def write_manifest(self, complete):
+        write_json_atomic(
+            self.manifest_file,
+            {
+                "format": "sharded",
+                "hostname": self.hmc.hostname,
+                "hmc": self.header_file,
+                "complete": complete,
+                # Systems in the HMC's order, not in the order they finished
+                "systems": [
+                    {
+                        "name": system.name,
+                        "mt": system.mt,
+                        "serial": system.serial,
+                        "file": self.files[id(system)],
+                    }
+                    for system in self.hmc.managed_systems
+                    if id(system) in self.files
+                ],
+            },
+        )
+
+    def finish(self):
+        """
+        : Writes the systems that were not added yet and the complete manifest, then checks it reads back
+        : to the same HMC like save_hmc_data
+        """
+        for system in self.hmc.managed_systems:
+            if id(system) not in self.files:
+                self.add(system)
+        self.write_manifest(True)
+        print("Reading written files for consistency.")
+        read_hmc = read_hmc_data(self.manifest_file)
+        # noinspection PyUnresolvedReferences
+        if read_hmc and read_hmc.write() == self.hmc.write():
+            print("Files are consistent.")
+            logger.info("Files are consistent.")
+            return True
+        print_red("Failure checking file consistency.")
+        logger.error("Failure checking file consistency.")
+        return False
+
+
+def read_sharded_hmc(manifest, input_dir, systems=None):
+    """
+    : Builds the HMC from a sharded manifest, only the files of the systems named in systems (by name or serial)
+    : are read when it is given
+    """
+    with open(input_dir + "\\" + manifest["hmc"], "r") as file:
+        hmc_ = HMC(json_in=json.loads(file.read()))
+    if not manifest.get("complete"):
+        print_red(
+            "The collection was interrupted, only the finished Managed Systems are loaded."
+        )
+        logger.error(
+            "The collection was interrupted, only the finished Managed Systems are loaded."
+        )
+    for entry in manifest["systems"]:
+        if systems and entry["name"] not in systems and entry["serial"] not in systems:
+            continue
+        with open(input_dir + "\\" + entry["file"], "r") as file:
+            hmc_.managed_systems.append(ManagedSystem(json_in=json.loads(file.read())))
+    return hmc_
+
+
+def read_hmc_data(input_file, systems=None):
     """
     : Reads a powercollector JSON file to populate and returns the HMC object
+    : A sharded manifest is read with its HMC and Managed System files, systems limits them to those names or
+    : serials.
     """
     with open(input_file, "r") as file:
         print("Attempting to open JSON File: " + str(input_file))
         logger.info("Attempting to open JSON File: " + str(input_file))
         try:
-            hmc_ = HMC(json_in=json.loads(file.read()))
+            data = json.loads(file.read())
+            if data.get("format") == "sharded":
+                hmc_ = read_sharded_hmc(
+                    data, os.path.dirname(os.path.abspath(input_file)), systems
+                )
+            else:
+                hmc_ = HMC(json_in=data)
+                if systems:
+                    hmc_.managed_systems = [
+                        system
+                        for system in hmc_.managed_systems
+                        if system.name in systems or system.serial in systems
+                    ]
             print("HMC and Managed Systems loaded successfully.")
             logger.info("HMC and Managed Systems loaded successfully.")
             return hmc_
@@ -346,7 +601,17 @@ def check_host(hostname):
 
 
 def save_os_level_data_for_sys(
-    managed_systems, base_dir, output_dir, today, oscollector_path=None, lpar_env=None
+    managed_systems,
+    base_dir,
+    output_dir,
+    today,
+    oscollector_path=None,
+    lpar_env=None,
+    username=None,
+    password=None,
+    interactive=True,
+    result_store=None,
+    transport="bulk",
 ):
     # Connect to each partition to run the collection script
     print("LPAR OS-level collection started.")
@@ -355,6 +620,14 @@ def save_os_level_data_for_sys(
     if oscollector_path is None:
         oscollector_path = base_dir
     oscollector = get_oscollector(oscollector_path)
+    metrics.lpars_queued(
+        sum(
+            1
+            for system in managed_systems
+            for lpar in system.partition_list or []
+            if not lpar_env or lpar_env in lpar.env
+        )
+    )
     for system in managed_systems:
         if not system.partition_list:
             print_red("No LPARs defined for System: " + system.name)
@@ -376,6 +649,11 @@ def save_os_level_data_for_sys(
                 output_path=output_dir,
                 system_name=system.name,
                 today=today,
+                username=username,
+                password=password,
+                interactive=interactive,
+                result_store=result_store,
+                transport=transport,
             ):
                 non_collected_lpars.append(copy.deepcopy(lpar))
                 non_collected_lpars[-1].name = system.name + "-" + lpar.name
@@ -444,6 +722,7 @@ def get_oscollector(path_to_oscollector):
         return False
 
 
+@metrics.track_lpar
 def save_lpar_os_data(
     lpar,
     oscollector,
@@ -453,10 +732,19 @@ def save_lpar_os_data(
     password=None,
     username=None,
     system_name=None,
+    interactive=True,
+    result_store=None,
+    transport="bulk",
 ):
     """
     : get lpar os data takes the lpar, oscollector
+    : When interactive is False, the provided or default credentials are tried once without prompting.
+    : With a result_store, the downloaded tarball is added to it and replaced by its manifest entry.
+    : transport is the SSH transport profile of the connection, see sshclient.TRANSPORT_PROFILES.
     """
+    # Import the RemoteClient to connect to the LPAR
+    from sshclient import RemoteClient, AuthenticationException
+
     # Safeguard clauses and username/password setup
     if "Running" not in lpar.state:
         # continue halts the current loop and moves to the next iterable, in this case, next lpar
@@ -503,7 +791,23 @@ def save_lpar_os_data(
             "this is an AIX or VIOS LPAR."
         )
         return False
-    if not check_host(lpar.rmc_ip):
+    if not RemoteClient.host_available(lpar.rmc_ip, lpar.ssh_port or 22):
+        # Repeated timeouts or connection errors opened the host's circuit, other LPARs are collected first
+        print_red(
+            "LPAR: "
+            + lpar.name
+            + " skipped, its host stopped answering earlier in this run. Please "
+            "run oscollector manually."
+        )
+        logger.error(
+            "LPAR: "
+            + lpar.name
+            + " skipped, its host stopped answering earlier in this run. Please "
+            "run oscollector manually."
+        )
+        return False
+    # A replayed collection needs no network, the LPAR's answers come from the capture
+    if not capture.replaying() and not check_host(lpar.rmc_ip):
         # If the rmc_ip is unreachable, something is wrong at the networking level
         # since the HMC did reach it.
         print_red(
@@ -519,26 +823,36 @@ def save_lpar_os_data(
             "oscollector manually"
         )
         return False
-    for attempt in range(5):
-        print(
-            "Please input username and password or press enter to use the proposed value."
-        )
-        # Ask for input, if the input is empty, use the current value
-        username = (
-            input("Username for LPAR: " + lpar.name + " (" + username + "): ")
-            or username
-        )
-        password = (
-            input("Password for user " + username + " (" + password + "): ") or password
-        )
+    attempts = 5 if interactive else 1
+    for attempt in range(attempts):
+        if interactive:
+            print(
+                "Please input username and password or press enter to use the proposed value."
+            )
+            # Ask for input, if the input is empty, use the current value
+            username = (
+                input("Username for LPAR: " + lpar.name + " (" + username + "): ")
+                or username
+            )
+            password = (
+                input("Password for user " + username + " (" + password + "): ")
+                or password
+            )
         try:
             lpar_ssh = RemoteClient(
-                host=lpar.rmc_ip, user=username, password=password, remote_path="."
+                host=lpar.rmc_ip,
+                user=username,
+                password=password,
+                remote_path=".",
+                port=lpar.ssh_port or 22,
+                transport=transport,
             )
             lpar_ssh.execute_command("hostname", 10)
             logger.info("Authentication successful.")
         except AuthenticationException:
-            if attempt == 4:
+            if attempt == attempts - 1:
+                print_red("Authentication error on LPAR: " + lpar.name)
+                logger.error("Authentication error on LPAR: " + lpar.name)
                 return False
             logger.info(
                 "Authentication error. Retrying connection with LPAR:"
@@ -572,6 +886,9 @@ def save_lpar_os_data(
         # Fun Fact: Try Except blocks also have an else condition, it's triggered when it exits cleanly.
         else:
             # Once we got a connection to the LPAR, send the file, exec the script and retrieve the file.
+            # old_name and set_vios are needed by the cleanup, even if the script never ran.
+            old_name = None
+            set_vios = False
             try:
                 if system_name is None:
                     output_file = lpar.name.replace(" ", "-") + "-" + today
@@ -587,7 +904,6 @@ def save_lpar_os_data(
                 # How to find out if LPAR is VIOS:
                 # 1. Run lsdev searching for vios0 device. Newer VIOSes might answer, olders might not.
                 # 2. If there's no answer, try again with oem_setup_env, VIOS WILL answer, AIX will not.
-                set_vios = False
                 if not lpar.env:
                     logger.info("Detecting LPAR OS.")
                     response, _ = lpar_ssh.execute_command(
@@ -617,7 +933,6 @@ def save_lpar_os_data(
                     "ksh ./" + oscollector, 900, vios=set_vios
                 )
                 # Check the output to find the generated filename OR raise an alert due to the script failing.
-                old_name = None
                 for line in response:
                     if "genero el archivo" in line:
                         regex = re.compile("(?<=vo ).*tar")
@@ -645,6 +960,9 @@ def save_lpar_os_data(
                 )
                 old_name = old_name.replace(".tar", "")
                 lpar_ssh.download_file(output_file + ".tar", output_path)
+                # A replayed collection downloads no tarball
+                if result_store is not None and not capture.replaying():
+                    result_store.add(output_path + "\\" + output_file + ".tar")
             except Exception as e:
                 print_red(
                     "Error encountered during transfer or execution of script on LPAR: "
@@ -664,37 +982,41 @@ def save_lpar_os_data(
             finally:
                 try:
                     logger.info("Starting cleanup on LPAR: " + lpar.name)
-                    lpar_ssh.execute_command(
-                        "rm " + old_name + "-config.txt",
-                        30,
-                        want_errors=True,
-                        vios=set_vios,
-                    )
-                    lpar_ssh.execute_command(
-                        "rm " + old_name + "-error.txt",
-                        30,
-                        want_errors=True,
-                        vios=set_vios,
-                    )
-                    lpar_ssh.execute_command(
-                        "rm " + old_name + "-lsgcl.txt",
-                        30,
-                        want_errors=True,
-                        vios=set_vios,
-                    )
+                    if old_name:
+                        lpar_ssh.execute_command(
+                            "rm " + old_name + "-config.txt",
+                            30,
+                            want_errors=True,
+                            vios=set_vios,
+                        )
+                        lpar_ssh.execute_command(
+                            "rm " + old_name + "-error.txt",
+                            30,
+                            want_errors=True,
+                            vios=set_vios,
+                        )
+                        lpar_ssh.execute_command(
+                            "rm " + old_name + "-lsgcl.txt",
+                            30,
+                            want_errors=True,
+                            vios=set_vios,
+                        )
+                        lpar_ssh.execute_command(
+                            "rm " + old_name + ".tar",
+                            30,
+                            want_errors=True,
+                            vios=set_vios,
+                        )
                     lpar_ssh.execute_command(
                         "rm " + oscollector, 60, want_errors=True, vios=set_vios
                     )
-                    lpar_ssh.execute_command(
-                        "rm " + old_name + ".tar", 30, want_errors=True, vios=set_vios
-                    )
                     lpar_ssh.execute_command(
                         "rm " + output_file + ".tar",
                         30,
                         want_errors=True,
                         vios=set_vios,
                     )
-                except:
+                except Exception as e:
                     print_red(
                         "Error encountered during cleanup on LPAR: "
                         + lpar.name
@@ -738,14 +1060,210 @@ def is_hmc(hmc):
         raise e
 
 
-def run_hmc_scan(hmc_scan_path, base_dir, hmc, user, password, output_path):
+def hmc_fingerprint(hmc, open_events):
+    """
+    : Returns a sha256 of the collected HMC tree (systems, firmware levels, LPARs) plus the open service events
+    """
+    inventory = json.dumps(
+        {"hmc": hmc.write(), "open_events": open_events}, sort_keys=True
+    )
+    return hashlib.sha256(inventory.encode("utf-8")).hexdigest()
+
+
+class HMCScannerJob:
+    """
+    : HMC Scanner running in the background, its console output goes to a file in the output folder.
+    : A watcher thread kills it if it runs longer than timeout seconds, join() waits for it to end.
+    : The scanner writes to scan_dir, which is kept as a cache entry for fingerprint when the run succeeds,
+    : join() copies its results to the output folder.
+    """
+
+    def __init__(
+        self,
+        command,
+        console_log,
+        scan_dir,
+        output_path,
+        timeout=None,
+        fingerprint=None,
+    ):
+        self.command = command
+        self.console_log = console_log
+        self.scan_dir = scan_dir
+        self.output_path = output_path
+        self.timeout = timeout
+        self.fingerprint = fingerprint
+        self.process = None
+        self.watcher = None
+        self.started = None
+        self.duration = None
+        self.exit_status = None
+        self.timed_out = False
+        self.cached = False
+        self.joined = False
+
+    def start(self):
+        self.started = time.time()
+        with open(self.console_log, "w") as console:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.DEVNULL,
+                stdout=console,
+                stderr=subprocess.STDOUT,
+            )
+        self.watcher = threading.Thread(
+            target=self._watch, name="hmc-scanner", daemon=True
+        )
+        self.watcher.start()
+        return self
+
+    def reuse(self):
+        # Cache hit, the previous results are copied by join() and the scanner never runs
+        self.cached = True
+        self.exit_status = 0
+        self.duration = 0.0
+        return self
+
+    def _watch(self):
+        try:
+            self.exit_status = self.process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self.timed_out = True
+            logger.error(
+                f"HMC Scanner did not finish in {self.timeout} seconds, stopping it."
+            )
+            self.process.kill()
+            self.exit_status = self.process.wait()
+        self.duration = time.time() - self.started
+
+    def running(self):
+        return self.watcher is not None and self.watcher.is_alive()
+
+    def join(self):
+        if self.joined:
+            return self.exit_status
+        if self.running():
+            print("Waiting for HMC Scanner to finish.")
+            logger.info("Waiting for HMC Scanner to finish.")
+        if self.watcher is not None:
+            self.watcher.join()
+        self.joined = True
+        fingerprint_file = self.scan_dir + "\\" + "fingerprint.txt"
+        if self.cached:
+            print("HMC inventory unchanged, reusing the previous HMC Scanner results.")
+            logger.info(
+                "HMC inventory unchanged, reusing HMC Scanner results from "
+                + self.scan_dir
+            )
+        elif self.timed_out:
+            print_red(
+                "HMC Scanner was stopped after "
+                + str(self.timeout)
+                + " seconds. Please run it manually"
+            )
+        elif self.exit_status != 0:
+            print_red(
+                "HMC Scanner ended with exit status "
+                + str(self.exit_status)
+                + ". Please check "
+                + self.console_log
+            )
+            logger.error(
+                "HMC Scanner ended with exit status "
+                + str(self.exit_status)
+                + ". Please check "
+                + self.console_log
+            )
+        else:
+            logger.info(f"HMC Scanner finished in {self.duration:.1f} seconds.")
+            if self.fingerprint:
+                with open(fingerprint_file, "w") as file:
+                    file.write(self.fingerprint)
+        try:
+            # Partial results of a failed run are still copied, like when the scanner wrote to the output folder
+            shutil.copytree(
+                self.scan_dir,
+                self.output_path,
+                dirs_exist_ok=True,
+                ignore=shutil.ignore_patterns("fingerprint.txt"),
+            )
+        except (OSError, shutil.Error) as e:
+            if __debug__:
+                logger.exception(e)
+            logger.error("Could not copy the HMC Scanner results: " + str(e))
+        return self.exit_status
+
+    def stop(self):
+        if self.running():
+            self.process.kill()
+            self.watcher.join()
+
+    def summary(self):
+        return {
+            "seconds": round(self.duration, 3) if self.duration is not None else None,
+            "exit_status": self.exit_status,
+            "timed_out": self.timed_out,
+            "cached": self.cached,
+            "fingerprint": self.fingerprint,
+            "console_log": self.console_log,
+        }
+
+
+def run_hmc_scan(
+    hmc_scan_path,
+    base_dir,
+    hmc,
+    user,
+    password,
+    output_path,
+    timeout=None,
+    fingerprint=None,
+    force=False,
+    java_probe=None,
+):
+    """
+    : Starts HMC Scanner in the background and returns its HMCScannerJob, or False if it can't run
+    : Results are cached per HMC in the HMCScannerCache folder of base_dir, when fingerprint matches
+    : the last successful run the cached results are reused unless force is set
+    : java_probe is the Future returned by probe_java, if Java was resolved in the background
+    """
+    scan_dir = base_dir + "\\" + "HMCScannerCache" + "\\" + hmc
+    console_log = output_path + "\\" + "hmcscanner-console.log"
+    fingerprint_file = scan_dir + "\\" + "fingerprint.txt"
+    if fingerprint and not force and os.path.exists(fingerprint_file):
+        with open(fingerprint_file, "r") as file:
+            if file.read().strip() == fingerprint:
+                return HMCScannerJob(
+                    None,
+                    console_log=console_log,
+                    scan_dir=scan_dir,
+                    output_path=output_path,
+                    fingerprint=fingerprint,
+                ).reuse()
     # Check that the supplied path exists AND JAVA is installed
     if not os.path.exists(hmc_scan_path + "\\" + "hmcScanner.jar"):
         logger.error("Missing HMC Scanner files, aborting HMC Scanner invocation.")
         return False
-    java = check_java(base_dir)
+    if java_probe is not None:
+        try:
+            java = java_probe.result()
+        except Exception as e:
+            if __debug__:
+                logger.exception(e)
+            java = check_java(base_dir)
+    else:
+        java = check_java(base_dir)
 
     if java:
+        # Start from an empty folder so stale results are never mixed in
+        try:
+            shutil.rmtree(scan_dir, ignore_errors=True)
+            os.makedirs(scan_dir, exist_ok=True)
+        except OSError as e:
+            if __debug__:
+                logger.exception(e)
+            logger.error("HMC Scanner cache folder could not be created: " + str(e))
+            return False
         hmc_scanner_command = (
             java
             + (
@@ -761,14 +1279,26 @@ def run_hmc_scan(hmc_scan_path, base_dir, hmc, user, password, output_path):
             + " -p "
             + password
             + ' -dir "'
-            + output_path
+            + scan_dir
             + '"'
             + " -html"
-            + f" -log {output_path}\\hmcscanner.log"
+            + f" -log {scan_dir}\\hmcscanner.log"
         )
         logger.info("| Calling HMC Scanner: " + hmc_scanner_command)
-        subprocess.run(hmc_scanner_command)
-        return True
+        try:
+            return HMCScannerJob(
+                hmc_scanner_command,
+                console_log=console_log,
+                scan_dir=scan_dir,
+                output_path=output_path,
+                timeout=timeout,
+                fingerprint=fingerprint,
+            ).start()
+        except OSError as e:
+            if __debug__:
+                logger.exception(e)
+            logger.error("HMC Scanner could not be started: " + str(e))
+            return False
     else:
         logger.error("Java is not available, aborting HMC Scanner invocation.")
         return False
@@ -797,3 +1327,393 @@ def exec_hmc_cmd_adapt(hmc, command, timeout):
         return out
     except Exception as e:
         raise e
+
+
+def collect_managed_system(hmc_ssh, system):
+    """
+    : Collects FSP levels, capabilities, IO slots, LPARs and IO topology for one Managed System
+    : hmc_ssh is a RemoteClient connected to the HMC, the results are stored in the ManagedSystem object
+    """
+    print("Collection started for System: " + system.name)
+    logger.info("Collection started for System: " + system.name)
+    # Obtain FSP levels lslic -t sys -m 8233-E8B*10095BP -F
+    # noinspection SpellCheckingInspection
+    # temp_ecnumber_primary:temp_level_primary:temp_ecnumber_secondary:temp_level_secondary
+    # :perm_ecnumber_primary:perm_level_primary:perm_ecnumber_secondary:perm_level_secondary
+    try:
+        response = hmc_ssh.execute_command(
+            "lslic -t sys -m "
+            + '"'
+            + system.name
+            + '"'
+            + " -F temp_ecnumber_primary:temp_level_primary:"
+            + "perm_ecnumber_primary:perm_level_primary",
+            30,
+        )
+        # Due to the long variable names, split the 4 variable assignment
+        (
+            system.fsp_primary.temp_ecnumber,
+            system.fsp_primary.temp_level,
+            system.fsp_primary.perm_ecnumber,
+            system.fsp_primary.perm_level,
+        ) = (
+            response[0].replace("\n", "").split(":")
+        )
+    except:
+        logger.error("Error obtaining primary FSP's data, check previous messages.")
+
+    try:
+        response = hmc_ssh.execute_command(
+            "lslic -t sys -m "
+            + '"'
+            + system.name
+            + '"'
+            + " -F temp_ecnumber_secondary:temp_level_secondary:"
+            + "perm_ecnumber_secondary:perm_level_secondary",
+            30,
+        )
+        if "unavailable" not in response:
+            (
+                system.fsp_secondary.temp_ecnumber,
+                system.fsp_secondary.temp_level,
+                system.fsp_secondary.perm_ecnumber,
+                system.fsp_secondary.perm_level,
+            ) = (
+                response[0].replace("\n", "").split(":")
+            )
+    except:
+        logger.error("Error obtaining secondary FSP's data, check previous messages.")
+    # Obtain system capabilities - This fails safe, if the command doesn't exist, it'll store that response
+    response = hmc_ssh.execute_command(
+        "lssyscfg -r sys -m " + '"' + system.name + '"' + " -F capabilities", 30
+    )
+    system.capabilities = response[0].replace("\n", "")
+
+    # Obtain system state, if it's not Operating or Standby we cannot collect anything else
+    response = hmc_ssh.execute_command(
+        "lssyscfg -r sys -m " + '"' + system.name + '"' + " -F state", 30
+    )
+
+    if "Operating" in response[0] or "Standby" in response[0]:
+        # Obtain IO slots
+        try:
+            response = hmc_ssh.execute_command(
+                "lshwres -m "
+                + '"'
+                + system.name
+                + '"'
+                + " -r io --rsubtype slot -F feature_codes:description:"
+                + "unit_phys_loc:phys_loc:drc_name"
+            )
+            for slot in response:
+                fc, desc, upl, pl, drcn = slot.replace("\n", "").split(":")
+                system.io_slots.append(
+                    IOSlot(
+                        feature_codes=fc,
+                        description=desc,
+                        unit_phys_loc=upl,
+                        phys_loc=pl,
+                        drc_name=drcn,
+                    )
+                )
+        except Exception as e:
+            print_red(
+                "Error during IO Slot collection for System: "
+                + system.name
+                + " please check log file."
+            )
+            if __debug__:
+                logger.exception(e)
+            logger.info(
+                "Error during IO Slot collection for System: "
+                + system.name
+                + " please check previous messages."
+            )
+
+        # Obtain LPAR list
+        try:
+            command = (
+                "lssyscfg -r lpar -m "
+                + '"'
+                + system.name
+                + '"'
+                + " -F lpar_id:name:lpar_env:state"
+            )
+            response = hmc_ssh.execute_command(command, 120)
+            for lpar in response:
+                l_id, l_name, l_env, running = lpar.replace("\n", "").split(":")
+                system.partition_list.append(
+                    LPAR(name=l_name, lpar_id=l_id, state=running, lpar_env=l_env)
+                )
+            for lpar in system.partition_list:
+                command = (
+                    "lssyscfg -r lpar -m "
+                    + '"'
+                    + system.name
+                    + '"'
+                    + ' --filter "lpar_names='
+                    + lpar.name
+                    + '" -F os_version:rmc_ipaddr --header --osrefresh'
+                )
+                response = exec_hmc_cmd_adapt(hmc_ssh, command, 120)
+                if "rmc_ipaddr" in response[0]:
+                    lpar.os_level, lpar.rmc_ip = (
+                        response[1].replace("\n", "").split(":")
+                    )
+                elif "os_version" in response[0]:
+                    lpar.os_level = response[1].replace("\n", "")
+
+        except Exception as e:
+            print_red(
+                "Error during LPAR information collection for System: "
+                + system.name
+                + " please check log file."
+            )
+            if __debug__:
+                logger.exception(e)
+            logger.info(
+                "Error during LPAR information collection for System: "
+                + system.name
+                + " please check previous messages."
+            )
+        try:
+            # Obtain IO topology
+            response = hmc_ssh.execute_command(
+                "lsiotopo -m "
+                + '"'
+                + system.name
+                + '"'
+                + " -F slot_enclosure:leading_hub_port:trailing_hub_port",
+                30,
+            )
+            # Convert response to dictionary and back to list, a dictionary cannot have duplicate keys.
+            deduped_response = list(dict.fromkeys(response))
+
+            # Populate the system object with each enclosure (CEC included)
+            for enclosure in deduped_response:
+                enclosure_name, leading_port, trailing_port = enclosure.replace(
+                    "\n", ""
+                ).split(":")
+                system.enclosure_topo.append(
+                    EnclosureTopology(
+                        enclosure=enclosure_name,
+                        leading_hub_port=leading_port,
+                        trailing_hub_port=trailing_port,
+                    )
+                )
+        except Exception as e:
+            print_red(
+                "Error during IO Topology collection for System: "
+                + system.name
+                + " please check log file."
+            )
+            if __debug__:
+                logger.exception(e)
+            logger.info(
+                "Error during IO Topology collection for System: "
+                + system.name
+                + " please check previous messages."
+            )
+
+    else:
+        # If system is not powered on and connected, we cannot collect the rest of the data
+        print_red(
+            "System: "
+            + system.name
+            + ' must be "Operating" or "Standby" for complete collection'
+        )
+        logger.info(
+            "System: "
+            + system.name
+            + ' must be "Operating" or "Standby" for complete collection'
+        )
+
+    print("Collection finished for System: " + system.name)
+    logger.info("Collection finished for System: " + system.name)
+
+
+def run_on_hmc_sessions(hmc_ssh, items, work, sessions=1, on_done=None, describe=str):
+    """
+    : Calls work(client, item) for every item, then on_done(item) from the calling thread
+    : With more than one session, up to sessions workers run concurrently. hmc_ssh is one of the sessions, the other
+    : workers open their own SSH session to the HMC copied from it, so at most sessions are open against the HMC.
+    : If the HMC has an AdaptiveLimiter, the workers running at once follow its limit and a new session is only
+    : opened when the limit grows past the sessions already open.
+    : Errors are logged with describe(item) and don't stop the other items.
+    """
+    # Import the RemoteClient to open the extra HMC sessions
+    from sshclient import RemoteClient
+
+    if sessions <= 1 or len(items) <= 1:
+        for item in items:
+            work(hmc_ssh, item)
+            if on_done:
+                on_done(item)
+        return
+    limiter = RemoteClient.limiters.get((hmc_ssh.host, hmc_ssh.port))
+    # Sessions not in use by a worker, the caller's session is used first
+    idle = [hmc_ssh]
+    opened = []
+    clients_lock = threading.Lock()
+
+    def run(item):
+        if limiter is not None:
+            limiter.acquire_session()
+        with clients_lock:
+            if idle:
+                client = idle.pop()
+            else:
+                client = RemoteClient(
+                    host=hmc_ssh.host,
+                    user=hmc_ssh.user,
+                    password=hmc_ssh.password,
+                    remote_path=hmc_ssh.remote_path,
+                    port=hmc_ssh.port,
+                    transport=hmc_ssh.transport,
+                )
+                opened.append(client)
+        try:
+            work(client, item)
+        finally:
+            with clients_lock:
+                idle.append(client)
+            if limiter is not None:
+                limiter.release_session()
+        return item
+
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="hmc") as executor:
+        futures = {executor.submit(run, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print_red(
+                    "Error during collection for "
+                    + describe(item)
+                    + " please check log file."
+                )
+                if __debug__:
+                    logger.exception(e)
+                logger.error(
+                    "Error during collection for "
+                    + describe(item)
+                    + " please check previous messages."
+                )
+            if on_done:
+                on_done(item)
+    for client in opened:
+        if client.conn is not None:
+            client.disconnect()
+
+
+def collect_managed_systems(hmc_ssh, managed_systems, sessions=1, on_done=None):
+    """
+    : Collects every Managed System, calling on_done(system) as each one finishes
+    : With more than one session, systems are collected concurrently by up to sessions workers, as many as the HMC's
+    : limiter allows, each one with its own SSH session to the HMC, hmc_ssh being one of them. Each worker only
+    : writes to its own ManagedSystem and the list is never reordered, so the output keeps the HMC's system order.
+    """
+    if sessions > 1 and len(managed_systems) > 1:
+        print(
+            f"Collecting {len(managed_systems)} Managed Systems using up to {sessions} HMC sessions."
+        )
+        logger.info(
+            f"Collecting {len(managed_systems)} Managed Systems using up to {sessions} HMC sessions."
+        )
+    run_on_hmc_sessions(
+        hmc_ssh,
+        managed_systems,
+        collect_managed_system,
+        sessions=sessions,
+        on_done=on_done,
+        describe=lambda system: "System: " + system.name,
+    )
+
+
+# Commands collected from every VIOS and the artifact each one goes to. viosvrcmd runs a single command, its -c
+# doesn't allow ;, > or |, so each one is a round trip to the HMC.
+VIOS_COMMANDS = [
+    ("errlog", "ErrorLog"),
+    ("errlog -ls", "ErrorLog"),
+    ("lsdev -vpd", "vpd"),
+]
+
+
+def collect_vios(hmc_ssh, system, lpar, output_dir):
+    """
+    : Collects the error log and VPD of a VIOS into the -ErrorLog.json and -vpd.json files
+    """
+    artifacts = {}
+    for command, artifact in VIOS_COMMANDS:
+        if artifact in artifacts and artifacts[artifact] is None:
+            # An earlier command for this artifact already failed
+            continue
+        try:
+            j_list = hmc_ssh.execute_command(
+                "viosvrcmd -m "
+                + '"'
+                + system.name
+                + '"'
+                + " --id "
+                + lpar.id
+                + ' -c "'
+                + command
+                + '"'
+            )
+            artifacts[artifact] = artifacts.get(artifact, []) + j_list
+        except Exception as e:
+            artifacts[artifact] = None
+            description = "error log" if artifact == "ErrorLog" else "VPD"
+            print_red(
+                "Error trying to get "
+                + description
+                + " from VIOS: "
+                + lpar.name
+                + " for system: "
+                + system.name
+            )
+            if __debug__:
+                logger.exception(e)
+            logger.info(
+                "Error trying to get "
+                + description
+                + " from VIOS: "
+                + lpar.name
+                + " for system: "
+                + system.name
+            )
+    for artifact, j_list in artifacts.items():
+        if j_list is None:
+            continue
+        with open(
+            output_dir
+            + "\\"
+            + system.name
+            + "-"
+            + lpar.name
+            + "-"
+            + artifact
+            + ".json",
+            "w+",
+        ) as f:
+            f.write(json.dumps(j_list, indent=4))
+
+
+def collect_vioses(hmc_ssh, managed_systems, output_dir, sessions=1):
+    """
+    : Collects every running VIOS of the Managed Systems, up to sessions of them at the same time
+    """
+    vioses = [
+        (system, lpar)
+        for system in managed_systems
+        for lpar in system.partition_list
+        if "vioserver" in lpar.env and "Running" in lpar.state
+    ]
+    run_on_hmc_sessions(
+        hmc_ssh,
+        vioses,
+        lambda client, vios: collect_vios(client, vios[0], vios[1], output_dir),
+        sessions=sessions,
+        describe=lambda vios: "VIOS: " + vios[1].name + " for system: " + vios[0].name,
+    )
@@ -0,0 +1,360 @@
+# ****************************************************************************
+# * powercollector.daemon                                                    *
+# * Continuous collection over a persistent HMC session, each collector      *
+# * runs at its own interval and writes timestamped deltas                   *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import JSON to write the deltas and the status file
+import json
+
+# Import os to use file functions
+import os
+
+# Import time to schedule the collectors
+import time
+
+# Import date to timestamp the deltas
+from datetime import datetime
+
+# Import logger for the main log file
+from loguru import logger
+
+# Import common functions from common.py
+from common import print_red, exec_hmc_cmd_adapt
+
+# Import the event store from events.py
+from events import (
+    HARDWARE_EVENT_FIELDS,
+    days_since,
+    event_store_file,
+    merge_console_events,
+    merge_hardware_events,
+    read_event_store,
+    save_event_store,
+)
+
+# Default interval in seconds of each collector, overridden with --intervals
+DEFAULT_INTERVALS = {
+    "events": 300,
+    "lpar-state": 300,
+    "vios-errlog": 1800,
+    "firmware": 21600,
+    "io-slots": 21600,
+}
+
+
+def list_systems(hmc_ssh):
+    response = hmc_ssh.execute_command("lssyscfg -r sys -F name", 60)
+    return [line.replace("\n", "") for line in response if line.strip()]
+
+
+def collect_events(hmc_ssh, base_dir, hmc_src):
+    """
+    : Merges the events since the last run into the HMC's event store and returns every stored event
+    """
+    store_file = event_store_file(base_dir, hmc_src)
+    store = read_event_store(store_file)
+    days = days_since(store["hardware"]["watermark"])
+    cmd = "lssvcevents -t hardware"
+    if days:
+        cmd += " -d " + str(days)
+    cmd += " -F " + ":".join(HARDWARE_EVENT_FIELDS) + " --header"
+    merge_hardware_events(store["hardware"], exec_hmc_cmd_adapt(hmc_ssh, cmd, 120))
+    days = days_since(store["console"]["watermark"])
+    cmd = "lssvcevents -t console"
+    if days:
+        cmd += " -d " + str(days)
+    merge_console_events(store["console"], hmc_ssh.execute_command(cmd, 60))
+    save_event_store(store_file, store)
+    snapshot = {
+        "hardware:" + key: line for key, line in store["hardware"]["events"].items()
+    }
+    for line in store["console"]["events"]:
+        snapshot["console:" + line] = line
+    return snapshot
+
+
+def collect_lpar_state(hmc_ssh, base_dir, hmc_src):
+    snapshot = {}
+    for system in list_systems(hmc_ssh):
+        response = hmc_ssh.execute_command(
+            "lssyscfg -r lpar -m "
+            + '"'
+            + system
+            + '"'
+            + " -F lpar_id:name:lpar_env:state",
+            120,
+        )
+        for line in response:
+            lpar_id, name, env, state = line.replace("\n", "").split(":", 3)
+            snapshot[system + ":" + lpar_id] = {
+                "name": name,
+                "env": env,
+                "state": state,
+            }
+    return snapshot
+
+
+def collect_firmware(hmc_ssh, base_dir, hmc_src):
+    snapshot = {}
+    for system in list_systems(hmc_ssh):
+        response = hmc_ssh.execute_command(
+            "lslic -t sys -m "
+            + '"'
+            + system
+            + '"'
+            + " -F temp_ecnumber_primary:temp_level_primary:"
+            + "perm_ecnumber_primary:perm_level_primary",
+            30,
+        )
+        snapshot[system] = response[0].replace("\n", "") if response else ""
+    return snapshot
+
+
+def collect_io_slots(hmc_ssh, base_dir, hmc_src):
+    snapshot = {}
+    for system in list_systems(hmc_ssh):
+        response = hmc_ssh.execute_command(
+            "lshwres -m "
+            + '"'
+            + system
+            + '"'
+            + " -r io --rsubtype slot -F feature_codes:description:"
+            + "unit_phys_loc:phys_loc:drc_name",
+            30,
+        )
+        for line in response:
+            # drc_name, the slot's location code, is the last attribute
+            snapshot[system + ":" + line.replace("\n", "").rsplit(":", 1)[-1]] = (
+                line.replace("\n", "")
+            )
+    return snapshot
+
+
+def collect_vios_errlog(hmc_ssh, base_dir, hmc_src):
+    snapshot = {}
+    for system in list_systems(hmc_ssh):
+        response = hmc_ssh.execute_command(
+            "lssyscfg -r lpar -m "
+            + '"'
+            + system
+            + '"'
+            + " -F lpar_id:name:lpar_env:state",
+            120,
+        )
+        for line in response:
+            lpar_id, name, env, state = line.replace("\n", "").split(":", 3)
+            if "vioserver" not in env or "Running" not in state:
+                continue
+            response = hmc_ssh.execute_command(
+                "viosvrcmd -m "
+                + '"'
+                + system
+                + '"'
+                + " --id "
+                + lpar_id
+                + ' -c "errlog"'
+            )
+            # The first line is the errlog header
+            for entry in response[1:]:
+                snapshot[system + ":" + name + ":" + entry.replace("\n", "")] = (
+                    entry.replace("\n", "")
+                )
+    return snapshot
+
+
+COLLECTORS = {
+    "events": collect_events,
+    "lpar-state": collect_lpar_state,
+    "vios-errlog": collect_vios_errlog,
+    "firmware": collect_firmware,
+    "io-slots": collect_io_slots,
+}
+
+
+def parse_intervals(text):
+    """
+    : Parses "events=300,firmware=3600" into collector intervals in seconds, unknown collectors are rejected
+    : and an interval of 0 disables the collector
+    """
+    intervals = dict(DEFAULT_INTERVALS)
+    if not text:
+        return intervals
+    for item in text.split(","):
+        name, separator, seconds = item.partition("=")
+        name = name.strip()
+        if not separator:
+            raise ValueError(
+                "Invalid interval " + item + ", expected name=seconds, e.g. events=300"
+            )
+        if name not in COLLECTORS:
+            raise ValueError(
+                "Unknown collector "
+                + name
+                + ", valid collectors are: "
+                + ", ".join(COLLECTORS)
+            )
+        try:
+            interval = int(seconds)
+        except ValueError:
+            interval = -1
+        if interval < 0:
+            raise ValueError(
+                "Invalid interval "
+                + item
+                + ", expected name=seconds with 0 or more seconds, e.g. events=300"
+            )
+        intervals[name] = interval
+    return intervals
+
+
+def snapshot_delta(previous, current):
+    """
+    : Returns the entries added, changed and removed between two snapshots
+    """
+    previous = previous or {}
+    return {
+        "added": {key: value for key, value in current.items() if key not in previous},
+        "changed": {
+            key: value
+            for key, value in current.items()
+            if key in previous and previous[key] != value
+        },
+        "removed": [key for key in previous if key not in current],
+    }
+
+
+class Collector:
+    # One scheduled collector with its last snapshot and run statistics
+
+    def __init__(self, name, interval, collect):
+        self.name = name
+        self.interval = interval
+        self.collect = collect
+        self.snapshot = None
+        # Every collector first runs when the daemon starts
+        self.next_run = time.time()
+        self.last_run = None
+        self.last_duration = None
+        self.last_status = None
+        self.last_changes = None
+        self.runs = 0
+        self.failures = 0
+
+    def status(self):
+        return {
+            "interval": self.interval,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "last_status": self.last_status,
+            "last_changes": self.last_changes,
+            "runs": self.runs,
+            "failures": self.failures,
+            "next_run": datetime.fromtimestamp(self.next_run).isoformat(
+                timespec="seconds"
+            ),
+        }
+
+
+def write_status(status_file, started, hmc_src, collectors):
+    status = {
+        "hmc": hmc_src,
+        "started": started,
+        "updated": datetime.now().isoformat(timespec="seconds"),
+        "collectors": {collector.name: collector.status() for collector in collectors},
+    }
+    with open(status_file + ".tmp", "w") as file:
+        json.dump(status, file, indent=4)
+    os.replace(status_file + ".tmp", status_file)
+
+
+def run_collector(collector, hmc_ssh, base_dir, hmc_src, output_dir):
+    """
+    : Runs one collector and writes its delta against the previous run, the first run writes the full snapshot
+    """
+    started = time.time()
+    collector.last_run = datetime.now().isoformat(timespec="seconds")
+    collector.runs += 1
+    try:
+        snapshot = collector.collect(hmc_ssh, base_dir, hmc_src)
+    except Exception as e:
+        collector.failures += 1
+        collector.last_status = "failed: " + str(e)
+        collector.last_duration = round(time.time() - started, 3)
+        print_red(
+            "Daemon collector " + collector.name + " failed. Please check the log file."
+        )
+        if __debug__:
+            logger.exception(e)
+        logger.error(
+            "Daemon collector "
+            + collector.name
+            + " failed. Please check previous messages."
+        )
+        # A dropped session is opened again on the next command
+        if not hmc_ssh.is_connected():
+            hmc_ssh.conn = None
+        return
+    collector.last_duration = round(time.time() - started, 3)
+    delta = snapshot_delta(collector.snapshot, snapshot)
+    changes = len(delta["added"]) + len(delta["changed"]) + len(delta["removed"])
+    collector.last_status = "ok"
+    collector.last_changes = changes
+    if collector.snapshot is None or changes:
+        delta_file = (
+            output_dir
+            + "\\"
+            + collector.name
+            + "-"
+            + datetime.now().strftime("%Y%m%d-%H-%M-%S")
+            + ".json"
+        )
+        with open(delta_file, "w+") as file:
+            json.dump(
+                {
+                    "collector": collector.name,
+                    "time": collector.last_run,
+                    "duration": collector.last_duration,
+                    "full": collector.snapshot is None,
+                    **delta,
+                },
+                file,
+                indent=4,
+            )
+    logger.info(
+        f"Daemon collector {collector.name}: {changes} changes in {collector.last_duration} seconds."
+    )
+    collector.snapshot = snapshot
+
+
+def run_daemon(hmc_ssh, hmc_src, base_dir, output_dir, intervals):
+    """
+    : Runs every enabled collector at its interval over the open HMC session until ctrl-C
+    : Progress is written to DaemonStatus.json in the output folder
+    """
+    collectors = [
+        Collector(name, intervals[name], COLLECTORS[name])
+        for name in COLLECTORS
+        if intervals.get(name)
+    ]
+    started = datetime.now().isoformat(timespec="seconds")
+    status_file = output_dir + "\\" + "DaemonStatus.json"
+    print(
+        "Daemon started, collectors: "
+        + ", ".join(f"{c.name} every {c.interval}s" for c in collectors)
+        + ". Press ctrl-C to stop."
+    )
+    logger.info(
+        "Daemon started, collectors: "
+        + ", ".join(f"{c.name} every {c.interval}s" for c in collectors)
+    )
+    while collectors:
+        collector = min(collectors, key=lambda c: c.next_run)
+        wait = collector.next_run - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        run_collector(collector, hmc_ssh, base_dir, hmc_src, output_dir)
+        collector.next_run = time.time() + collector.interval
+        write_status(status_file, started, hmc_src, collectors)
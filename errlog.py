@@ -0,0 +1,488 @@
+# ****************************************************************************
+# * powercollector.errlog                                                    *
+# * Parses the VIOS errlog and AIX errpt output of one or more runs into     *
+# * columnar records and aggregates them across the fleet                    *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import argparse to parse command line arguments
+import argparse
+
+# Import csv to export the records
+import csv
+
+# Import JSON to read the VIOS error logs and write the aggregations
+import json
+
+# Import re to parse the errlog lines
+import re
+
+# Import sys to write the output
+import sys
+
+# Import time to report the parsing time
+import time
+
+# Import zipfile to read the archived runs
+import zipfile
+
+# Import array for the columns, each one is a compact block of integers
+from array import array
+
+# Import Counter to aggregate whole columns at once
+from collections import Counter
+
+# Import compress to filter the columns
+from itertools import compress
+
+# Import date to parse and bucket the timestamps
+from datetime import datetime, timezone
+
+# Import pathlib to find the runs
+from pathlib import Path
+
+# Import the tarball readers of the search index
+from searchindex import folder_archives, run_systems, split_archive_name, zip_archives
+
+# Dictionary encoded columns, every value is stored once and the column holds its code
+COLUMNS = [
+    "identifier",
+    "label",
+    "type",
+    "class",
+    "resource",
+    "description",
+    "system",
+    "lpar",
+    "run",
+]
+
+# errlog/errpt summary: IDENTIFIER TIMESTAMP(MMDDhhmmYY) T C RESOURCE_NAME DESCRIPTION
+SUMMARY_REGEX = re.compile(r"([0-9A-F]{8}) +(\d{10}) +(\S) +(\S) +(\S+)\s*(.*)")
+# errlog -ls/errpt -a entries are separated by a line of dashes
+DETAIL_SEPARATOR_REGEX = re.compile(r"^-{20,}\s*$")
+DETAIL_FIELDS = {
+    "LABEL:": "label",
+    "IDENTIFIER:": "identifier",
+    "Date/Time:": "timestamp",
+    "Class:": "class",
+    "Type:": "type",
+    "Resource Name:": "resource",
+}
+
+# Order of the parsed records
+RECORD_FIELDS = [
+    "identifier",
+    "label",
+    "type",
+    "class",
+    "resource",
+    "description",
+    "timestamp",
+]
+
+BUCKETS = {"hour": 3600, "day": 86400, "week": 604800, "month": None}
+# First Monday after the epoch
+WEEK_OFFSET = 4 * 86400
+
+
+def summary_time(text):
+    # MMDDhhmmYY, errlog only keeps two digits of the year
+    try:
+        return int(
+            datetime(
+                2000 + int(text[8:10]),
+                int(text[0:2]),
+                int(text[2:4]),
+                int(text[4:6]),
+                int(text[6:8]),
+                tzinfo=timezone.utc,
+            ).timestamp()
+        )
+    except ValueError:
+        return 0
+
+
+def detail_time(text):
+    # Thu Jan  1 12:00:00 2026, newer levels add the time zone before the year
+    parts = text.split()
+    if len(parts) == 6:
+        del parts[4]
+    try:
+        return int(
+            datetime.strptime(" ".join(parts), "%a %b %d %H:%M:%S %Y")
+            .replace(tzinfo=timezone.utc)
+            .timestamp()
+        )
+    except ValueError:
+        return 0
+
+
+def parse_errlog(lines):
+    """
+    : Parses errlog/errpt output and returns (summary records, detailed records) as RECORD_FIELDS tuples
+    : The output of a VIOS holds both errlog and errlog -ls, so each form is returned on its own.
+    """
+    summary = []
+    detailed = []
+    # The same minute shows up many times, each timestamp is converted once
+    stamps = {}
+    entry = None
+    description_next = False
+    for line in lines:
+        match = SUMMARY_REGEX.match(line)
+        if match:
+            identifier, text, kind, kind_class, resource, description = match.groups()
+            stamp = stamps.get(text)
+            if stamp is None:
+                stamp = stamps[text] = summary_time(text)
+            summary.append(
+                (
+                    identifier,
+                    "",
+                    kind,
+                    kind_class,
+                    resource,
+                    description.rstrip(),
+                    stamp,
+                )
+            )
+            continue
+        if DETAIL_SEPARATOR_REGEX.match(line):
+            if entry:
+                detailed.append(entry)
+            entry = {}
+            description_next = False
+            continue
+        if entry is None:
+            continue
+        stripped = line.strip()
+        if description_next and stripped:
+            entry["description"] = stripped
+            description_next = False
+            continue
+        if stripped == "Description":
+            description_next = True
+            continue
+        for prefix, field in DETAIL_FIELDS.items():
+            if stripped.startswith(prefix) and field not in entry:
+                value = stripped[len(prefix) :].strip()
+                if field == "timestamp":
+                    value = detail_time(value)
+                elif field == "type":
+                    # errpt -a spells the type out, the summary only has its initial
+                    value = value[:1]
+                entry[field] = value
+                break
+    if entry:
+        detailed.append(entry)
+    detailed = [
+        tuple(
+            entry.get(field, 0 if field == "timestamp" else "")
+            for field in RECORD_FIELDS
+        )
+        for entry in detailed
+    ]
+    return summary, detailed
+
+
+def host_records(lines):
+    """
+    : Returns the records of one host, the summary lines are counted and errlog -ls only adds their labels
+    """
+    summary, detailed = parse_errlog(lines)
+    if not summary:
+        return detailed
+    labels = {record[0]: record[1] for record in detailed if record[0] and record[1]}
+    if not labels:
+        return summary
+    return [
+        record[:1] + (labels.get(record[0], ""),) + record[2:] for record in summary
+    ]
+
+
+class ErrlogTable:
+    # Columnar errlog records. Text columns are dictionary encoded into integer arrays and the timestamps are
+    # epoch seconds, so an aggregation is one Counter over whole columns instead of a loop over records.
+
+    def __init__(self):
+        self.values = {column: [] for column in COLUMNS}
+        self.codes = {column: {} for column in COLUMNS}
+        self.columns = {column: array("I") for column in COLUMNS}
+        self.timestamps = array("q")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def code(self, column, value):
+        codes = self.codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.values[column])
+            self.values[column].append(value)
+        return code
+
+    def extend(self, records, **fields):
+        """
+        : Appends RECORD_FIELDS tuples, the fields (system, LPAR, run) are the same for all of them
+        """
+        if not records:
+            return
+        # Transposed once, each column is then encoded with a lookup of its distinct values
+        transposed = dict(zip(RECORD_FIELDS, zip(*records)))
+        for column in COLUMNS:
+            if column in fields:
+                code = self.code(column, fields[column])
+                self.columns[column].extend([code] * len(records))
+                continue
+            values = transposed.get(column) or [""] * len(records)
+            for value in set(values):
+                self.code(column, value)
+            self.columns[column].extend(map(self.codes[column].__getitem__, values))
+        self.timestamps.extend(transposed["timestamp"])
+
+    def mask(self, where=None, since=None, until=None):
+        """
+        : Returns the selection for {column: values} and a time range, or None to select every record
+        """
+        mask = None
+        for column, values in (where or {}).items():
+            wanted = {self.codes[column][v] for v in values if v in self.codes[column]}
+            selected = [code in wanted for code in self.columns[column]]
+            mask = (
+                selected if mask is None else [a and b for a, b in zip(mask, selected)]
+            )
+        if since is not None or until is not None:
+            since = since or 0
+            until = until or float("inf")
+            selected = [since <= stamp < until for stamp in self.timestamps]
+            mask = (
+                selected if mask is None else [a and b for a, b in zip(mask, selected)]
+            )
+        return mask
+
+    def buckets(self, bucket):
+        """
+        : Returns a column with the start of each record's time bucket
+        """
+        size = BUCKETS[bucket]
+        if size:
+            # Weeks start on Monday, the epoch was a Thursday
+            offset = WEEK_OFFSET if bucket == "week" else 0
+            return array(
+                "q",
+                [stamp - (stamp - offset) % size for stamp in self.timestamps],
+            )
+        # Months have no fixed length, the distinct days are few so each one is converted once
+        days = [stamp - stamp % 86400 for stamp in self.timestamps]
+        months = {}
+        for day in set(days):
+            start = datetime.fromtimestamp(day, timezone.utc).replace(day=1)
+            months[day] = int(start.timestamp())
+        return array("q", [months[day] for day in days])
+
+    def count_by(self, by, bucket=None, where=None, since=None, until=None):
+        """
+        : Counts the records for each combination of the by columns (and time bucket), largest first
+        """
+        keys = [self.columns[column] for column in by]
+        if bucket:
+            keys.append(self.buckets(bucket))
+        mask = self.mask(where, since, until)
+        if mask is not None:
+            keys = [list(compress(key, mask)) for key in keys]
+        counts = Counter(zip(*keys))
+        results = []
+        for key, count in counts.most_common():
+            row = [self.values[column][code] for column, code in zip(by, key)]
+            if bucket:
+                row.append(
+                    datetime.fromtimestamp(key[-1], timezone.utc).strftime(
+                        "%Y-%m-%d %H:%M" if bucket == "hour" else "%Y-%m-%d"
+                    )
+                )
+            results.append((tuple(row), count))
+        return results
+
+    def records(self):
+        for number, stamp in enumerate(self.timestamps):
+            record = {
+                column: self.values[column][self.columns[column][number]]
+                for column in COLUMNS
+            }
+            record["timestamp"] = (
+                datetime.fromtimestamp(stamp, timezone.utc).isoformat() if stamp else ""
+            )
+            yield record
+
+
+def error_log_name(file_name, systems):
+    # <system>-<lpar>-ErrorLog.json, the system name keeps its spaces
+    stem = file_name[: -len("-ErrorLog.json")]
+    for system in sorted(systems, key=len, reverse=True):
+        if stem.startswith(system + "-"):
+            return system, stem[len(system) + 1 :]
+    return "", stem
+
+
+def load_run(table, run, stores=()):
+    """
+    : Adds the VIOS -ErrorLog.json files and the -error.txt files of the tarballs of a run folder or zip
+    """
+    run = Path(run)
+    name = run.stem if run.is_file() else run.name
+    stores = [str(store) for store in stores]
+    systems = run_systems(run)
+    if run.is_file():
+        with zipfile.ZipFile(run) as zip_file:
+            for file_name in zip_file.namelist():
+                if file_name.endswith("-ErrorLog.json"):
+                    system, lpar = error_log_name(file_name.rsplit("/", 1)[-1], systems)
+                    table.extend(
+                        host_records(json.loads(zip_file.read(file_name))),
+                        system=system,
+                        lpar=lpar,
+                        run=name,
+                    )
+        archives = zip_archives(run, stores)
+    else:
+        for file in sorted(run.glob("*-ErrorLog.json")):
+            system, lpar = error_log_name(file.name, systems)
+            with open(file, "r") as f:
+                table.extend(
+                    host_records(json.load(f)), system=system, lpar=lpar, run=name
+                )
+        archives = folder_archives(run, stores)
+    for archive, members in archives:
+        system, lpar = split_archive_name(archive, systems)
+        for member, data in members:
+            if member.endswith("-error.txt"):
+                lines = data.decode("utf-8", errors="replace").splitlines()
+                table.extend(host_records(lines), system=system, lpar=lpar, run=name)
+
+
+def parse_where(items):
+    """
+    : Parses ["label=DISK_ERR7", "class=H"] into {column: [values]}
+    """
+    where = {}
+    for item in items or []:
+        column, _, value = item.partition("=")
+        if column not in COLUMNS:
+            raise ValueError(
+                "Unknown column "
+                + column
+                + ", valid columns are: "
+                + ", ".join(COLUMNS)
+            )
+        where.setdefault(column, []).append(value)
+    return where
+
+
+def format_table(header, rows):
+    rows = [header] + rows
+    widths = [
+        max(len(str(row[column])) for row in rows) for column in range(len(header))
+    ]
+    return "\n".join(
+        "  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="errlog",
+        description="Parse the VIOS error logs and AIX errpt files of powercollector runs and count them.",
+    )
+    parser.add_argument(
+        "runs", type=Path, nargs="+", help="Run folders or their .zip archives."
+    )
+    parser.add_argument(
+        "--by",
+        default="label",
+        help="Comma separated columns to count by: " + ", ".join(COLUMNS) + ".",
+    )
+    parser.add_argument("--bucket", choices=list(BUCKETS), help="Also count by time.")
+    parser.add_argument(
+        "--where",
+        action="append",
+        metavar="column=value",
+        help="Only count these records. Can be repeated.",
+    )
+    parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Only count entries since this date.",
+    )
+    parser.add_argument("--top", type=int, default=50, help="Number of rows to show.")
+    parser.add_argument(
+        "--format", choices=["table", "json"], default="table", help="Output format."
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        action="append",
+        default=[],
+        help="Result store of runs collected with --resultstore. Can be repeated.",
+    )
+    parser.add_argument(
+        "--records", type=Path, help="Also write every record to this CSV file."
+    )
+    args = parser.parse_args()
+    by = [column.strip() for column in args.by.split(",") if column.strip()]
+    if not by and not args.bucket:
+        parser.error("--by or --bucket is required.")
+    try:
+        where = parse_where(args.where)
+        for column in by:
+            if column not in COLUMNS:
+                raise ValueError(
+                    "Unknown column "
+                    + column
+                    + ", valid columns are: "
+                    + ", ".join(COLUMNS)
+                )
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    table = ErrlogTable()
+    for run in args.runs:
+        load_run(table, run, args.store)
+    parsed = time.perf_counter()
+    since = (
+        int(args.since.replace(tzinfo=timezone.utc).timestamp()) if args.since else None
+    )
+    results = table.count_by(by, args.bucket, where, since)
+    counted = time.perf_counter()
+    if args.records:
+        with open(args.records, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=COLUMNS + ["timestamp"])
+            writer.writeheader()
+            writer.writerows(table.records())
+    header = tuple(by) + ((args.bucket,) if args.bucket else ()) + ("count",)
+    if args.format == "json":
+        print(
+            json.dumps(
+                [
+                    dict(zip(header, key + (count,)))
+                    for key, count in results[: args.top]
+                ],
+                indent=4,
+            )
+        )
+    else:
+        print(
+            format_table(header, [key + (count,) for key, count in results[: args.top]])
+        )
+    print(
+        f"{len(table)} entries parsed in {parsed - started:.2f} seconds, "
+        f"counted in {counted - parsed:.3f} seconds.",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# ****************************************************************************
+# * powercollector.events                                                    *
+# * Incremental HMC service event collection with a local event store        *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import JSON to read and write the event store and output files
+import json
+
+# Import os to use file functions
+import os
+
+# Import re to find the timestamps in the event lines
+import re
+
+# Import date to compute the day window
+from datetime import datetime
+
+# Import logger for the main log file
+from loguru import logger
+
+# Import common functions from common.py
+from common import print_red, exec_hmc_cmd_adapt
+
+# Hardware event attributes kept in the store, problem_num and the two timestamps go first so each line can be
+# keyed and dated even if the text contains the delimiter
+HARDWARE_EVENT_FIELDS = [
+    "problem_num",
+    "first_time",
+    "last_time",
+    "refcode",
+    "status",
+    "sys_name",
+    "sys_mtms",
+    "enclosure_mtms",
+    "text",
+    "analyzing_mtms",
+    "ref_code_extn",
+    "sys_refcode",
+    "fru_details",
+]
+
+EVENT_TIME_FORMAT = "%m/%d/%Y %H:%M:%S"
+EVENT_TIME_REGEX = re.compile(r"\d\d/\d\d/\d{4} \d\d:\d\d:\d\d")
+HARDWARE_EVENT_REGEX = re.compile(
+    r"^([^:]*):(\d\d/\d\d/\d{4} \d\d:\d\d:\d\d):(\d\d/\d\d/\d{4} \d\d:\d\d:\d\d)"
+)
+
+# Extra days requested before the watermark, covers clock and time zone differences with the HMC
+WATERMARK_MARGIN_DAYS = 2
+
+
+def event_store_file(base_dir, hmc_src):
+    return base_dir + "\\" + "EventStore" + "\\" + hmc_src + "-events.json"
+
+
+def read_event_store(store_file):
+    """
+    : Returns the stored events of an HMC, or an empty store if there is none or it can't be read
+    """
+    store = {
+        "hardware": {"watermark": None, "header": None, "events": {}},
+        "console": {"watermark": None, "events": []},
+    }
+    if not os.path.exists(store_file):
+        return store
+    try:
+        with open(store_file, "r") as file:
+            store.update(json.load(file))
+    except (OSError, ValueError) as e:
+        if __debug__:
+            logger.exception(e)
+        logger.error("Event store " + store_file + " is invalid, starting a new one.")
+    return store
+
+
+def save_event_store(store_file, store):
+    os.makedirs(os.path.dirname(store_file), exist_ok=True)
+    # Write to a temporary file first so an interrupted run doesn't lose the store
+    with open(store_file + ".tmp", "w") as file:
+        json.dump(store, file)
+    os.replace(store_file + ".tmp", store_file)
+
+
+def parse_event_time(text):
+    return datetime.strptime(text, EVENT_TIME_FORMAT)
+
+
+def days_since(watermark):
+    """
+    : Returns the lssvcevents -d window that covers everything after the watermark, or None for the full history
+    """
+    if not watermark:
+        return None
+    days = (datetime.now() - parse_event_time(watermark)).days
+    return max(days, 0) + 1 + WATERMARK_MARGIN_DAYS
+
+
+def merge_hardware_events(section, response):
+    """
+    : Merges lssvcevents -F --header output into the store, an event seen again replaces the stored one
+    : since its status and last_time may have changed. Returns the number of new events.
+    """
+    # Anything else, like "No results were found.", means there is nothing to merge
+    if not response or not response[0].startswith("problem_num"):
+        return 0
+    section["header"] = response[0]
+    events = section["events"]
+    new = 0
+    for line in response[1:]:
+        match = HARDWARE_EVENT_REGEX.match(line)
+        if match:
+            key = match.group(1)
+            last_time = match.group(3)
+            if not section["watermark"] or parse_event_time(
+                last_time
+            ) > parse_event_time(section["watermark"]):
+                section["watermark"] = last_time
+        else:
+            # Lines that can't be keyed are deduplicated by their content
+            key = line
+        if key not in events:
+            new += 1
+        events[key] = line
+    return new
+
+
+def merge_console_events(section, response):
+    """
+    : Merges lssvcevents -t console output into the store. Console events have no identifier, so every stored
+    : event at or after the oldest one returned is replaced by the response, which covers that whole window.
+    : Returns the number of new events.
+    """
+    fetched = []
+    for line in response:
+        match = EVENT_TIME_REGEX.search(line)
+        fetched.append((parse_event_time(match.group(0)) if match else None, line))
+    times = [time for time, _ in fetched if time is not None]
+    if not times:
+        return 0
+    oldest = min(times)
+    kept = []
+    for line in section["events"]:
+        match = EVENT_TIME_REGEX.search(line)
+        if match and parse_event_time(match.group(0)) >= oldest:
+            continue
+        kept.append(line)
+    new = len(kept) + len(fetched) - len(section["events"])
+    section["events"] = kept + [line for _, line in fetched]
+    section["watermark"] = max(times).strftime(EVENT_TIME_FORMAT)
+    return new
+
+
+def collect_events_incremental(hmc_ssh, hmc_src, base_dir, output_dir):
+    """
+    : Collects the hardware and console events created since the last run into the HMC's event store, then writes
+    : -AllSVCEvents.json and -ConsoleEvents.json from the store. The first run collects the full history.
+    """
+    store_file = event_store_file(base_dir, hmc_src)
+    store = read_event_store(store_file)
+    try:
+        days = days_since(store["hardware"]["watermark"])
+        cmd = "lssvcevents -t hardware"
+        if days:
+            cmd += " -d " + str(days)
+        cmd += " -F " + ":".join(HARDWARE_EVENT_FIELDS) + " --header"
+        response = exec_hmc_cmd_adapt(hmc_ssh, cmd, 120)
+        new = merge_hardware_events(store["hardware"], response)
+        logger.info(
+            f"Hardware events: {len(response[1:])} received, {new} new, "
+            f"{len(store['hardware']['events'])} stored."
+        )
+        with open(output_dir + "\\" + hmc_src + "-AllSVCEvents.json", "w+") as f:
+            f.write(
+                json.dumps(
+                    (
+                        [store["hardware"]["header"]]
+                        if store["hardware"]["header"]
+                        else []
+                    )
+                    + list(store["hardware"]["events"].values()),
+                    indent=4,
+                )
+            )
+    except Exception as e:
+        if __debug__:
+            logger.exception(e)
+        print_red(
+            "HMC service events collection incomplete. Please check the log file."
+        )
+        logger.error(
+            "HMC service events collection incomplete. Please check previous messages."
+        )
+    try:
+        days = days_since(store["console"]["watermark"])
+        cmd = "lssvcevents -t console"
+        if days:
+            cmd += " -d " + str(days)
+        response = hmc_ssh.execute_command(cmd, 60)
+        new = merge_console_events(store["console"], response)
+        logger.info(
+            f"Console events: {len(response)} received, {new} new, "
+            f"{len(store['console']['events'])} stored."
+        )
+        with open(output_dir + "\\" + hmc_src + "-ConsoleEvents.json", "w+") as f:
+            f.write(json.dumps(store["console"]["events"], indent=4))
+    except Exception as e:
+        if __debug__:
+            logger.exception(e)
+        print_red(
+            "HMC console events collection incomplete. Please check the log file."
+        )
+        logger.error(
+            "HMC console events collection incomplete. Please check previous messages."
+        )
+    try:
+        save_event_store(store_file, store)
+    except OSError as e:
+        if __debug__:
+            logger.exception(e)
+        logger.error("Event store " + store_file + " could not be saved: " + str(e))
@@ -0,0 +1,291 @@
+# ****************************************************************************
+# * powercollector.instrumentation                                           *
+# * Module for optional run instrumentation: per-phase profiling, memory     *
+# * tracing and the run report                                               *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import atexit to flush pending data when the program ends through sys.exit()
+import atexit
+
+# Import cProfile and pstats to profile each phase of the collection
+import cProfile
+import pstats
+
+# Import io to capture the pstats summary for the log file
+import io
+
+# Import JSON to output the run report
+import json
+
+# Import sys to detect the platform for the RSS query
+import sys
+
+# Import time to measure the phases
+import time
+
+# Import tracemalloc to find the top allocation sites
+import tracemalloc
+
+# Import logger for the main log file
+from loguru import logger
+
+
+def peak_rss():
+    """
+    : Returns the peak resident set size of the process in bytes, or None if it cannot be obtained.
+    """
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            ctypes.windll.psapi.GetProcessMemoryInfo(
+                ctypes.windll.kernel32.GetCurrentProcess(),
+                ctypes.byref(counters),
+                counters.cb,
+            )
+            return counters.PeakWorkingSetSize
+        import resource
+
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+    except Exception as e:
+        logger.info(f"Could not obtain peak RSS: {e}")
+        return None
+
+
+# Phases are sequential, starting a phase ends the previous one. This lets the main program mark phase boundaries
+# with a single call instead of wrapping each block, and any early sys.exit() still closes the last phase.
+class PhaseProfiler:
+    def __init__(self):
+        self.output_dir = None
+        self.current = None
+        self.profile = None
+        # Finished phases waiting for an output directory, startup ends before we know where to write.
+        self.pending = []
+        self.count = 0
+
+    def start(self, name):
+        self.stop()
+        self.current = name
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        if self.profile is None:
+            return
+        self.profile.disable()
+        self.count += 1
+        self.pending.append((self.count, self.current, self.profile))
+        self.profile = None
+        self.current = None
+        self.flush()
+
+    def checkpoint(self, name):
+        pass
+
+    def set_output_dir(self, output_dir):
+        self.output_dir = output_dir
+        self.flush()
+
+    def flush(self):
+        # Write every finished phase as a standard pstats dump, loadable with pstats, snakeviz, etc.
+        if self.output_dir is None:
+            return
+        while self.pending:
+            number, name, profile = self.pending.pop(0)
+            dump_file = self.output_dir + "\\" + f"profile-{number:02d}-{name}.prof"
+            try:
+                profile.dump_stats(dump_file)
+            except OSError as e:
+                logger.error(f"Could not write profile for phase {name}: {e}")
+                continue
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(
+                10
+            )
+            logger.info(f"Profile for phase {name} written to {dump_file}")
+            logger.info(f"Top functions for phase {name}:\n{summary.getvalue()}")
+
+    def finish(self):
+        self.stop()
+        self.flush()
+
+    def results(self):
+        return None
+
+
+# Records the high-water marks of each phase: the process' peak RSS as reported by the OS and the traced Python
+# peak, plus the allocation sites holding the most memory when the phase ends.
+class MemoryTracer:
+    def __init__(self, top=10):
+        self.top = top
+        self.current = None
+        self.phases = []
+        self.checkpoints = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self, name):
+        self.stop()
+        self.current = name
+        tracemalloc.reset_peak()
+
+    def _top_sites(self):
+        # Snapshots are expensive on a large heap, so only phases take one.
+        stats = tracemalloc.take_snapshot().statistics("lineno")
+        return [
+            {
+                "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size": stat.size,
+                "count": stat.count,
+            }
+            for stat in stats[: self.top]
+        ]
+
+    @staticmethod
+    def _sample(name):
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "name": name,
+            "peak_rss": peak_rss(),
+            "traced_current": current,
+            "traced_peak": peak,
+        }
+
+    def stop(self):
+        if self.current is None:
+            return
+        sample = self._sample(self.current)
+        sample["top_sites"] = self._top_sites()
+        self.phases.append(sample)
+        logger.info(
+            f"Memory after phase {self.current}: peak RSS {sample['peak_rss']} bytes, "
+            f"traced peak {sample['traced_peak']} bytes"
+        )
+        self.current = None
+
+    def checkpoint(self, name):
+        # Lighter than a phase, used inside a phase (e.g. after each Managed System) without resetting the peak.
+        sample = self._sample(name)
+        sample["phase"] = self.current
+        self.checkpoints.append(sample)
+        logger.info(
+            f"Memory at {name}: peak RSS {sample['peak_rss']} bytes, "
+            f"traced {sample['traced_current']} bytes"
+        )
+
+    def set_output_dir(self, output_dir):
+        pass
+
+    def finish(self):
+        self.stop()
+
+    def results(self):
+        return {"memory": {"phases": self.phases, "checkpoints": self.checkpoints}}
+
+
+# The program only creates the instruments it is asked for, without any of them only phase timings are recorded.
+instruments = []
+report = {"phases": []}
+output_dir = None
+current_phase = None
+phase_started = None
+finished = False
+
+
+def enable_profiling():
+    instruments.append(PhaseProfiler())
+
+
+def enable_memory_tracing():
+    instruments.append(MemoryTracer())
+
+
+def _close_phase():
+    global current_phase
+    if current_phase is not None:
+        report["phases"].append(
+            {
+                "name": current_phase,
+                "seconds": round(time.perf_counter() - phase_started, 3),
+            }
+        )
+        current_phase = None
+
+
+def start_phase(name):
+    global current_phase, phase_started
+    _close_phase()
+    current_phase = name
+    # Close every instrument before starting any, so that no instrument measures another one's bookkeeping.
+    for instrument in reversed(instruments):
+        instrument.stop()
+    for instrument in instruments:
+        instrument.start(name)
+    phase_started = time.perf_counter()
+
+
+def checkpoint(name):
+    for instrument in instruments:
+        instrument.checkpoint(name)
+
+
+def add_to_report(section, data):
+    report[section] = data
+
+
+def set_output_dir(directory):
+    global output_dir
+    output_dir = directory
+    for instrument in instruments:
+        instrument.set_output_dir(directory)
+
+
+def save_report():
+    if output_dir is None:
+        return
+    report_file = output_dir + "\\" + "RunReport.json"
+    try:
+        with open(report_file, "w+") as file:
+            file.write(json.dumps(report, indent=4))
+        logger.info("Run report written to file: " + report_file)
+    except OSError as e:
+        logger.error(f"Could not write run report: {e}")
+
+
+def finish():
+    # Called before the output folder is archived, and again at exit in case the program ended early.
+    global finished
+    if finished:
+        return
+    finished = True
+    _close_phase()
+    for instrument in instruments:
+        instrument.finish()
+        results = instrument.results()
+        if results:
+            report.update(results)
+    save_report()
+
+
+atexit.register(finish)
@@ -0,0 +1,246 @@
+# ****************************************************************************
+# * powercollector.metrics                                                   *
+# * Live collection metrics in the Prometheus text format, served on         *
+# * localhost or rewritten to a file while the collection runs               *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import atexit to write the final metrics when the program ends through sys.exit()
+import atexit
+
+# Import functools to keep the name and docstring of the tracked functions
+import functools
+
+# Import os to replace the metrics file
+import os
+
+# Import threading to serve and write the metrics in the background
+import threading
+
+# Import time to compute the command rate
+import time
+
+# Import deque to keep the recent command times
+from collections import deque
+
+# Import the HTTP server for the metrics endpoint
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Import logger for the main log file
+from loguru import logger
+
+# Import instrumentation to read the current phase
+import instrumentation
+
+# Commands per second are averaged over this many seconds
+RATE_WINDOW = 60
+
+
+class Metrics:
+    # Counters and gauges of one run, updated from every session and LPAR worker
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.last_progress = self.started
+        self.lpars = {"pending": 0, "in_flight": 0, "done": 0, "failed": 0}
+        self.commands = {"ok": 0, "failed": 0}
+        self.recent = deque()
+        self.bytes = {"received": 0, "sent": 0}
+
+    def lpars_queued(self, count):
+        with self.lock:
+            self.lpars["pending"] += count
+
+    def lpar_started(self):
+        with self.lock:
+            # oscollectorHelper's LPARs are queued as they are read, a single --lpar is never queued
+            self.lpars["pending"] = max(0, self.lpars["pending"] - 1)
+            self.lpars["in_flight"] += 1
+
+    def lpar_finished(self, collected):
+        with self.lock:
+            self.lpars["in_flight"] -= 1
+            self.lpars["done" if collected else "failed"] += 1
+            self.last_progress = time.time()
+
+    def command(self, ok, received=0):
+        now = time.time()
+        with self.lock:
+            self.commands["ok" if ok else "failed"] += 1
+            self.bytes["received"] += received
+            self.recent.append(now)
+            self.last_progress = now
+
+    def transfer(self, direction, size):
+        with self.lock:
+            self.bytes[direction] += size
+            self.last_progress = time.time()
+
+    def render(self):
+        """
+        : Returns the metrics in the Prometheus text exposition format
+        """
+        now = time.time()
+        # There is no phase before the first one starts or after the run finished
+        phase = instrumentation.current_phase or (
+            "finished" if instrumentation.finished else "starting"
+        )
+        gauges = {}
+        for name, (help_text, read) in list(gauges_read.items()):
+            try:
+                gauges[name] = (help_text, read())
+            except Exception as e:
+                logger.info(f"Metric {name} could not be read: {e}")
+        with self.lock:
+            while self.recent and self.recent[0] < now - RATE_WINDOW:
+                self.recent.popleft()
+            rate = len(self.recent) / min(RATE_WINDOW, max(now - self.started, 1))
+            lines = [
+                "# HELP powercollector_phase Current collection phase.",
+                "# TYPE powercollector_phase gauge",
+                f'powercollector_phase{{phase="{phase}"}} 1',
+                "# HELP powercollector_lpars LPARs by OS-level collection state.",
+                "# TYPE powercollector_lpars gauge",
+            ]
+            lines += [
+                f'powercollector_lpars{{state="{state}"}} {count}'
+                for state, count in self.lpars.items()
+            ]
+            lines += [
+                "# HELP powercollector_commands_total SSH commands run.",
+                "# TYPE powercollector_commands_total counter",
+            ]
+            lines += [
+                f'powercollector_commands_total{{result="{result}"}} {count}'
+                for result, count in self.commands.items()
+            ]
+            lines += [
+                f"# HELP powercollector_commands_per_second SSH commands per second over the last {RATE_WINDOW} seconds.",
+                "# TYPE powercollector_commands_per_second gauge",
+                f"powercollector_commands_per_second {rate:.3f}",
+                "# HELP powercollector_bytes_total Bytes of command output and SCP files transferred.",
+                "# TYPE powercollector_bytes_total counter",
+            ]
+            lines += [
+                f'powercollector_bytes_total{{direction="{direction}"}} {count}'
+                for direction, count in self.bytes.items()
+            ]
+            lines += [
+                "# HELP powercollector_last_progress_timestamp_seconds Time of the last finished command, transfer or LPAR.",
+                "# TYPE powercollector_last_progress_timestamp_seconds gauge",
+                f"powercollector_last_progress_timestamp_seconds {self.last_progress:.3f}",
+                "# HELP powercollector_start_time_seconds Time the run started.",
+                "# TYPE powercollector_start_time_seconds gauge",
+                f"powercollector_start_time_seconds {self.started:.3f}",
+            ]
+        for name, (help_text, value) in gauges.items():
+            lines += [
+                f"# HELP powercollector_{name} {help_text}",
+                f"# TYPE powercollector_{name} gauge",
+                f"powercollector_{name} {value}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def serve(port, render):
+    # Prometheus scrapes any path, the endpoint only listens on localhost
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="metrics-http", daemon=True
+    ).start()
+    return server
+
+
+def write_file(metrics_file, render):
+    try:
+        with open(metrics_file + ".tmp", "w") as file:
+            file.write(render())
+        os.replace(metrics_file + ".tmp", metrics_file)
+    except OSError as e:
+        # A reader may hold the file open on Windows, the next write tries again
+        logger.info(f"Metrics file could not be written: {e}")
+
+
+# Without enable() nothing is counted.
+metrics = None
+# Gauges read when the metrics are rendered, registered by the modules that own the values even before enable()
+gauges_read = {}
+
+
+def enable(port=None, metrics_file=None, interval=10):
+    """
+    : Starts counting and exposes the metrics on http://127.0.0.1:port/metrics, rewrites metrics_file every interval
+    : seconds, or both. Raises OSError if the port is in use.
+    """
+    global metrics
+    metrics = Metrics()
+    if port:
+        serve(port, metrics.render)
+        logger.info(f"Metrics served on http://127.0.0.1:{port}/metrics")
+    if metrics_file:
+        metrics_file = str(metrics_file)
+
+        def write_loop():
+            while True:
+                write_file(metrics_file, metrics.render)
+                time.sleep(interval)
+
+        threading.Thread(target=write_loop, name="metrics-file", daemon=True).start()
+        # The last values are written when the program ends
+        atexit.register(write_file, metrics_file, metrics.render)
+        logger.info(f"Metrics written every {interval} seconds to {metrics_file}")
+    return metrics
+
+
+def gauge(name, help_text, read):
+    gauges_read[name] = (help_text, read)
+
+
+def lpars_queued(count):
+    if metrics is not None:
+        metrics.lpars_queued(count)
+
+
+def command(ok, received=0):
+    if metrics is not None:
+        metrics.command(ok, received)
+
+
+def transfer(direction, size):
+    if metrics is not None:
+        metrics.transfer(direction, size)
+
+
+def track_lpar(function):
+    """
+    : Counts the LPARs in flight and their result, function returns True when the LPAR was collected
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if metrics is None:
+            return function(*args, **kwargs)
+        metrics.lpar_started()
+        collected = False
+        try:
+            collected = function(*args, **kwargs)
+            return collected
+        finally:
+            metrics.lpar_finished(collected is True)
+
+    return wrapper
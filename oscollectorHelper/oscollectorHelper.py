@@ -14,6 +14,10 @@ import json
 import os
 # Import sys, exit() is only for interactive sessions, when using PyInstaller you need to use sys.exit()
 import sys
+# Import threading to write the failed LPARs from several workers
+import threading
+# Import the thread pool to collect several LPARs at the same time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 # Import date to get current date
 from datetime import datetime
 # Import pathlib to work with paths
@@ -22,35 +26,117 @@ from pathlib import Path
 from loguru import logger
 # Import colorama for console colors
 from colorama import init, Fore, Back, Style
+# Import instrumentation to optionally profile each phase of the collection
+import instrumentation
 # Import from common
 from common import LPAR, print_red, save_lpar_os_data, get_oscollector
+# Import the content-addressed store for the oscollector tarballs
+from resultstore import ResultStore
+# Import the command timeouts learned from earlier runs
+import timeouts
+# Import the hosts known to need the legacy SSH algorithms
+import sshprofiles
+# Import the RemoteClient to check the hosts' circuits
+from sshclient import RemoteClient
+# Import the live metrics of the collection
+import metrics
+
+
+def count_lpar_lines(list_file):
+    """
+    : Counts the non-blank lines of the LPAR list without parsing them
+    """
+    with open(list_file, 'r') as file:
+        return sum(1 for line in file if line.strip())
 
 
 def load_lpar_list(list_file):
-    with open(list_file, "r") as file:
+    """
+    : Reads the NDJSON LPAR list one line at a time and yields (LPAR, user, password) without loading the whole file
+    : Besides the LPAR attributes (including ssh_port) each line may have its own "user" and "password".
+    : Invalid lines are reported and skipped.
+    """
+    with open(list_file, 'r') as file:
         print('Attempting to open JSON File: ' + str(list_file))
         logger.info('Attempting to open JSON File: ' + str(list_file))
-        lpar_list = []
-        try:
-            lines = file.readlines()
-            for line in lines:
-                lpar_list.append(LPAR(json_in=json.loads(line)))
-            return lpar_list
-        except json.JSONDecodeError as e:
-            print_red(f'{e.msg} line {e.lineno} column {e.colno} (char {e.pos})')
-            logger.error(f'{e.msg} line {e.lineno} column {e.colno} (char {e.pos})')
-            print_red('Invalid input file.')
-            logger.error('Invalid input file.')
-            # noinspection PyUnreachableCode
-            if __debug__:
-                logger.exception(e)
-            return None
-        except Exception as e:
-            print_red('Invalid input file.')
-            logger.error('Invalid input file.')
-            if __debug__:
-                logger.exception(e)
-            return None
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                yield LPAR(json_in=entry), entry.get('user'), entry.get('password')
+            except json.JSONDecodeError as e:
+                print_red(f'{e.msg} line {line_number} column {e.colno} (char {e.pos})')
+                logger.error(f'{e.msg} line {line_number} column {e.colno} (char {e.pos})')
+                # Counted as pending when the list was opened
+                metrics.lpars_queued(-1)
+                print_red('Invalid LPAR on line ' + str(line_number) + ', skipping it.')
+                logger.error('Invalid LPAR on line ' + str(line_number) + ', skipping it.')
+            except Exception as e:
+                metrics.lpars_queued(-1)
+                print_red('Invalid LPAR on line ' + str(line_number) + ', skipping it.')
+                logger.error('Invalid LPAR on line ' + str(line_number) + ', skipping it.')
+                if __debug__:
+                    logger.exception(e)
+
+
+class NonCollectedList:
+    # Failed LPARs, written as NDJSON in the same format as the input so the file can be fed back with --input.
+    # Lines are written to a temporary file as failures happen and it replaces NonCollectedLPARList.json at the end,
+    # the input may be the previous run's list in the same folder.
+
+    def __init__(self, output_dir):
+        self.list_file = output_dir + '\\' + 'NonCollectedLPARList.json'
+        self.file = None
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, lpar, user, password):
+        entry = lpar.write()
+        # Credentials are only kept if they came from the input list
+        if user:
+            entry['user'] = user
+        if password:
+            entry['password'] = password
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.list_file + '.tmp', 'w')
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            self.count += 1
+
+    def close(self):
+        if self.file is None:
+            # Everything was collected, a list from a previous run would be stale
+            if os.path.exists(self.list_file):
+                os.remove(self.list_file)
+            return
+        self.file.close()
+        os.replace(self.list_file + '.tmp', self.list_file)
+        print_red(f'{self.count} LPARs were not collected, they are listed in {self.list_file}')
+        logger.info(f'{self.count} LPARs were not collected, they are listed in {self.list_file}')
+
+
+def collect_lpars(lpars, workers, collect, available=None):
+    """
+    : Calls collect(lpar, user, password) for each entry with up to workers at the same time
+    : Only a few entries ahead of the workers are read, so the list is never fully loaded.
+    : Entries for which available(lpar) is False are left for the end, when their host may be answering again.
+    """
+    deferred = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lpar') as executor:
+        pending = set()
+        for lpar, user, password in lpars:
+            if available is not None and not available(lpar):
+                deferred.append((lpar, user, password))
+                continue
+            if len(pending) >= workers * 2:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending.add(executor.submit(collect, lpar, user, password))
+        wait(pending)
+        if deferred:
+            logger.info(f'Collecting {len(deferred)} LPARs whose host had stopped answering.')
+        wait([executor.submit(collect, *entry) for entry in deferred])
 
 
 # Program Start!
@@ -71,6 +157,25 @@ try:
                                                                   ' listing the LPARs on which to run oscollector.')
     parser.add_argument('--output', metavar='Path', type=Path, help='Output path for all generated files. Defaults to '
                                                                     'the current directory.')
+    parser.add_argument('--workers', metavar='4', type=int, default=4,
+                        help='LPARs collected at the same time. With 1 the password is asked again if it fails.')
+    parser.add_argument('--resultstore', action='store_true',
+                        help='Keep each unique oscollector file once in the local ResultStore folder, the output only '
+                             'gets a manifest and the files that changed since earlier runs.')
+    parser.add_argument('--fixedtimeouts', action='store_true',
+                        help='Use the built-in command timeouts instead of the ones learned from the durations of '
+                             'earlier runs. The durations are still recorded.')
+    parser.add_argument('--lpartransport', choices=['default', 'interactive', 'bulk', 'compressed'], default='bulk',
+                        help='SSH transport profile of the LPAR connections: bulk uses AES-GCM, a larger window and '
+                             'packets for the oscollector files, compressed adds zlib for slow links. Defaults to bulk.')
+    parser.add_argument('--metricsport', metavar='9464', type=int,
+                        help='Serve the collection\'s progress as Prometheus metrics on '
+                             'http://127.0.0.1:<port>/metrics while it runs.')
+    parser.add_argument('--metricsfile', metavar='Path', type=Path,
+                        help='Rewrite the collection\'s progress as Prometheus metrics to this file every 10 seconds '
+                             'while it runs.')
+    parser.add_argument('--profile', action='store_true', help='Profile each collection phase and write the results as '
+                                                               '.prof files to the output directory.')
 
     # Obtain the arguments
     args = parser.parse_args()
@@ -81,6 +186,9 @@ try:
             parser.print_help()
             sys.exit(0)
 
+    if args.profile:
+        instrumentation.enable_profiling()
+    instrumentation.start_phase('startup')
     print('oscollectorHelper version 1.0.0')
     # Create folder for output and set folder variables
     # now is an object, we turn that into a string with a format of our choosing
@@ -130,23 +238,65 @@ try:
                format="{time} | {level} | {module}:{function} | {message}",
                level="INFO")
     logger.info('powercollector version 1.0.7')
+    instrumentation.set_output_dir(output_dir)
     logger.info('Base directory: ' + base_dir)
     logger.info('Output directory: ' + output_dir)
     if args.lpar:
-        lpars = [LPAR(name=args.lpar, rmc_ip=args.lpar, state='Running')]
+        lpars = [(LPAR(name=args.lpar, rmc_ip=args.lpar, state='Running'), None, None)]
     else:
+        if not args.input.exists():
+            logger.error('Failed to load LPARs. ' + str(args.input) + ' does not exist.')
+            print_red('Failed to load LPARs. ' + str(args.input) + ' does not exist.')
+            sys.exit(1)
         lpars = load_lpar_list(str(args.input))
-    if lpars is None:
-        logger.error('Failed to load LPARs. Please check previous messages')
-        print_red('Failed to load LPARs. Please check previous messages')
-        sys.exit(1)
     oscollector = get_oscollector(base_dir)
     if not oscollector:
         print_red('No oscollector file found. Exiting now.')
         sys.exit(1)
-    for lpar in lpars:
-        save_lpar_os_data(lpar=lpar, path_to_oscollector=base_dir, oscollector=oscollector, output_path=output_dir,
-                          today=today, username=args.user, password=args.password)
+    instrumentation.start_phase('os-level')
+    non_collected = NonCollectedList(output_dir)
+    result_store = ResultStore(base_dir, output_dir) if args.resultstore else None
+    # Command durations are recorded in TimeoutHistory.json and the timeouts learned from them used
+    timeouts.enable(base_dir, apply=not args.fixedtimeouts)
+    # Hosts that only accept the legacy SSH algorithms are connected to with them directly, from SSHProfiles.json
+    sshprofiles.enable(base_dir)
+    # The progress is exposed for monitoring while the collection runs
+    if args.metricsport or args.metricsfile:
+        try:
+            metrics.enable(port=args.metricsport, metrics_file=args.metricsfile)
+        except OSError as e:
+            print_red(f'Metrics endpoint could not be started, continuing without it: {e}')
+            logger.error(f'Metrics endpoint could not be started, continuing without it: {e}')
+        else:
+            # The list is streamed, counting its lines is enough to know how many LPARs are pending
+            metrics.lpars_queued(count_lpar_lines(str(args.input)) if args.input else 1)
+    # Prompting for credentials only works with one LPAR at a time
+    interactive = bool(args.lpar) or args.workers <= 1
+
+    def collect(lpar, user, password):
+        # Credentials from the list line take precedence over --user and --password
+        try:
+            collected = save_lpar_os_data(lpar=lpar, path_to_oscollector=base_dir, oscollector=oscollector,
+                                          output_path=output_dir, today=today, username=user or args.user,
+                                          password=password or args.password, interactive=interactive,
+                                          result_store=result_store, transport=args.lpartransport)
+        except Exception as e:
+            if __debug__:
+                logger.exception(e)
+            logger.error('Unexpected error collecting LPAR: ' + lpar.name)
+            collected = False
+        if collected is not True:
+            non_collected.add(lpar, user, password)
+
+    collect_lpars(lpars, max(args.workers, 1), collect,
+                  available=lambda lpar: RemoteClient.host_available(lpar.rmc_ip, lpar.ssh_port or 22))
+    non_collected.close()
+    if result_store:
+        instrumentation.add_to_report('result_store', result_store.summary())
+    instrumentation.add_to_report('timeouts', timeouts.summary())
+    instrumentation.add_to_report('ssh_profiles', sshprofiles.summary())
+    instrumentation.add_to_report('circuit_breakers', RemoteClient.breaker_summary())
+    instrumentation.finish()
     logger.info('oscollectorHelper has completed.')
     print('\noscollectorHelper has completed.')
     sys.exit(0)
@@ -27,29 +27,21 @@ from datetime import datetime
 # Import pathlib to work with paths
 from pathlib import Path
 
-# ntplib to work with dates
-import ntplib
-
-# Import colorama for console colors
-from colorama import init
-
 # Import logger for the main log file
 from loguru import logger
 
-# Import common classes and functions from common.py
-from common import HMC, ManagedSystem, IOSlot, EnclosureTopology, LPAR, print_red
-from common import read_hmc_data, save_hmc_data, check_host, run_hmc_scan
-from common import save_os_level_data_for_sys, is_hmc, exec_hmc_cmd_adapt
+# Import instrumentation to optionally profile and trace memory for each phase of the collection
+import instrumentation
 
-# Import the RemoteClient class from the sshclient file
-from sshclient import RemoteClient, AuthenticationException
+# The remaining modules are imported once the arguments are parsed, so --help and argument errors answer
+# immediately. sshclient, which loads paramiko, is imported right before connecting to the HMC.
 
 
 # Program START!
+# HMC Scanner job, started in the background and stopped if the user presses ctrl-C
+hmc_scanner = None
 try:
     PCVERSION = "1.0.18"
-    # Colorama initialization
-    init()
     # Firstly, disable logger, we'll only have console output until output_dir is defined.
     logger.remove()
     # Create parser and define arguments for the program
@@ -82,6 +74,50 @@ try:
         type=str,
         help="HMC Password.",
     )
+    parser.add_argument(
+        "--port",
+        metavar="22",
+        type=int,
+        default=22,
+        help="HMC SSH port. Defaults to 22.",
+    )
+    parser.add_argument(
+        "--incrementalevents",
+        action="store_true",
+        help="Only collect the service events created since the last run and keep the "
+        "history in a local event store.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep the HMC session open and run each collector at its interval, "
+        "writing timestamped deltas and DaemonStatus.json to the output directory "
+        "until ctrl-C.",
+    )
+    parser.add_argument(
+        "--intervals",
+        metavar="events=300,firmware=21600",
+        help="Seconds between runs of each --daemon collector (events, lpar-state, "
+        "vios-errlog, firmware, io-slots), 0 disables a collector.",
+    )
+    parser.add_argument(
+        "--hmcsessions",
+        metavar="4",
+        type=int,
+        default=4,
+        help="Concurrent SSH sessions to the HMC used to collect Managed Systems "
+        "and VIOS in parallel at the start. The sessions and commands in flight "
+        "then adapt to the HMC's response times up to --hmcmaxsessions. Use 1 for "
+        "sequential collection. Defaults to 4.",
+    )
+    parser.add_argument(
+        "--hmcmaxsessions",
+        metavar="16",
+        type=int,
+        default=16,
+        help="Maximum concurrent SSH sessions to the HMC, reached while it keeps "
+        "answering as fast as when it was idle. Defaults to 16.",
+    )
     parser.add_argument(
         "--hmconly",
         action="store_true",
@@ -108,6 +144,79 @@ try:
         help="Path to the HMC Scanner package. Defaults to "
         "HMCScanner in the current directory",
     )
+    parser.add_argument(
+        "--hmcscantimeout",
+        metavar="3600",
+        type=int,
+        default=3600,
+        help="Seconds HMC Scanner may run in the background before it is stopped. "
+        "Defaults to 3600.",
+    )
+    parser.add_argument(
+        "--hmcscanforce",
+        action="store_true",
+        help="Run HMC Scanner even if the inventory hasn't changed since the cached results.",
+    )
+    parser.add_argument(
+        "--resultstore",
+        action="store_true",
+        help="Keep each unique oscollector file once in the local ResultStore folder, the output "
+        "only gets a manifest and the files that changed since earlier runs.",
+    )
+    parser.add_argument(
+        "--fixedtimeouts",
+        action="store_true",
+        help="Use the built-in command timeouts instead of the ones learned from the "
+        "durations of earlier runs. The durations are still recorded.",
+    )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help="Write the HMC and each Managed System to their own file as soon as the system "
+        "is collected, with a manifest in place of the SystemsManagedByHMC file.",
+    )
+    parser.add_argument(
+        "--lpartransport",
+        choices=["default", "interactive", "bulk", "compressed"],
+        default="bulk",
+        help="SSH transport profile of the LPAR connections: bulk uses AES-GCM, a larger "
+        "window and packets for the oscollector files, compressed adds zlib for slow "
+        "links. Defaults to bulk.",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="Path",
+        type=Path,
+        help="Append every command sent, with its output and duration, to this gzipped "
+        "capture file.",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="Path",
+        type=Path,
+        help="Answer every command from a --record capture instead of the HMC and LPARs. "
+        "--hmc and --port must be the recorded ones.",
+    )
+    parser.add_argument(
+        "--replaylatency",
+        action="store_true",
+        help="Wait the recorded duration of each command when replaying, instead of "
+        "answering at once.",
+    )
+    parser.add_argument(
+        "--metricsport",
+        metavar="9464",
+        type=int,
+        help="Serve the collection's progress as Prometheus metrics on "
+        "http://127.0.0.1:<port>/metrics while it runs.",
+    )
+    parser.add_argument(
+        "--metricsfile",
+        metavar="Path",
+        type=Path,
+        help="Rewrite the collection's progress as Prometheus metrics to this file every "
+        "10 seconds while it runs.",
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -116,6 +225,18 @@ try:
         help="Output path for all generated files. Defaults to "
         "the current directory",
     )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile each collection phase and write the results as .prof files "
+        "to the output directory, readable with pstats or snakeviz.",
+    )
+    parser.add_argument(
+        "--memtrace",
+        action="store_true",
+        help="Record peak memory and the top allocation sites after each "
+        "collection phase and include them in the run report.",
+    )
     # TODO Add web service to receive data directly and implement uploading
     # parser.add_argument('--upload_url', metavar='URL', type=str, help='URL of the webservice that receives the data.')
 
@@ -128,6 +249,42 @@ try:
             parser.print_help()
             sys.exit(0)
 
+    if args.profile:
+        instrumentation.enable_profiling()
+    if args.memtrace:
+        instrumentation.enable_memory_tracing()
+    instrumentation.start_phase("startup")
+    # Import colorama for console colors
+    from colorama import init
+
+    # Import common classes and functions from common.py
+    from common import HMC, ManagedSystem, print_red
+    from common import read_hmc_data, save_hmc_data, check_host, run_hmc_scan
+    from common import save_os_level_data_for_sys, is_hmc, exec_hmc_cmd_adapt
+    from common import collect_managed_systems, hmc_fingerprint, probe_java
+    from common import probe_ntp_date, check_ntp_date, collect_vioses
+    from common import ShardedHMCWriter
+
+    # Import the incremental event collection from events.py
+    from events import collect_events_incremental
+
+    # Import the content-addressed store for the oscollector tarballs
+    from resultstore import ResultStore
+
+    # Import the command timeouts learned from earlier runs
+    import timeouts
+
+    # Import the hosts known to need the legacy SSH algorithms
+    import sshprofiles
+
+    # Import the live metrics of the collection
+    import metrics
+
+    # Import the command capture to record or replay the collection
+    import capture
+
+    # Colorama initialization
+    init()
     print(f"powercollector version {PCVERSION}")
     # Create folder for output and set folder variables
     # now is an object, we turn that into a string with a format of our choosing
@@ -193,6 +350,7 @@ try:
         encoding="utf8",
     )
     logger.info(f"powercollector version {PCVERSION}")
+    instrumentation.set_output_dir(output_dir)
     # Define the target date
     target_date = datetime(2025, 6, 1)
     build_date = datetime(2025, 1, 26)
@@ -206,24 +364,46 @@ try:
             "This program has expired. Please ask your technical support for a current version"
         )
         sys.exit(1)
-    # Check the NTP server's date
+    # Check the NTP server's date in the background, the answer is checked once the HMC is connected
+    ntp_probe = probe_ntp_date()
+    logger.info("Base directory: " + base_dir)
+    logger.info("Output directory: " + output_dir)
+
+    # With --resultstore the oscollector tarballs are replaced by a manifest of stored files
+    result_store = ResultStore(base_dir, output_dir) if args.resultstore else None
+    # Command durations are recorded in TimeoutHistory.json and the timeouts learned from them used
+    timeouts.enable(base_dir, apply=not args.fixedtimeouts)
+    # Hosts that only accept the legacy SSH algorithms are connected to with them directly, from SSHProfiles.json
+    sshprofiles.enable(base_dir)
+    # Commands are recorded to, or answered from, a capture file
+    if args.record and args.replay:
+        print_red("--record and --replay can't be used together. Exiting now.")
+        logger.error("--record and --replay can't be used together. Exiting now.")
+        sys.exit(1)
     try:
-        ntp_client = ntplib.NTPClient()
-        response = ntp_client.request("pool.ntp.org")
-        ntp_date = datetime.fromtimestamp(response.tx_time)
-        if ntp_date > target_date or ntp_date < build_date:
+        if args.record:
+            capture.enable_recording(args.record)
+        elif args.replay:
+            capture.enable_replay(args.replay, latency=args.replaylatency)
+    except (OSError, ValueError) as e:
+        print_red(f"Capture file {args.record or args.replay} can't be used: {e}")
+        logger.error(f"Capture file {args.record or args.replay} can't be used: {e}")
+        if __debug__:
+            logger.exception(e)
+        sys.exit(1)
+    # The progress is exposed for monitoring while the collection runs
+    if args.metricsport or args.metricsfile:
+        try:
+            metrics.enable(port=args.metricsport, metrics_file=args.metricsfile)
+        except OSError as e:
             print_red(
-                "This program has expired. Please ask your technical support for a current version"
+                f"Metrics endpoint could not be started, continuing without it: {e}"
             )
             logger.error(
-                "This program has expired. Please ask your technical support for a current version"
+                f"Metrics endpoint could not be started, continuing without it: {e}"
             )
-            sys.exit(1)
-    except Exception as e:
-        logger.info("System date seems valid but could not verify with NTP.")
-    logger.info("Base directory: " + base_dir)
-    logger.info("Output directory: " + output_dir)
-
+            if __debug__:
+                logger.exception(e)
     # Either collect info from the specified HMC or load the specified file.
     if args.input:
         try:
@@ -232,17 +412,34 @@ try:
             print_red("Error loading file. Exiting now.")
             logger.info("Error loading file. Exiting now.")
             sys.exit(1)
+        if not check_ntp_date(ntp_probe, target_date, build_date):
+            sys.exit(1)
+        instrumentation.start_phase("os-level")
         save_os_level_data_for_sys(
             managed_systems=hmc.managed_systems,
             base_dir=base_dir,
             output_dir=output_dir,
             today=today,
+            result_store=result_store,
+            transport=args.lpartransport,
+        )
+        if result_store:
+            instrumentation.add_to_report("result_store", result_store.summary())
+        instrumentation.add_to_report("timeouts", timeouts.summary())
+        instrumentation.add_to_report("ssh_profiles", sshprofiles.summary())
+        # sshclient was loaded by the OS-level collection
+        from sshclient import RemoteClient
+
+        instrumentation.add_to_report(
+            "circuit_breakers", RemoteClient.breaker_summary()
         )
+        instrumentation.add_to_report("capture", capture.summary())
+        instrumentation.finish()
         print("powercollector has completed successfully.")
         logger.info("powercollector has completed successfully.")
         sys.exit(0)
-    # Connect to HMC
-    if not check_host(args.hmc):
+    # Connect to HMC, a replayed HMC is never contacted
+    if not capture.replaying() and not check_host(args.hmc):
         print_red(
             "HMC not resolvable or doesn't answer to ICMP Ping - please check log file."
         )
@@ -250,14 +447,32 @@ try:
             "HMC not resolvable or doesn't answer to ICMP Ping - please check previous messages."
         )
         sys.exit(1)
+    # Import the RemoteClient class from the sshclient file
+    from sshclient import RemoteClient, AuthenticationException
+
     hmc = HMC()
     hmc_ssh = None
+    # Resolve Java for HMC Scanner in the background while the HMC is collected
+    java_probe = probe_java(base_dir)
     print("Trying to connect to HMC: " + args.hmc)
     logger.info("Trying to connect to HMC: " + args.hmc)
     try:
         hmc_ssh = RemoteClient(
-            host=args.hmc, user=args.user, password=args.password, remote_path="."
+            host=args.hmc,
+            user=args.user,
+            password=args.password,
+            remote_path=".",
+            port=args.port,
+        )
+        # Every session to the HMC shares one adaptive limit of concurrent commands, the sessions open follow it
+        hmc_sessions = (
+            max(args.hmcsessions, args.hmcmaxsessions) if args.hmcsessions > 1 else 1
+        )
+        hmc_limiter = RemoteClient.limit_host(
+            args.hmc, args.port, maximum=hmc_sessions, initial=args.hmcsessions
         )
+        # One timeout per session in flight is not enough to give up on the HMC
+        RemoteClient.breaker(args.hmc, args.port, threshold=hmc_sessions + 1)
         if not is_hmc(hmc=hmc_ssh):
             if hmc_ssh.conn is not None:
                 hmc_ssh.disconnect()
@@ -283,6 +498,35 @@ try:
             logger.exception(error)
         logger.error("HMC Connection error - please check previous messages.")
         sys.exit(1)
+    if not check_ntp_date(ntp_probe, target_date, build_date):
+        if hmc_ssh.conn is not None:
+            hmc_ssh.disconnect()
+        sys.exit(1)
+    if args.daemon:
+        # Import the daemon from daemon.py
+        from daemon import run_daemon, parse_intervals
+
+        try:
+            intervals = parse_intervals(args.intervals)
+        except ValueError as e:
+            print_red(str(e))
+            logger.error(str(e))
+            sys.exit(1)
+        instrumentation.start_phase("daemon")
+        try:
+            run_daemon(
+                hmc_ssh,
+                hmc_src=args.hmc,
+                base_dir=base_dir,
+                output_dir=output_dir,
+                intervals=intervals,
+            )
+        finally:
+            if hmc_ssh.conn is not None:
+                hmc_ssh.disconnect()
+        sys.exit(0)
+    instrumentation.start_phase("hmc-events")
+    open_events = []
     try:
         # Obtain HMC hostname, domain, mt, serial and version
         print("Connection to HMC: " + args.hmc + " Successful, collection started.")
@@ -327,18 +571,36 @@ try:
         logger.error(
             "HMC Connections collection error. Please check previous messages."
         )
-        # Query all hardware events and write JSON file
-    try:
-        j_list = hmc_ssh.execute_command("lssvcevents -t hardware -F --header", 120)
-        with open(output_dir + "\\" + args.hmc + "-AllSVCEvents.json", "w+") as f:
-            f.write(json.dumps(j_list, indent=4))
-    except:
-        print_red(
-            "HMC service events collection incomplete. Please check the log file."
-        )
-        logger.error(
-            "HMC service events collection incomplete. Please check previous messages."
+    if args.incrementalevents:
+        # Only the events since the last run are requested, the files are written from the local event store
+        collect_events_incremental(
+            hmc_ssh, hmc_src=args.hmc, base_dir=base_dir, output_dir=output_dir
         )
+    else:
+        # Query all hardware events and write JSON file
+        try:
+            j_list = hmc_ssh.execute_command("lssvcevents -t hardware -F --header", 120)
+            with open(output_dir + "\\" + args.hmc + "-AllSVCEvents.json", "w+") as f:
+                f.write(json.dumps(j_list, indent=4))
+        except:
+            print_red(
+                "HMC service events collection incomplete. Please check the log file."
+            )
+            logger.error(
+                "HMC service events collection incomplete. Please check previous messages."
+            )
+        try:
+            # Query HMC events and write JSON file
+            j_list = hmc_ssh.execute_command("lssvcevents -t console", 60)
+            with open(output_dir + "\\" + args.hmc + "-ConsoleEvents.json", "w+") as f:
+                f.write(json.dumps(j_list, indent=4))
+        except:
+            print_red(
+                "HMC console events collection incomplete. Please check the log file."
+            )
+            logger.error(
+                "HMC console events collection incomplete. Please check previous messages."
+            )
     try:
         # Query open hardware events and write JSON file
         # Python says: Ask for forgiveness rather than permission, AKA, try and catch. so......
@@ -353,6 +615,8 @@ try:
         j_list = exec_hmc_cmd_adapt(hmc_ssh, cmd, 120)
         with open(output_dir + "\\" + args.hmc + "-OpenSVCEvents.json", "w+") as f:
             f.write(json.dumps(j_list, indent=4))
+        # Kept for the HMC Scanner cache fingerprint
+        open_events = j_list
     except:
         print_red(
             "HMC open service events collection incomplete. Please check the log file."
@@ -360,20 +624,9 @@ try:
         logger.error(
             "HMC open service events collection incomplete. Please check previous messages."
         )
-    try:
-        # Query HMC events and write JSON file
-        j_list = hmc_ssh.execute_command("lssvcevents -t console", 60)
-        with open(output_dir + "\\" + args.hmc + "-ConsoleEvents.json", "w+") as f:
-            f.write(json.dumps(j_list, indent=4))
-    except:
-        print_red(
-            "HMC console events collection incomplete. Please check the log file."
-        )
-        logger.error(
-            "HMC console events collection incomplete. Please check previous messages."
-        )
     print("HMC VPD and events collection finished.")
     logger.info("HMC VPD and events collection finished.")
+    instrumentation.start_phase("managed-systems")
     try:
         print("Managed Systems collection started.")
         logger.info("Managed Systems collection started.")
@@ -395,312 +648,77 @@ try:
         )
         sys.exit(1)
 
-    # Obtain FSP levels, IO Topo, LPAR list and their IP addresses for each managed system
-    # lssyscfg -r lpar -m P7Server-8233-E8B-SN10095BP -F lpar_id,name,os_version,state,rmc_ipaddr --osrefresh
-    for system in hmc.managed_systems:
-        print("Collection started for System: " + system.name)
-        logger.info("Collection started for System: " + system.name)
-        # Obtain FSP levels lslic -t sys -m 8233-E8B*10095BP -F
-        # noinspection SpellCheckingInspection
-        # temp_ecnumber_primary:temp_level_primary:temp_ecnumber_secondary:temp_level_secondary
-        # :perm_ecnumber_primary:perm_level_primary:perm_ecnumber_secondary:perm_level_secondary
-        try:
-            response = hmc_ssh.execute_command(
-                "lslic -t sys -m "
-                + '"'
-                + system.name
-                + '"'
-                + " -F temp_ecnumber_primary:temp_level_primary:"
-                + "perm_ecnumber_primary:perm_level_primary",
-                30,
-            )
-            # Due to the long variable names, split the 4 variable assignment
-            (
-                system.fsp_primary.temp_ecnumber,
-                system.fsp_primary.temp_level,
-                system.fsp_primary.perm_ecnumber,
-                system.fsp_primary.perm_level,
-            ) = (
-                response[0].replace("\n", "").split(":")
-            )
-        except:
-            logger.error("Error obtaining primary FSP's data, check previous messages.")
-
-        try:
-            response = hmc_ssh.execute_command(
-                "lslic -t sys -m "
-                + '"'
-                + system.name
-                + '"'
-                + " -F temp_ecnumber_secondary:temp_level_secondary:"
-                + "perm_ecnumber_secondary:perm_level_secondary",
-                30,
-            )
-            if "unavailable" not in response:
-                (
-                    system.fsp_secondary.temp_ecnumber,
-                    system.fsp_secondary.temp_level,
-                    system.fsp_secondary.perm_ecnumber,
-                    system.fsp_secondary.perm_level,
-                ) = (
-                    response[0].replace("\n", "").split(":")
-                )
-        except:
-            logger.error(
-                "Error obtaining secondary FSP's data, check previous messages."
-            )
-        # Obtain system capabilities - This fails safe, if the command doesn't exist, it'll store that response
-        response = hmc_ssh.execute_command(
-            "lssyscfg -r sys -m " + '"' + system.name + '"' + " -F capabilities", 30
-        )
-        system.capabilities = response[0].replace("\n", "")
-
-        # Obtain system state, if it's not Operating or Standby we cannot collect anything else
-        response = hmc_ssh.execute_command(
-            "lssyscfg -r sys -m " + '"' + system.name + '"' + " -F state", 30
-        )
+    # With --sharded each system is written as soon as it is collected
+    shards = ShardedHMCWriter(args.hmc, hmc, output_dir) if args.sharded else None
 
-        if "Operating" in response[0] or "Standby" in response[0]:
-            # Obtain IO slots
-            try:
-                response = hmc_ssh.execute_command(
-                    "lshwres -m "
-                    + '"'
-                    + system.name
-                    + '"'
-                    + " -r io --rsubtype slot -F feature_codes:description:"
-                    + "unit_phys_loc:phys_loc:drc_name"
-                )
-                for slot in response:
-                    fc, desc, upl, pl, drcn = slot.replace("\n", "").split(":")
-                    system.io_slots.append(
-                        IOSlot(
-                            feature_codes=fc,
-                            description=desc,
-                            unit_phys_loc=upl,
-                            phys_loc=pl,
-                            drc_name=drcn,
-                        )
-                    )
-            except Exception as e:
-                print_red(
-                    "Error during IO Slot collection for System: "
-                    + system.name
-                    + " please check log file."
-                )
-                if __debug__:
-                    logger.exception(e)
-                logger.info(
-                    "Error during IO Slot collection for System: "
-                    + system.name
-                    + " please check previous messages."
-                )
-
-            # Obtain LPAR list
-            try:
-                command = (
-                    "lssyscfg -r lpar -m "
-                    + '"'
-                    + system.name
-                    + '"'
-                    + " -F lpar_id:name:lpar_env:state"
-                )
-                response = hmc_ssh.execute_command(command, 120)
-                for lpar in response:
-                    l_id, l_name, l_env, running = lpar.replace("\n", "").split(":")
-                    system.partition_list.append(
-                        LPAR(name=l_name, lpar_id=l_id, state=running, lpar_env=l_env)
-                    )
-                for lpar in system.partition_list:
-                    command = (
-                        "lssyscfg -r lpar -m "
-                        + '"'
-                        + system.name
-                        + '"'
-                        + ' --filter "lpar_names='
-                        + lpar.name
-                        + '" -F os_version:rmc_ipaddr --header --osrefresh'
-                    )
-                    response = exec_hmc_cmd_adapt(hmc_ssh, command, 120)
-                    if "rmc_ipaddr" in response[0]:
-                        lpar.os_level, lpar.rmc_ip = (
-                            response[1].replace("\n", "").split(":")
-                        )
-                    elif "os_version" in response[0]:
-                        lpar.os_level = response[1].replace("\n", "")
-
-            except Exception as e:
-                print_red(
-                    "Error during LPAR information collection for System: "
-                    + system.name
-                    + " please check log file."
-                )
-                if __debug__:
-                    logger.exception(e)
-                logger.info(
-                    "Error during LPAR information collection for System: "
-                    + system.name
-                    + " please check previous messages."
-                )
-            try:
-                # Obtain IO topology
-                response = hmc_ssh.execute_command(
-                    "lsiotopo -m "
-                    + '"'
-                    + system.name
-                    + '"'
-                    + " -F slot_enclosure:leading_hub_port:trailing_hub_port",
-                    30,
-                )
-                # Convert response to dictionary and back to list, a dictionary cannot have duplicate keys.
-                deduped_response = list(dict.fromkeys(response))
-
-                # Populate the system object with each enclosure (CEC included)
-                for enclosure in deduped_response:
-                    enclosure_name, leading_port, trailing_port = enclosure.replace(
-                        "\n", ""
-                    ).split(":")
-                    system.enclosure_topo.append(
-                        EnclosureTopology(
-                            enclosure=enclosure_name,
-                            leading_hub_port=leading_port,
-                            trailing_hub_port=trailing_port,
-                        )
-                    )
-            except Exception as e:
-                print_red(
-                    "Error during IO Topology collection for System: "
-                    + system.name
-                    + " please check log file."
-                )
-                if __debug__:
-                    logger.exception(e)
-                logger.info(
-                    "Error during IO Topology collection for System: "
-                    + system.name
-                    + " please check previous messages."
-                )
+    def system_done(system):
+        instrumentation.checkpoint("system-" + system.name)
+        if shards:
+            shards.add(system)
 
-        else:
-            # If system is not powered on and connected, we cannot collect the rest of the data
-            print_red(
-                "System: "
-                + system.name
-                + ' must be "Operating" or "Standby" for complete collection'
-            )
-            logger.info(
-                "System: "
-                + system.name
-                + ' must be "Operating" or "Standby" for complete collection'
-            )
-
-        print("Collection finished for System: " + system.name)
-        logger.info("Collection finished for System: " + system.name)
+    # Obtain FSP levels, IO Topo, LPAR list and their IP addresses for each managed system
+    # lssyscfg -r lpar -m P7Server-8233-E8B-SN10095BP -F lpar_id,name,os_version,state,rmc_ipaddr --osrefresh
+    collect_managed_systems(
+        hmc_ssh,
+        hmc.managed_systems,
+        sessions=hmc_sessions,
+        on_done=system_done,
+    )
 
     # Save HMC + managed_systems to file
-    if not save_hmc_data(hmc_src=args.hmc, hmc=hmc, output_dir=output_dir):
+    instrumentation.start_phase("serialization")
+    if shards:
+        saved = shards.finish()
+    else:
+        saved = save_hmc_data(hmc_src=args.hmc, hmc=hmc, output_dir=output_dir)
+    if not saved:
         # If the data saving fails for any reason, abort.
         sys.exit(1)
-    if not run_hmc_scan(
-        hmc_scan_path=hmc_scan_path,
-        base_dir=base_dir,
-        hmc=args.hmc,
-        user=args.user,
-        password=args.password,
-        output_path=output_dir,
-    ):
-        print_red(
-            "HMC Scanner run was aborted. Please check the log file and run it manually"
-        )
-        logger.error(
-            "HMC Scanner run was aborted. Please check previous messages and run it manually"
+    instrumentation.start_phase("hmc-scanner")
+    # HMC Scanner runs in the background while the VIOS and OS-level data is collected
+    if capture.replaying():
+        # HMC Scanner connects to the HMC on its own, it can't be replayed
+        logger.info("HMC Scanner is not run when replaying a capture.")
+        hmc_scanner = None
+    else:
+        hmc_scanner = run_hmc_scan(
+            hmc_scan_path=hmc_scan_path,
+            base_dir=base_dir,
+            hmc=args.hmc,
+            user=args.user,
+            password=args.password,
+            output_path=output_dir,
+            timeout=args.hmcscantimeout,
+            fingerprint=hmc_fingerprint(hmc, open_events),
+            force=args.hmcscanforce,
+            java_probe=java_probe,
         )
+        if not hmc_scanner:
+            print_red(
+                "HMC Scanner run was aborted. Please check the log file and run it manually"
+            )
+            logger.error(
+                "HMC Scanner run was aborted. Please check previous messages and run it manually"
+            )
 
+    instrumentation.start_phase("vios")
     # viosvrcmd -m 9406-570*A0001234 --id 4 -c "lsdev -virtual"
-    for system in hmc.managed_systems:
-        for lpar in system.partition_list:
-            if "vioserver" in lpar.env and "Running" in lpar.state:
-                try:
-                    j_list = hmc_ssh.execute_command(
-                        "viosvrcmd -m "
-                        + '"'
-                        + system.name
-                        + '"'
-                        + " --id "
-                        + lpar.id
-                        + ' -c "errlog"'
-                    )
-                    j_list += hmc_ssh.execute_command(
-                        "viosvrcmd -m "
-                        + '"'
-                        + system.name
-                        + '"'
-                        + " --id "
-                        + lpar.id
-                        + ' -c "errlog -ls"'
-                    )
-                    with open(
-                        output_dir
-                        + "\\"
-                        + system.name
-                        + "-"
-                        + lpar.name
-                        + "-ErrorLog.json",
-                        "w+",
-                    ) as f:
-                        f.write(json.dumps(j_list, indent=4))
-                except Exception as e:
-                    print_red(
-                        "Error trying to get error log from VIOS: "
-                        + lpar.name
-                        + " for system: "
-                        + system.name
-                    )
-                    if __debug__:
-                        logger.exception(e)
-                    logger.info(
-                        "Error trying to get error log from VIOS: "
-                        + lpar.name
-                        + " for system: "
-                        + system.name
-                    )
-                try:
-                    j_list = hmc_ssh.execute_command(
-                        "viosvrcmd -m "
-                        + '"'
-                        + system.name
-                        + '"'
-                        + " --id "
-                        + lpar.id
-                        + ' -c "lsdev -vpd"'
-                    )
-
-                    with open(
-                        output_dir + "\\" + system.name + "-" + lpar.name + "-vpd.json",
-                        "w+",
-                    ) as f:
-                        f.write(json.dumps(j_list, indent=4))
-                except Exception as e:
-                    print_red(
-                        "Error trying to get VPD from VIOS: "
-                        + lpar.name
-                        + " for system: "
-                        + system.name
-                    )
-                    if __debug__:
-                        logger.exception(e)
-                    logger.info(
-                        "Error trying to get VPD from VIOS: "
-                        + lpar.name
-                        + " for system: "
-                        + system.name
-                    )
+    collect_vioses(hmc_ssh, hmc.managed_systems, output_dir, sessions=hmc_sessions)
 
     # If only collecting HMC info, exit now
     # Close the ssh connection
     if hmc_ssh.conn is not None:
         hmc_ssh.disconnect()
+    instrumentation.add_to_report("hmc_limiter", hmc_limiter.summary())
+    instrumentation.add_to_report("timeouts", timeouts.summary())
+    instrumentation.add_to_report("ssh_profiles", sshprofiles.summary())
+    instrumentation.add_to_report("circuit_breakers", RemoteClient.breaker_summary())
+    instrumentation.add_to_report("capture", capture.summary())
     if args.hmconly:
+        if hmc_scanner:
+            hmc_scanner.join()
+            instrumentation.add_to_report("hmc_scanner", hmc_scanner.summary())
+        instrumentation.finish()
         print(
             "powercollector has completed successfully with --hmconly. "
             "Please run oscollector manually on the LPARs if the managed system is running."
@@ -715,13 +733,16 @@ try:
         logger.info("Removing temporal files")
         shutil.rmtree(output_dir)
         sys.exit(0)
-    elif args.viosonly:
+    instrumentation.start_phase("os-level")
+    if args.viosonly:
         save_os_level_data_for_sys(
             managed_systems=hmc.managed_systems,
             base_dir=base_dir,
             output_dir=output_dir,
             today=today,
             lpar_env="vioserver",
+            result_store=result_store,
+            transport=args.lpartransport,
         )
     else:
         save_os_level_data_for_sys(
@@ -729,7 +750,20 @@ try:
             base_dir=base_dir,
             output_dir=output_dir,
             today=today,
+            result_store=result_store,
+            transport=args.lpartransport,
         )
+    if result_store:
+        instrumentation.add_to_report("result_store", result_store.summary())
+    instrumentation.add_to_report("timeouts", timeouts.summary())
+    instrumentation.add_to_report("ssh_profiles", sshprofiles.summary())
+    instrumentation.add_to_report("circuit_breakers", RemoteClient.breaker_summary())
+    instrumentation.add_to_report("capture", capture.summary())
+    # HMC Scanner writes to the output folder, wait for it before archiving
+    if hmc_scanner:
+        hmc_scanner.join()
+        instrumentation.add_to_report("hmc_scanner", hmc_scanner.summary())
+    instrumentation.finish()
     print("Saving folder to .zip")
     logger.info("powercollector has completed successfully.")
     logger.info("Saving folder to .zip")
@@ -742,5 +776,10 @@ try:
 
 except KeyboardInterrupt:
     # Cleanup?
+    if hmc_scanner:
+        hmc_scanner.stop()
+    # common may not be imported yet if ctrl-C was pressed during startup
+    from common import print_red
+
     logger.error("powercollector killed by ctrl-C. Output may be invalid.")
     print_red("powercollector killed by ctrl-C. Output may be invalid.")
@@ -0,0 +1,232 @@
+# ****************************************************************************
+# * powercollector.resultstore                                               *
+# * Content-addressed store for the oscollector tarballs, each unique file   *
+# * is kept once and every run writes a manifest that references them        *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import argparse to parse the restore command line
+import argparse
+
+# Import hashlib to address the files by their content
+import hashlib
+
+# Import io to rebuild the tar members from memory
+import io
+
+# Import JSON to read and write the manifests
+import json
+
+# Import os to use file functions
+import os
+
+# Import tarfile to split and rebuild the oscollector tarballs
+import tarfile
+
+# Import threading to add tarballs from several workers
+import threading
+
+# Import date to stamp the manifest
+from datetime import datetime
+
+# Import pathlib to find the manifests to restore
+from pathlib import Path
+
+# Import logger for the main log file
+from loguru import logger
+
+MANIFEST_NAME = "ResultManifest.json"
+# Blobs first stored by a run are also copied here, so the run's archive carries what changed and nothing else
+RUN_BLOBS_NAME = "ResultBlobs"
+
+
+def store_dir(base_dir):
+    return base_dir + "\\" + "ResultStore"
+
+
+def blob_file(directory, digest):
+    # Two levels keep the folders small with thousands of blobs
+    return directory + "\\" + digest[:2] + "\\" + digest
+
+
+def write_blob(file_name, data):
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name + ".tmp", "wb") as file:
+        file.write(data)
+    os.replace(file_name + ".tmp", file_name)
+
+
+class ResultStore:
+    # Replaces each downloaded tarball with a manifest entry, the member files are stored once by their sha256
+
+    def __init__(self, base_dir, output_dir):
+        self.store_dir = store_dir(base_dir)
+        self.output_dir = output_dir
+        self.manifest_file = output_dir + "\\" + MANIFEST_NAME
+        self.lock = threading.Lock()
+        self.manifest = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "store": self.store_dir,
+            "archives": {},
+        }
+        self.seen = set()
+        self.new_blobs = 0
+        self.new_bytes = 0
+        self.total_bytes = 0
+
+    def add(self, tar_path):
+        """
+        : Stores the members of a downloaded tarball and records them in the run manifest, then removes the tarball
+        : A file that is not a valid tar is left as is. Returns True if the tarball was stored.
+        """
+        try:
+            with tarfile.open(tar_path, "r") as tar:
+                members = []
+                for member in tar.getmembers():
+                    entry = {
+                        "name": member.name,
+                        "type": member.type.decode(),
+                        "mode": member.mode,
+                        "mtime": member.mtime,
+                        "uid": member.uid,
+                        "gid": member.gid,
+                        "uname": member.uname,
+                        "gname": member.gname,
+                    }
+                    if member.isfile():
+                        data = tar.extractfile(member).read()
+                        entry["sha256"] = hashlib.sha256(data).hexdigest()
+                        entry["size"] = len(data)
+                        self.put_blob(entry["sha256"], data)
+                    members.append(entry)
+        except (OSError, tarfile.TarError) as e:
+            if __debug__:
+                logger.exception(e)
+            logger.error(
+                "Unable to add " + tar_path + " to the result store, it was kept as is."
+            )
+            return False
+        with self.lock:
+            self.manifest["archives"][os.path.basename(tar_path)] = members
+            self.save()
+        # The tarball is only removed once the manifest that can rebuild it is saved
+        os.remove(tar_path)
+        logger.info("Added " + tar_path + " to the result store.")
+        return True
+
+    def put_blob(self, digest, data):
+        file_name = blob_file(self.store_dir, digest)
+        with self.lock:
+            self.total_bytes += len(data)
+            # Two workers may bring the same file, only the first one writes it
+            if digest in self.seen or os.path.exists(file_name):
+                return
+            self.seen.add(digest)
+            self.new_blobs += 1
+            self.new_bytes += len(data)
+        write_blob(file_name, data)
+        write_blob(blob_file(self.output_dir + "\\" + RUN_BLOBS_NAME, digest), data)
+
+    def save(self):
+        with open(self.manifest_file + ".tmp", "w") as file:
+            json.dump(self.manifest, file, indent=4)
+        os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+    def summary(self):
+        return {
+            "archives": len(self.manifest["archives"]),
+            "new_blobs": self.new_blobs,
+            "new_bytes": self.new_bytes,
+            "total_bytes": self.total_bytes,
+        }
+
+
+def find_blob(digest, directories):
+    for directory in directories:
+        file_name = blob_file(directory, digest)
+        if os.path.exists(file_name):
+            return file_name
+    return None
+
+
+def restore_tarballs(run_dir, output_dir, stores=()):
+    """
+    : Rebuilds the tarballs listed in a run's manifest, the blobs are read from the run's own folder and then from
+    : the given stores. Returns the names of the tarballs that could not be rebuilt.
+    """
+    with open(os.path.join(run_dir, MANIFEST_NAME), "r") as file:
+        manifest = json.load(file)
+    directories = [os.path.join(run_dir, RUN_BLOBS_NAME)] + list(stores)
+    if manifest.get("store"):
+        directories.append(manifest["store"])
+    missing = []
+    for archive, members in manifest["archives"].items():
+        tar_path = os.path.join(output_dir, archive)
+        try:
+            with tarfile.open(tar_path + ".tmp", "w") as tar:
+                for entry in members:
+                    info = tarfile.TarInfo(entry["name"])
+                    info.type = entry["type"].encode()
+                    for field in ("mode", "mtime", "uid", "gid", "uname", "gname"):
+                        setattr(info, field, entry[field])
+                    if "sha256" not in entry:
+                        tar.addfile(info)
+                        continue
+                    blob = find_blob(entry["sha256"], directories)
+                    if blob is None:
+                        raise FileNotFoundError(
+                            "Blob " + entry["sha256"] + " not found"
+                        )
+                    with open(blob, "rb") as data:
+                        content = data.read()
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+            os.replace(tar_path + ".tmp", tar_path)
+        except OSError as e:
+            logger.error("Unable to restore " + archive + ": " + str(e))
+            if os.path.exists(tar_path + ".tmp"):
+                os.remove(tar_path + ".tmp")
+            missing.append(archive)
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="resultstore",
+        description="Rebuild the oscollector tarballs of a run collected with --resultstore.",
+    )
+    parser.add_argument(
+        "run",
+        type=Path,
+        help="Run folder, or its unzipped archive, with a ResultManifest.json.",
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        action="append",
+        default=[],
+        help="Result store folder with the blobs of earlier runs. Can be repeated.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Folder for the tarballs. Defaults to the run folder.",
+    )
+    args = parser.parse_args()
+    output_dir = args.output or args.run
+    os.makedirs(output_dir, exist_ok=True)
+    missing = restore_tarballs(
+        str(args.run), str(output_dir), [str(store) for store in args.store]
+    )
+    for archive in missing:
+        print(
+            "Unable to restore "
+            + archive
+            + ", its blobs are not in the run or the stores."
+        )
+    raise SystemExit(1 if missing else 0)
+
+
+if __name__ == "__main__":
+    main()
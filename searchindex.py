@@ -0,0 +1,381 @@
+# ****************************************************************************
+# * powercollector.searchindex                                               *
+# * Full text index over the oscollector config, error and lsgcl files of    *
+# * one or more runs, read straight from the tarballs into SQLite FTS5       *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import argparse to parse command line arguments
+import argparse
+
+# Import hashlib to index each unique file once
+import hashlib
+
+# Import JSON to read the run manifests and write the query results
+import json
+
+# Import re to split the tarball names into system and LPAR
+import re
+
+# Import sqlite3 for the index
+import sqlite3
+
+# Import sys to exit with the query result
+import sys
+
+# Import tarfile to stream the tarballs
+import tarfile
+
+# Import zipfile to read the archived runs
+import zipfile
+
+# Import date to stamp the indexed runs
+from datetime import datetime
+
+# Import pathlib to find the runs
+from pathlib import Path
+
+# Import the blob lookup of the result store
+from resultstore import MANIFEST_NAME, RUN_BLOBS_NAME, find_blob
+
+# oscollector files that are indexed and the kind they are stored as
+KINDS = {"-config.txt": "config", "-error.txt": "error", "-lsgcl.txt": "lsgcl"}
+
+# <system>-<lpar>-<YYYYmmdd-HH-MM>.tar, the system is missing for oscollectorHelper runs
+TARBALL_REGEX = re.compile(r"^(.*)-\d{8}-\d\d-\d\d\.tar$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE,
+    path TEXT,
+    indexed TEXT
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    content_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (
+    run_id INTEGER,
+    archive TEXT,
+    system TEXT,
+    lpar TEXT,
+    kind TEXT,
+    member TEXT,
+    content_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_content ON files (content_id);
+CREATE INDEX IF NOT EXISTS files_run ON files (run_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS contents USING fts5(body, tokenize="unicode61 tokenchars '_'");
+"""
+
+
+def member_kind(name):
+    for suffix, kind in KINDS.items():
+        if name.endswith(suffix):
+            return kind
+    return None
+
+
+def tar_members(fileobj):
+    """
+    : Yields (member name, data) for the oscollector files of a tarball, read once front to back in stream mode
+    : so neither the tarball nor its files are written to disk
+    """
+    with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+        for member in tar:
+            if member.isfile() and member_kind(member.name):
+                yield member.name, tar.extractfile(member).read()
+
+
+def manifest_members(members, read_blob):
+    # Files of a tarball kept by --resultstore, read back from the blobs
+    for entry in members:
+        if "sha256" in entry and member_kind(entry["name"]):
+            data = read_blob(entry["sha256"])
+            if data is not None:
+                yield entry["name"], data
+
+
+def split_archive_name(archive, systems):
+    """
+    : Returns (system, LPAR) of a tarball name, the known system names resolve names that contain dashes
+    """
+    match = TARBALL_REGEX.match(archive)
+    stem = match.group(1) if match else archive.rsplit(".", 1)[0]
+    for system in sorted(systems, key=len, reverse=True):
+        prefix = system.replace(" ", "-") + "-"
+        if stem.startswith(prefix):
+            return system, stem[len(prefix) :]
+    return "", stem
+
+
+def system_names(hmc_json):
+    hmc = json.loads(hmc_json)
+    # The manifest of a --sharded run lists the systems' names as well
+    return [
+        system.get("name", "")
+        for system in hmc.get("managed_systems", hmc.get("systems", []))
+    ]
+
+
+def folder_archives(run, stores):
+    """
+    : Yields (archive, members) for the tarballs of a run folder, including those kept by --resultstore
+    """
+    for tar_path in sorted(run.glob("*.tar")):
+        with open(tar_path, "rb") as file:
+            yield tar_path.name, tar_members(file)
+    manifest_file = run / MANIFEST_NAME
+    if manifest_file.exists():
+        with open(manifest_file, "r") as file:
+            manifest = json.load(file)
+        directories = [str(run / RUN_BLOBS_NAME)] + stores + [manifest.get("store", "")]
+
+        def read_blob(digest):
+            blob = find_blob(digest, directories)
+            if blob is None:
+                return None
+            with open(blob, "rb") as file:
+                return file.read()
+
+        for archive, members in manifest["archives"].items():
+            yield archive, manifest_members(members, read_blob)
+
+
+def zip_archives(run, stores):
+    """
+    : Yields (archive, members) for the tarballs of a zipped run, streamed from the zip without extracting them
+    """
+    with zipfile.ZipFile(run) as zip_file:
+        names = zip_file.namelist()
+        for name in sorted(names):
+            if name.endswith(".tar"):
+                with zip_file.open(name) as file:
+                    yield name.rsplit("/", 1)[-1], tar_members(file)
+        if MANIFEST_NAME in names:
+            manifest = json.loads(zip_file.read(MANIFEST_NAME))
+            directories = stores + [manifest.get("store", "")]
+
+            def read_blob(digest):
+                name = RUN_BLOBS_NAME + "/" + digest[:2] + "/" + digest
+                if name in names:
+                    return zip_file.read(name)
+                blob = find_blob(digest, directories)
+                if blob is None:
+                    return None
+                with open(blob, "rb") as file:
+                    return file.read()
+
+            for archive, members in manifest["archives"].items():
+                yield archive, manifest_members(members, read_blob)
+
+
+def run_systems(run):
+    # System names from the HMC JSON of the run, if it has one
+    systems = []
+    if run.is_dir():
+        for hmc_file in run.glob("*-SystemsManagedByHMC-*.json"):
+            systems += system_names(hmc_file.read_text())
+    else:
+        with zipfile.ZipFile(run) as zip_file:
+            for name in zip_file.namelist():
+                if "-SystemsManagedByHMC-" in name and name.endswith(".json"):
+                    systems += system_names(zip_file.read(name))
+    return systems
+
+
+def open_index(db_file):
+    connection = sqlite3.connect(db_file)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def index_run(connection, run, stores=(), name=None):
+    """
+    : Indexes every oscollector file of a run folder or zip under the run's name, replacing an earlier index of
+    : the same run. Files with the same content are stored once. Returns (files, new contents).
+    """
+    run = Path(run)
+    name = name or (run.stem if run.is_file() else run.name)
+    stores = [str(store) for store in stores]
+    systems = run_systems(run)
+    archives = (
+        zip_archives(run, stores) if run.is_file() else folder_archives(run, stores)
+    )
+    files = 0
+    new = 0
+    with connection:
+        connection.execute(
+            "DELETE FROM files WHERE run_id IN (SELECT id FROM runs WHERE name = ?)",
+            (name,),
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO runs (name, path, indexed) VALUES (?, ?, ?)",
+            (name, str(run.resolve()), datetime.now().isoformat(timespec="seconds")),
+        )
+        run_id = connection.execute(
+            "SELECT id FROM runs WHERE name = ?", (name,)
+        ).fetchone()[0]
+        for archive, members in archives:
+            system, lpar = split_archive_name(archive, systems)
+            for member, data in members:
+                digest = hashlib.sha256(data).hexdigest()
+                row = connection.execute(
+                    "SELECT content_id FROM blobs WHERE sha256 = ?", (digest,)
+                ).fetchone()
+                if row:
+                    content_id = row[0]
+                else:
+                    # AIX output is mostly ASCII, anything else must not stop the indexing
+                    content_id = connection.execute(
+                        "INSERT INTO contents (body) VALUES (?)",
+                        (data.decode("utf-8", errors="replace"),),
+                    ).lastrowid
+                    connection.execute(
+                        "INSERT INTO blobs (sha256, content_id) VALUES (?, ?)",
+                        (digest, content_id),
+                    )
+                    new += 1
+                connection.execute(
+                    "INSERT INTO files (run_id, archive, system, lpar, kind, member, content_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id,
+                        archive,
+                        system,
+                        lpar,
+                        member_kind(member),
+                        member,
+                        content_id,
+                    ),
+                )
+                files += 1
+    return files, new
+
+
+def search(connection, text, runs=None, kinds=None, raw=False, limit=1000):
+    """
+    : Returns the files that contain text as (run, system, LPAR, kind, snippet) rows
+    : The text is searched as a phrase, with raw it is passed as an FTS5 query (AND, OR, NOT, prefix*).
+    """
+    query = text if raw else '"' + text.replace('"', '""') + '"'
+    sql = (
+        "SELECT runs.name, files.system, files.lpar, files.kind, "
+        "snippet(contents, 0, '[', ']', '...', 12) "
+        "FROM contents JOIN files ON files.content_id = contents.rowid "
+        "JOIN runs ON runs.id = files.run_id "
+        "WHERE contents MATCH ?"
+    )
+    parameters = [query]
+    if runs:
+        sql += " AND runs.name IN (" + ",".join("?" * len(runs)) + ")"
+        parameters += runs
+    if kinds:
+        sql += " AND files.kind IN (" + ",".join("?" * len(kinds)) + ")"
+        parameters += kinds
+    sql += " ORDER BY runs.name, files.system, files.lpar, files.kind LIMIT ?"
+    parameters.append(limit)
+    return connection.execute(sql, parameters).fetchall()
+
+
+def format_table(rows):
+    rows = [("RUN", "SYSTEM", "LPAR", "FILE", "MATCH")] + [
+        tuple(row[:4]) + (" ".join(row[4].split()),) for row in rows
+    ]
+    widths = [max(len(str(row[column])) for row in rows) for column in range(4)]
+    return "\n".join(
+        "  ".join(str(value).ljust(width) for value, width in zip(row, widths))
+        + "  "
+        + row[4]
+        for row in rows
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="searchindex",
+        description="Index the oscollector files of powercollector runs and search them.",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).resolve().parent / "SearchIndex.db",
+        help="Index file. Defaults to SearchIndex.db next to searchindex.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    index_parser = commands.add_parser("index", help="Add runs to the index.")
+    index_parser.add_argument(
+        "runs", type=Path, nargs="+", help="Run folders or their .zip archives."
+    )
+    index_parser.add_argument(
+        "--store",
+        type=Path,
+        action="append",
+        default=[],
+        help="Result store with the files of runs collected with --resultstore. Can be repeated.",
+    )
+    query_parser = commands.add_parser("query", help="Search the indexed files.")
+    query_parser.add_argument("text", help="Text to search, as a phrase.")
+    query_parser.add_argument(
+        "--run", action="append", help="Only search this run. Can be repeated."
+    )
+    query_parser.add_argument(
+        "--file",
+        choices=sorted(KINDS.values()),
+        action="append",
+        help="Only search these files.",
+    )
+    query_parser.add_argument(
+        "--fts",
+        action="store_true",
+        help="Pass the text as an FTS5 query, e.g. 'DISK_ERR* NOT hdisk0'.",
+    )
+    query_parser.add_argument(
+        "--limit", type=int, default=1000, help="Maximum results."
+    )
+    query_parser.add_argument(
+        "--format", choices=["table", "json"], default="table", help="Output format."
+    )
+    commands.add_parser("runs", help="List the indexed runs.")
+    args = parser.parse_args()
+
+    connection = open_index(str(args.db))
+    if args.command == "index":
+        for run in args.runs:
+            started = datetime.now()
+            files, new = index_run(connection, run, args.store)
+            seconds = (datetime.now() - started).total_seconds()
+            print(f"{run}: {files} files indexed, {new} new, in {seconds:.2f} seconds.")
+    elif args.command == "runs":
+        for name, path, indexed in connection.execute(
+            "SELECT name, path, indexed FROM runs ORDER BY name"
+        ):
+            print(f"{name}  {indexed}  {path}")
+    else:
+        try:
+            rows = search(
+                connection, args.text, args.run, args.file, args.fts, args.limit
+            )
+        except sqlite3.OperationalError as e:
+            print("Invalid query: " + str(e))
+            sys.exit(2)
+        if args.format == "json":
+            print(
+                json.dumps(
+                    [
+                        dict(zip(("run", "system", "lpar", "file", "match"), row))
+                        for row in rows
+                    ],
+                    indent=4,
+                )
+            )
+        else:
+            print(format_table(rows))
+        # Like grep, exit with 1 when nothing matched
+        sys.exit(0 if rows else 1)
+
+
+if __name__ == "__main__":
+    main()
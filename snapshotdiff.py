@@ -0,0 +1,286 @@
+# ****************************************************************************
+# * powercollector.snapshotdiff                                              *
+# * Compares two powercollector snapshots: Managed Systems by serial, LPARs  *
+# * by id and name, IO slots, enclosure topology and FSP levels              *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import argparse to parse command line arguments
+import argparse
+
+# Import JSON to read the snapshots and write the diff
+import json
+
+# Import sys to exit with the diff result
+import sys
+
+# Import pathlib to find the snapshot files
+from pathlib import Path
+
+# The snapshots are read as plain dictionaries, building the Jsonizable objects of every partition is much slower
+# and not needed to compare them.
+
+SNAPSHOT_PATTERN = "*-SystemsManagedByHMC-*.json"
+
+SYSTEM_FIELDS = ["name", "mt", "capabilities"]
+LPAR_FIELDS = ["name", "id", "env", "os_level", "rmc_ip", "state"]
+IO_SLOT_FIELDS = ["feature_codes", "description", "unit_phys_loc", "phys_loc"]
+ENCLOSURE_FIELDS = ["trailing_hub_port"]
+FSP_FIELDS = ["temp_ecnumber", "temp_level", "perm_ecnumber", "perm_level"]
+
+
+def snapshot_files(path):
+    """
+    : Returns the snapshot files of a path, a file is used as is and a folder is searched for every HMC's file
+    """
+    path = Path(path)
+    if path.is_dir():
+        return sorted(path.rglob(SNAPSHOT_PATTERN))
+    return [path]
+
+
+def load_snapshot(paths):
+    """
+    : Reads one or more snapshot files (one per HMC) and returns their Managed Systems indexed by serial
+    : Each system gets an "hmc" key with the hostname of the HMC it was read from.
+    """
+    systems = {}
+    for path in paths:
+        for file in snapshot_files(path):
+            with open(file, "r") as f:
+                hmc = json.load(f)
+            if hmc.get("format") == "sharded":
+                # --sharded runs list a file per system, the HMC's hostname is in the manifest
+                hmc["managed_systems"] = []
+                for entry in hmc["systems"]:
+                    with open(Path(file).parent / entry["file"], "r") as f:
+                        hmc["managed_systems"].append(json.load(f))
+            for system in hmc.get("managed_systems", []):
+                system["hmc"] = hmc.get("hostname", "")
+                # A system without serial can only be matched by name
+                systems[system.get("serial") or system.get("name", "")] = system
+    return systems
+
+
+def field_changes(old, new, fields):
+    """
+    : Returns {field: [old, new]} for the fields that differ
+    """
+    return {
+        field: [old.get(field, ""), new.get(field, "")]
+        for field in fields
+        if old.get(field, "") != new.get(field, "")
+    }
+
+
+def diff_keyed(old_list, new_list, key, fields):
+    """
+    : Diffs two lists of records matched by key(record) with one dictionary per side, linear in their length
+    """
+    old_index = {key(record): record for record in old_list}
+    new_index = {key(record): record for record in new_list}
+    changed = []
+    for record_key, new in new_index.items():
+        old = old_index.get(record_key)
+        if old is None:
+            continue
+        changes = field_changes(old, new, fields)
+        if changes:
+            changed.append({"key": record_key, "changes": changes})
+    return {
+        "added": [new_index[k] for k in new_index if k not in old_index],
+        "removed": [old_index[k] for k in old_index if k not in new_index],
+        "changed": changed,
+    }
+
+
+def diff_lpars(old_list, new_list):
+    """
+    : Matches LPARs by id and name, then the leftovers by id alone (renamed) and by name alone (new id)
+    : Every pass is a dictionary lookup, so the cost is linear in the number of partitions.
+    """
+    old_left = {(lpar.get("id", ""), lpar.get("name", "")): lpar for lpar in old_list}
+    new_left = {(lpar.get("id", ""), lpar.get("name", "")): lpar for lpar in new_list}
+    pairs = []
+    for pair_key in [k for k in new_left if k in old_left]:
+        pairs.append((old_left.pop(pair_key), new_left.pop(pair_key)))
+    for position in (0, 1):
+        old_by = {}
+        for pair_key, lpar in old_left.items():
+            # Ambiguous keys are left for the added/removed lists
+            old_by.setdefault(pair_key[position], []).append(pair_key)
+        for pair_key in list(new_left):
+            candidates = old_by.get(pair_key[position])
+            if candidates and len(candidates) == 1 and candidates[0] in old_left:
+                pairs.append((old_left.pop(candidates[0]), new_left.pop(pair_key)))
+    changed = []
+    for old, new in pairs:
+        changes = field_changes(old, new, LPAR_FIELDS)
+        if changes:
+            changed.append({"key": record_key("lpars", new), "changes": changes})
+    return {
+        "added": list(new_left.values()),
+        "removed": list(old_left.values()),
+        "changed": changed,
+    }
+
+
+def diff_system(old, new):
+    """
+    : Returns the changes of one Managed System, or None if there are none
+    """
+    diff = {}
+    attributes = field_changes(old, new, SYSTEM_FIELDS)
+    if attributes:
+        diff["attributes"] = attributes
+    for fsp in ("fsp_primary", "fsp_secondary"):
+        changes = field_changes(old.get(fsp) or {}, new.get(fsp) or {}, FSP_FIELDS)
+        if changes:
+            diff[fsp] = changes
+    parts = {
+        "lpars": diff_lpars(
+            old.get("partition_list", []), new.get("partition_list", [])
+        ),
+        "io_slots": diff_keyed(
+            old.get("io_slots", []),
+            new.get("io_slots", []),
+            lambda slot: record_key("io_slots", slot),
+            IO_SLOT_FIELDS,
+        ),
+        "enclosure_topo": diff_keyed(
+            old.get("enclosure_topo", []),
+            new.get("enclosure_topo", []),
+            lambda topo: record_key("enclosure_topo", topo),
+            ENCLOSURE_FIELDS,
+        ),
+    }
+    for part, part_diff in parts.items():
+        if part_diff["added"] or part_diff["removed"] or part_diff["changed"]:
+            diff[part] = part_diff
+    return diff or None
+
+
+def summary(system):
+    return {
+        "serial": system.get("serial", ""),
+        "name": system.get("name", ""),
+        "mt": system.get("mt", ""),
+        "hmc": system.get("hmc", ""),
+    }
+
+
+def diff_snapshots(old_systems, new_systems):
+    """
+    : Compares two results of load_snapshot, systems are matched by serial
+    """
+    changed = []
+    for serial, new in new_systems.items():
+        old = old_systems.get(serial)
+        if old is None:
+            continue
+        diff = diff_system(old, new)
+        if old.get("hmc") != new.get("hmc"):
+            # The system was moved to another HMC
+            diff = diff or {}
+            diff["moved"] = [old.get("hmc"), new.get("hmc")]
+        if diff:
+            changed.append({**summary(new), **diff})
+    return {
+        "added": [summary(new_systems[k]) for k in new_systems if k not in old_systems],
+        "removed": [
+            summary(old_systems[k]) for k in old_systems if k not in new_systems
+        ],
+        "changed": changed,
+    }
+
+
+def diff_rows(diff):
+    """
+    : Flattens a diff into (change, system, object, key, detail) rows for the table output
+    """
+    for system in diff["added"]:
+        yield "added", system["name"], "system", system["serial"], system["mt"]
+    for system in diff["removed"]:
+        yield "removed", system["name"], "system", system["serial"], system["mt"]
+    for system in diff["changed"]:
+        name = system["name"]
+        for field, (old, new) in system.get("attributes", {}).items():
+            yield "changed", name, "system", field, f"{old} -> {new}"
+        if "moved" in system:
+            old, new = system["moved"]
+            yield "changed", name, "system", "hmc", f"{old} -> {new}"
+        for fsp in ("fsp_primary", "fsp_secondary"):
+            for field, (old, new) in system.get(fsp, {}).items():
+                yield "changed", name, fsp, field, f"{old} -> {new}"
+        for part, label in (
+            ("lpars", "lpar"),
+            ("io_slots", "io_slot"),
+            ("enclosure_topo", "enclosure"),
+        ):
+            part_diff = system.get(part)
+            if not part_diff:
+                continue
+            for record in part_diff["added"]:
+                yield "added", name, label, record_key(part, record), ""
+            for record in part_diff["removed"]:
+                yield "removed", name, label, record_key(part, record), ""
+            for record in part_diff["changed"]:
+                detail = ", ".join(
+                    f"{field}: {old} -> {new}"
+                    for field, (old, new) in record["changes"].items()
+                )
+                yield "changed", name, label, record["key"], detail
+
+
+def record_key(part, record):
+    if part == "lpars":
+        return record.get("id", "") + " " + record.get("name", "")
+    if part == "io_slots":
+        return record.get("drc_name", "")
+    return record.get("enclosure", "") + " " + record.get("leading_hub_port", "")
+
+
+def format_table(diff):
+    rows = [("CHANGE", "SYSTEM", "OBJECT", "KEY", "DETAIL")] + list(diff_rows(diff))
+    widths = [max(len(str(row[column])) for row in rows) for column in range(4)]
+    lines = []
+    for row in rows:
+        lines.append(
+            "  ".join(str(value).ljust(width) for value, width in zip(row, widths))
+            + "  "
+            + str(row[4])
+        )
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="snapshotdiff",
+        description="Compare two powercollector snapshots. Each side is a "
+        "SystemsManagedByHMC JSON file or a folder with one file per HMC.",
+    )
+    parser.add_argument("old", type=Path, help="Older snapshot file or folder.")
+    parser.add_argument("new", type=Path, help="Newer snapshot file or folder.")
+    parser.add_argument(
+        "--format", choices=["table", "json"], default="table", help="Output format."
+    )
+    parser.add_argument("--output", type=Path, help="Write the diff to this file.")
+    args = parser.parse_args()
+
+    diff = diff_snapshots(load_snapshot([args.old]), load_snapshot([args.new]))
+    if args.format == "json":
+        text = json.dumps(diff, indent=4)
+    else:
+        text = format_table(diff)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    # Like diff, exit with 1 when the snapshots differ
+    sys.exit(1 if diff["added"] or diff["removed"] or diff["changed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
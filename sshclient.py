@@ -6,60 +6,562 @@
 # * Ver: 1.0.17 2024/12/05                                                   *
 # ****************************************************************************
 
+import base64
+import hashlib
+import os
+import random
+import re
 import socket
+import threading
+import time
+import weakref
 
 from loguru import logger
-from paramiko import SSHClient, AutoAddPolicy
-from paramiko.ssh_exception import AuthenticationException
+from paramiko import SSHClient, AutoAddPolicy, Transport
+from paramiko.ssh_exception import (
+    AuthenticationException,
+    ChannelException,
+    IncompatiblePeer,
+    NoValidConnectionsError,
+    SSHException,
+)
 from scp import SCPClient, SCPException
 
+import capture
+import metrics
+import sshprofiles
+import timeouts
+
+# Quoted names and numbers are removed from a command to compare its latency with the same command on other objects
+COMMAND_KEY_REGEX = re.compile(r'"[^"]*"|\d+')
+
+
+# Transport settings by profile. The ciphers are only moved to the front of paramiko's list, a host that doesn't
+# offer them negotiates the next one.
+TRANSPORT_PROFILES = {
+    # paramiko's own settings, as before the profiles
+    "default": {
+        "ciphers": [],
+        "window": 2 * 1024 * 1024,
+        "packet": 32 * 1024,
+        "compress": False,
+        "nodelay": False,
+        "scp_buffer": 16 * 1024,
+    },
+    # Short commands and answers, like the HMC CLI: small packets are sent without waiting for the previous ACK
+    "interactive": {
+        "ciphers": ["aes128-gcm@openssh.com", "aes128-ctr"],
+        "window": 2 * 1024 * 1024,
+        "packet": 32 * 1024,
+        "compress": False,
+        "nodelay": True,
+        "scp_buffer": 16 * 1024,
+    },
+    # Large files, like the oscollector tarballs: AES-GCM needs no separate MAC, a larger window and packets keep
+    # more data in flight
+    "bulk": {
+        "ciphers": ["aes128-gcm@openssh.com", "aes256-gcm@openssh.com", "aes128-ctr"],
+        "window": 16 * 1024 * 1024,
+        "packet": 128 * 1024,
+        "compress": False,
+        "nodelay": True,
+        "scp_buffer": 1024 * 1024,
+    },
+}
+# The bulk profile with zlib compression, for slow links, the oscollector output is text
+TRANSPORT_PROFILES["compressed"] = dict(TRANSPORT_PROFILES["bulk"], compress=True)
+
+
+def transport_factory(settings):
+    """
+    : Returns a paramiko transport_factory that opens the transport with a profile's window, packet size,
+    : ciphers and TCP_NODELAY
+    """
+
+    def factory(sock, disabled_algorithms=None):
+        if settings["nodelay"]:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except (OSError, AttributeError):
+                # A proxy or non TCP socket
+                pass
+        transport = Transport(
+            sock,
+            default_window_size=settings["window"],
+            default_max_packet_size=settings["packet"],
+            disabled_algorithms=disabled_algorithms,
+        )
+        options = transport.get_security_options()
+        preferred = [
+            cipher for cipher in settings["ciphers"] if cipher in options.ciphers
+        ]
+        options.ciphers = preferred + [
+            cipher for cipher in options.ciphers if cipher not in preferred
+        ]
+        return transport
+
+    return factory
+
+
+def command_key(command):
+    return COMMAND_KEY_REGEX.sub("", command)
+
+
+def host_key_fingerprint(client):
+    # Same format as ssh-keygen -l
+    key = client.get_transport().get_remote_server_key()
+    digest = base64.b64encode(hashlib.sha256(key.asbytes()).digest()).decode()
+    return key.get_name() + " SHA256:" + digest.rstrip("=")
+
+
+def is_transient(error):
+    # Errors that end a connection attempt quickly and often clear up by themselves, like a reset or a lost banner.
+    # Timeouts are not retried, each one already took the whole timeout.
+    if isinstance(
+        error,
+        (AuthenticationException, IncompatiblePeer, socket.timeout, socket.gaierror),
+    ):
+        return False
+    return isinstance(
+        error, (ConnectionError, EOFError, NoValidConnectionsError, SSHException)
+    )
+
+
+def is_host_failure(error):
+    # Errors that say the host is not answering, an authentication failure means it is
+    if isinstance(error, AuthenticationException):
+        return False
+    return isinstance(error, (OSError, EOFError, SSHException))
+
+
+def downloaded_size(file, path):
+    # scp.get() writes into path, or into path as a directory named after the remote file
+    target = path + "\\" + file.rsplit("/", 1)[-1] if os.path.isdir(path) else path
+    try:
+        return os.path.getsize(target)
+    except OSError:
+        return 0
+
+
+def backoff(attempt, base=1.0, cap=30.0):
+    # Exponential backoff with jitter, so the sessions that failed together don't retry together
+    delay = min(cap, base * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitOpenError(Exception):
+    # Raised instead of contacting a host whose circuit is open
+    pass
+
+
+class CircuitBreaker:
+    # Fails the operations on one host at once after repeated timeouts or connection errors, shared by all its
+    # sessions. Closed lets everything through, open fails everything until the cooldown ends, then one operation
+    # tests the host (half open): if it works the circuit closes, otherwise it opens again for twice as long.
+
+    def __init__(self, threshold=2, cooldown=60, max_cooldown=900):
+        self.threshold = threshold
+        self.initial_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.lock = threading.Lock()
+        self.opens = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def available(self):
+        # False while the circuit is open and its cooldown has not ended, for the schedulers to skip the host
+        with self.lock:
+            return (
+                self.state != "open"
+                or time.monotonic() - self.opened_at >= self.cooldown
+            )
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open" and (
+                time.monotonic() - self.opened_at >= self.cooldown
+            ):
+                self.state = "half open"
+                self.trial = False
+            if self.state == "closed":
+                return True
+            if self.state == "half open" and not self.trial:
+                self.trial = True
+                return True
+            self.rejected += 1
+            return False
+
+    def success(self):
+        with self.lock:
+            if self.state != "closed":
+                logger.info("Circuit closed, the host is answering again.")
+            self.state = "closed"
+            self.failures = 0
+            self.trial = False
+            self.cooldown = self.initial_cooldown
+
+    def cancel(self):
+        # Ends an operation that says nothing about the host's health
+        with self.lock:
+            self.trial = False
+
+    def failure(self, error):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error) or type(error).__name__
+            if self.state == "half open":
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.failures < self.threshold or self.state == "open":
+                return
+            self.state = "open"
+            self.trial = False
+            self.opened_at = time.monotonic()
+            self.opens += 1
+            logger.error(
+                f"Circuit opened after {self.failures} failures, the host is skipped for {self.cooldown} seconds. "
+                f"Last error: {self.last_error}"
+            )
+
+    def summary(self):
+        return {
+            "state": self.state,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+
+class AdaptiveLimiter:
+    # AIMD limit on the commands running at the same time against one host, shared by all its sessions.
+    # The limit grows by one for every limit commands that finish without slowing down, and shrinks when a
+    # command takes much longer than the fastest run of the same command or the host refuses a session.
+    # Workers that hold a session for several commands wait for a session slot, so the sessions follow the limit.
+
+    def __init__(self, initial=2, minimum=1, maximum=16, tolerance=2.0, min_delay=0.05):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.min_delay = min_delay
+        self.in_flight = 0
+        self.sessions = 0
+        self.peak_sessions = 0
+        self.condition = threading.Condition()
+        self.baselines = {}
+        self.last_decrease = 0.0
+        self.slow_start = True
+        self.initial = self.limit
+        self.lowest = self.limit
+        self.highest = self.limit
+        self.commands = 0
+        self.slow = 0
+        self.errors = 0
+        self.rejections = 0
+        self.wait_seconds = 0.0
+        self.history = []
+
+    def acquire(self):
+        # Waits for a free slot and returns the start time of the command
+        started = time.monotonic()
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            now = time.monotonic()
+            self.wait_seconds += now - started
+        return now
+
+    def cancel(self):
+        # Frees the slot of a command without recording its result
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def acquire_session(self):
+        # Waits until fewer sessions than the limit are in use
+        with self.condition:
+            while self.sessions >= int(self.limit):
+                self.condition.wait()
+            self.sessions += 1
+            self.peak_sessions = max(self.peak_sessions, self.sessions)
+
+    def release_session(self):
+        with self.condition:
+            self.sessions -= 1
+            self.condition.notify_all()
+
+    def release(self, key, started, error=False, rejected=False):
+        """
+        : Records the result of a command and adjusts the limit
+        : Only commands started after the last decrease can decrease it again, like one backoff per round trip.
+        """
+        latency = time.monotonic() - started
+        with self.condition:
+            self.in_flight -= 1
+            self.commands += 1
+            if rejected:
+                self.rejections += 1
+                self.decrease(started, 0.5, "session rejected")
+            elif error:
+                self.errors += 1
+                self.decrease(started, 0.5, "command failed")
+            else:
+                baseline = self.baselines.get(key)
+                # The baseline slowly follows a host that got slower for good
+                self.baselines[key] = (
+                    latency if baseline is None else min(latency, baseline * 1.001)
+                )
+                if (
+                    baseline is not None
+                    and latency > baseline * self.tolerance
+                    and latency - baseline > self.min_delay
+                ):
+                    self.slow += 1
+                    self.decrease(
+                        started, 0.75, f"{key.split(' ', 1)[0]} took {latency:.2f}s"
+                    )
+                elif (
+                    baseline is not None
+                    and self.in_flight + 1 >= int(self.limit)
+                    and (
+                        latency <= baseline * (1 + self.tolerance) / 2
+                        or latency - baseline <= self.min_delay
+                    )
+                ):
+                    # Only grow while the current limit is in use, between steady and slow the limit is kept.
+                    # The first run of a command only sets its baseline.
+                    # Like TCP, the limit doubles every round until the first backoff
+                    step = 1 if self.slow_start else 1 / self.limit
+                    self.change(min(self.maximum, self.limit + step), "latency steady")
+            self.condition.notify_all()
+
+    def decrease(self, started, factor, reason):
+        if started < self.last_decrease:
+            return
+        self.last_decrease = time.monotonic()
+        self.slow_start = False
+        self.change(max(self.minimum, self.limit * factor), reason)
+
+    def change(self, limit, reason):
+        if int(limit) != int(self.limit):
+            logger.info(
+                f"Concurrency limit changed from {int(self.limit)} to {int(limit)}: {reason}"
+            )
+            # The report keeps the last changes only
+            self.history = self.history[-99:] + [
+                {"time": round(time.time(), 3), "limit": int(limit), "reason": reason}
+            ]
+        self.limit = limit
+        self.lowest = min(self.lowest, limit)
+        self.highest = max(self.highest, limit)
+
+    def summary(self):
+        return {
+            "initial": int(self.initial),
+            "final": int(self.limit),
+            "lowest": int(self.lowest),
+            "highest": int(self.highest),
+            "maximum": self.maximum,
+            "peak_sessions": self.peak_sessions,
+            "commands": self.commands,
+            "slow": self.slow,
+            "errors": self.errors,
+            "rejections": self.rejections,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "changes": self.history,
+        }
+
 
 class RemoteClient:
     # Client to interact with a remote host via SSH & SCP.
 
-    def __init__(self, host, user, password, remote_path):
+    # Adaptive limiters by (host, port), shared by every session to the host
+    limiters = {}
+    limiters_lock = threading.Lock()
+    # Attempts of a command when the host refuses the session or channel
+    rejected_attempts = 3
+    # Circuit breakers by (host, port), shared by every session to the host
+    breakers = {}
+    breakers_lock = threading.Lock()
+    # Attempts of a connection that fails with a transient error
+    connect_attempts = 3
+    # Every client, to count the open sessions
+    clients = weakref.WeakSet()
+    clients_lock = threading.Lock()
+
+    @classmethod
+    def limit_host(cls, host, port=22, maximum=16, initial=2):
+        """
+        : Limits the commands sent to host at the same time with an AdaptiveLimiter, returns it
+        """
+        with cls.limiters_lock:
+            limiter = cls.limiters.get((host, port))
+            if limiter is None:
+                limiter = cls.limiters[(host, port)] = AdaptiveLimiter(
+                    initial=initial, maximum=maximum
+                )
+            return limiter
+
+    @classmethod
+    def breaker(cls, host, port=22, threshold=None):
+        """
+        : Returns host's CircuitBreaker, threshold changes the consecutive failures that open it
+        """
+        with cls.breakers_lock:
+            breaker = cls.breakers.get((host, port))
+            if breaker is None:
+                breaker = cls.breakers[(host, port)] = CircuitBreaker()
+            if threshold is not None:
+                breaker.threshold = threshold
+            return breaker
+
+    @classmethod
+    def host_available(cls, host, port=22):
+        """
+        : False while host's circuit is open, so a scheduler can move on to other hosts
+        """
+        breaker = cls.breakers.get((host, port))
+        return breaker is None or breaker.available()
+
+    @classmethod
+    def breaker_summary(cls):
+        # Only the hosts whose circuit opened at least once
+        return {
+            host + ":" + str(port): breaker.summary()
+            for (host, port), breaker in cls.breakers.items()
+            if breaker.opens
+        }
+
+    @classmethod
+    def open_sessions(cls):
+        with cls.clients_lock:
+            clients = list(cls.clients)
+        return sum(client.is_connected() for client in clients)
+
+    def __init__(
+        self, host, user, password, remote_path, port=22, transport="interactive"
+    ):
         self.host = host
+        self.port = port
+        # One of TRANSPORT_PROFILES
+        self.transport = transport
         self.user = user
         self.password = password
         self.remote_path = remote_path
         self.client = None
         self.scp = None
         self.conn = None
+        with RemoteClient.clients_lock:
+            RemoteClient.clients.add(self)
+
+    def history_host(self):
+        # Hosts are told apart by port as well, several emulated or NATed hosts can share an address
+        return self.host if self.port == 22 else self.host + ":" + str(self.port)
+
+    def _open(self, host):
+        # One connection attempt with the host's known profile, then with the other one if it fails.
+        # The hosts that need the legacy profile are remembered, so their next connections only need one handshake.
+        profile = sshprofiles.profile(host)
+        try:
+            self._handshake(host, profile)
+            fallback = False
+        except (AuthenticationException, IncompatiblePeer) as error:
+            if profile == sshprofiles.LEGACY:
+                # The host may have been upgraded and no longer offer the legacy algorithms
+                print(
+                    "Connection failed with SHA2 disabled. Retrying with the default algorithms."
+                )
+                logger.error(
+                    "Connection failed with SHA2 disabled. Retrying with the default algorithms."
+                )
+                profile = sshprofiles.DEFAULT
+            elif isinstance(error, AuthenticationException):
+                print(
+                    "Authentication failed or older SSH server detected. Retrying with SHA2 disabled."
+                )
+                logger.error(
+                    "Authentication failed or older SSH server detected. Retrying with SHA2 disabled."
+                )
+                profile = sshprofiles.LEGACY
+            else:
+                raise error
+            self.client.close()
+            self._handshake(host, profile)
+            fallback = True
+        sshprofiles.connected(
+            host, profile, host_key_fingerprint(self.client), fallback
+        )
+        self.scp = SCPClient(
+            self.client.get_transport(),
+            buff_size=TRANSPORT_PROFILES[self.transport]["scp_buffer"],
+        )
+
+    def _handshake(self, host, profile):
+        settings = TRANSPORT_PROFILES[self.transport]
+        # Kept to record it if the connection times out
+        self.connect_timeout = timeouts.timeout(
+            host, "connect", 240 if profile == sshprofiles.LEGACY else 120
+        )
+        self.client = SSHClient()
+        self.client.load_system_host_keys()
+        self.client.set_missing_host_key_policy(AutoAddPolicy())
+        if profile == sshprofiles.LEGACY:
+            self.client.connect(
+                self.host,
+                port=self.port,
+                username=self.user,
+                password=self.password,
+                look_for_keys=False,
+                timeout=self.connect_timeout,
+                banner_timeout=self.connect_timeout,
+                disabled_algorithms={"keys": ["rsa-sha2-256", "rsa-sha2-512"]},
+                compress=settings["compress"],
+                transport_factory=transport_factory(settings),
+            )
+        else:
+            self.client.connect(
+                self.host,
+                port=self.port,
+                username=self.user,
+                password=self.password,
+                look_for_keys=False,
+                timeout=self.connect_timeout,
+                banner_timeout=self.connect_timeout,
+                compress=settings["compress"],
+                transport_factory=transport_factory(settings),
+            )
 
     def _connect(self):
         # Open connection to remote host.
 
         if self.conn is None:
+            # A host that answered quickly before is given up on sooner than the default timeouts
+            host = self.history_host()
             try:
-                self.client = SSHClient()
-                self.client.load_system_host_keys()
-                self.client.set_missing_host_key_policy(AutoAddPolicy())
-                try:
-                    self.client.connect(
-                        self.host,
-                        username=self.user,
-                        password=self.password,
-                        look_for_keys=False,
-                        timeout=120,
-                        banner_timeout=120,
-                    )
-                except AuthenticationException as error:
-                    print(
-                        "Authentication failed or older SSH server detected. Retrying with SHA2 disabled."
-                    )
-                    logger.error(
-                        "Authentication failed or older SSH server detected. Retrying with SHA2 disabled."
-                    )
-                    self.client.connect(
-                        self.host,
-                        username=self.user,
-                        password=self.password,
-                        look_for_keys=False,
-                        timeout=240,
-                        banner_timeout=240,
-                        disabled_algorithms={"keys": ["rsa-sha2-256", "rsa-sha2-512"]},
-                    )
-                self.scp = SCPClient(self.client.get_transport())
+                for attempt in range(RemoteClient.connect_attempts):
+                    started = time.monotonic()
+                    try:
+                        self._open(host)
+                        break
+                    except Exception as error:
+                        self.client.close()
+                        if (
+                            not is_transient(error)
+                            or attempt == RemoteClient.connect_attempts - 1
+                        ):
+                            raise error
+                        delay = backoff(attempt)
+                        logger.info(
+                            f"Connection to {host} failed: {error or type(error).__name__}, "
+                            f"retrying in {delay:.1f} seconds."
+                        )
+                        time.sleep(delay)
+                timeouts.record(host, "connect", time.monotonic() - started)
             except AuthenticationException as error:
                 logger.error(f"Authentication failed: {error}")
                 if __debug__:
@@ -71,6 +573,8 @@ class RemoteClient:
                     logger.exception(error)
                 raise error
             except TimeoutError as error:
+                # The next connection to the host waits longer
+                timeouts.record_timeout(host, "connect", self.connect_timeout)
                 logger.error("Timeout encountered when attempting to connect")
                 if __debug__:
                     logger.exception(error)
@@ -80,17 +584,35 @@ class RemoteClient:
                 raise error
         return self.client
 
+    def is_connected(self):
+        # True while the SSH transport is up, a dropped session needs conn reset to reconnect.
+        if self.conn is None or self.client is None:
+            return False
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
     def disconnect(self):
-        # Close ssh connection.
+        # Close ssh connection, a client that never connected, like a replayed one, has nothing to close.
 
-        self.client.close()
-        self.scp.close()
+        if self.client is not None:
+            self.client.close()
+        if self.scp is not None:
+            self.scp.close()
 
     def upload_file(self, file):
         # Upload a single file to a remote directory.
+        if capture.replaying():
+            logger.info(f"Replaying a capture, {file} is not uploaded")
+            return
         try:
             logger.info(f"Attempting to upload {file} to {self.remote_path}")
-            self.scp.put(file, recursive=True, remote_path=self.remote_path)
+            self._through_breaker(
+                "SCP upload of " + file,
+                lambda: self.scp.put(
+                    file, recursive=True, remote_path=self.remote_path
+                ),
+            )
+            metrics.transfer("sent", os.path.getsize(file))
         except SCPException as error:
             if __debug__:
                 logger.exception(error)
@@ -101,39 +623,134 @@ class RemoteClient:
 
     def download_file(self, file, path=".") -> None:
         # Download file from remote host.
-        try:
+        if capture.replaying():
+            logger.info(f"Replaying a capture, {file} is not downloaded")
+            return
+
+        def download():
             self.conn = self._connect()
             self.scp.get(file, path)
+
+        try:
+            self._through_breaker("SCP download of " + file, download)
+            metrics.transfer("received", downloaded_size(file, path))
         except Exception as e:
             if __debug__:
                 logger.exception(e)
             logger.error(f"Error downloading file {file} from {path}")
 
     def execute_command(self, command, timeout=None, want_errors=False, vios=False):
+        # Execute one command and return the output, unless the host's circuit is open
+        return self._through_breaker(
+            command,
+            lambda: self._limited_command(command, timeout, want_errors, vios),
+        )
+
+    def _through_breaker(self, description, operation):
+        # Runs operation unless the host's circuit is open, its result opens or closes the circuit
+        breaker = RemoteClient.breaker(self.host, self.port)
+        if not breaker.allow():
+            logger.error(
+                f" INPUT: {description} not sent, {self.host} stopped answering: {breaker.last_error}"
+            )
+            raise CircuitOpenError(
+                self.host + " stopped answering: " + breaker.last_error
+            )
+        try:
+            result = operation()
+        except Exception as e:
+            if is_host_failure(e):
+                breaker.failure(e)
+            elif isinstance(e, AuthenticationException):
+                # The host answered, the credentials are wrong
+                breaker.success()
+            else:
+                breaker.cancel()
+            raise e
+        breaker.success()
+        return result
+
+    def _limited_command(self, command, timeout=None, want_errors=False, vios=False):
+        # Execute one command through the host's limiter if it has one.
+        limiter = RemoteClient.limiters.get((self.host, self.port))
+        if limiter is None:
+            return self._execute_command(command, timeout, want_errors, vios)
+        # Latency is compared between runs of the same command on different systems or partitions
+        key = command_key(command)
+        for attempt in range(RemoteClient.rejected_attempts):
+            started = limiter.acquire()
+            try:
+                result = self._execute_command(command, timeout, want_errors, vios)
+            except AuthenticationException as e:
+                # Wrong credentials say nothing about the load on the host
+                limiter.cancel()
+                raise e
+            except (ChannelException, SSHException) as e:
+                # The host refused the session or channel, the command never ran and can be sent again
+                limiter.release(key, started, rejected=True)
+                if attempt == RemoteClient.rejected_attempts - 1:
+                    raise e
+                logger.info(
+                    f"INPUT: {command} was rejected, retrying with {int(limiter.limit)} concurrent commands."
+                )
+                if not self.is_connected():
+                    self.conn = None
+                time.sleep(backoff(attempt))
+                continue
+            except Exception as e:
+                limiter.release(key, started, error=True)
+                raise e
+            limiter.release(key, started)
+            return result
+
+    def _execute_command(self, command, timeout=None, want_errors=False, vios=False):
         # Execute one command and return the output
         # In the specific case of Virtual IO Server, since the commands need to be root,
         # TODO find a better solution than a vios flag and all the duplication.
 
+        key = command_key(command)
+        started = time.monotonic()
+        # Set once the command is sent, a timeout before that is the connection's
+        sent = False
         try:
             logger.info(f"INPUT: {command}")
-            self.conn = self._connect()
-            if vios:
-                logger.info(
-                    "Special VIOS command mode. Sending ioscli oem_setup_env before command."
-                )
-                stdin, stdout, stderr = self.client.exec_command(
-                    "ioscli oem_setup_env", timeout=timeout
-                )
-                # after sending the oem_setup_env, the system DOES NOT give back so we have to manually send
-                # the string and an exit command to return to the shell.
-                stdin.write("%s\n%s\n" % (command, "exit"))
-                stdin.flush()
+            if capture.replaying():
+                output, error = self._replay_command(command, vios)
             else:
-                stdin, stdout, stderr = self.client.exec_command(
-                    command, timeout=timeout
+                self.conn = self._connect()
+                # The timeout is learned from the previous runs of the command on this host, if there are any
+                timeout = timeouts.timeout(self.history_host(), key, timeout)
+                started = time.monotonic()
+                sent = True
+                if vios:
+                    logger.info(
+                        "Special VIOS command mode. Sending ioscli oem_setup_env before command."
+                    )
+                    stdin, stdout, stderr = self.client.exec_command(
+                        "ioscli oem_setup_env", timeout=timeout
+                    )
+                    # after sending the oem_setup_env, the system DOES NOT give back so we have to manually send
+                    # the string and an exit command to return to the shell.
+                    stdin.write("%s\n%s\n" % (command, "exit"))
+                    stdin.flush()
+                else:
+                    stdin, stdout, stderr = self.client.exec_command(
+                        command, timeout=timeout
+                    )
+                output = stdout.readlines()
+                error = stderr.readlines()
+                timeouts.record(self.history_host(), key, time.monotonic() - started)
+                capture.record(
+                    self.history_host(),
+                    command,
+                    vios,
+                    output,
+                    error,
+                    time.monotonic() - started,
                 )
-            output = stdout.readlines()
-            error = stderr.readlines()
+            metrics.command(
+                True, sum(len(line.encode("utf-8")) for line in output + error)
+            )
             if not output:
                 logger.info(f"INPUT: {command} | STDOUT: No output")
             for line in output:
@@ -146,12 +763,50 @@ class RemoteClient:
                 logger.info(f"INPUT: {command} | STDERR: {line}")
             return output, error
         except socket.timeout as e:
+            metrics.command(False)
+            if sent and timeout is not None:
+                # The command needs more than its timeout, the next run on this host waits longer
+                timeouts.record_timeout(self.history_host(), key, timeout)
+            if not capture.replaying():
+                capture.record(
+                    self.history_host(),
+                    command,
+                    vios,
+                    [],
+                    [],
+                    time.monotonic() - started,
+                    "timeout",
+                )
             if __debug__:
                 logger.exception(e)
-            logger.error(f" INPUT: {command} timed out.")
+            logger.error(f" INPUT: {command} timed out after {timeout} seconds.")
             raise e
         except Exception as e:
+            metrics.command(False)
+            if not capture.replaying():
+                capture.record(
+                    self.history_host(),
+                    command,
+                    vios,
+                    [],
+                    [],
+                    time.monotonic() - started,
+                    type(e).__name__ + ": " + str(e),
+                )
             if __debug__:
                 logger.exception(e)
             logger.error(f" INPUT: {command} failed. Please check previous messages.")
             raise e
+
+    def _replay_command(self, command, vios):
+        # The recorded answer of this host, a recorded timeout or failure is raised again
+        record = capture.replay(self.history_host(), command, vios)
+        if record["failure"] == "timeout":
+            raise socket.timeout(record["failure"])
+        if record["failure"]:
+            raise capture.ReplayedFailure(record["failure"])
+        return record["stdout"], record["stderr"]
+
+
+# The live metrics count the sessions of every RemoteClient
+metrics.gauge("ssh_sessions", "SSH sessions open.", RemoteClient.open_sessions)
@@ -0,0 +1,142 @@
+# ****************************************************************************
+# * powercollector.sshprofiles                                               *
+# * Hosts that only accept the legacy SSH algorithms, with their host key,   *
+# * kept in SSHProfiles.json next to powercollector                          *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import atexit to save the profiles when the program ends through sys.exit()
+import atexit
+
+# Import JSON to read and write the profiles
+import json
+
+# Import os to replace the profiles file
+import os
+
+# Import threading to update the profiles from several sessions
+import threading
+
+# Import date to stamp the entries
+from datetime import datetime
+
+# Import logger for the main log file
+from loguru import logger
+
+PROFILES_NAME = "SSHProfiles.json"
+DEFAULT = "default"
+# rsa-sha2-256 and rsa-sha2-512 disabled, for older AIX, VIOS and HMC sshd
+LEGACY = "legacy"
+
+
+class ProfileStore:
+    # Only the hosts that need the legacy profile are kept, every other host uses the default one
+
+    def __init__(self, profiles_file):
+        self.profiles_file = profiles_file
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.changed = False
+        self.direct = 0
+        self.learned = 0
+        self.revalidated = 0
+        try:
+            with open(profiles_file, "r") as file:
+                self.hosts = json.load(file)["hosts"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.info(f"SSH profiles could not be read, starting new ones: {e}")
+
+    def profile(self, host):
+        with self.lock:
+            entry = self.hosts.get(host)
+            return entry["profile"] if entry else DEFAULT
+
+    def connected(self, host, profile, fingerprint, fallback):
+        """
+        : Records the profile that worked for host. fallback is True when the known profile failed first, which is
+        : the only time a stored entry is changed or removed.
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            entry = self.hosts.get(host)
+            if not fallback:
+                if entry is None:
+                    return
+                self.direct += 1
+                if entry["fingerprint"] != fingerprint:
+                    # Only a failed connection re-validates the profile, a new key is recorded as is
+                    logger.info(
+                        f"Host key of {host} changed from {entry['fingerprint']} to {fingerprint}."
+                    )
+                    entry["fingerprint"] = fingerprint
+                entry["seen"] = now
+                self.changed = True
+                return
+            self.changed = True
+            if profile == DEFAULT:
+                if self.hosts.pop(host, None) is not None:
+                    self.revalidated += 1
+                    logger.info(f"{host} now accepts the default SSH algorithms.")
+                return
+            self.learned += 1
+            self.hosts[host] = {
+                "profile": profile,
+                "fingerprint": fingerprint,
+                "validated": now,
+                "seen": now,
+            }
+            logger.info(
+                f"{host} needs the {profile} SSH profile, it is used from now on."
+            )
+
+    def save(self):
+        with self.lock:
+            if not self.changed:
+                return
+            profiles = {"hosts": dict(self.hosts)}
+        try:
+            with open(self.profiles_file + ".tmp", "w") as file:
+                json.dump(profiles, file, indent=4)
+            os.replace(self.profiles_file + ".tmp", self.profiles_file)
+        except OSError as e:
+            logger.info(f"SSH profiles could not be saved: {e}")
+
+    def summary(self):
+        return {
+            "legacy_hosts": len(self.hosts),
+            "direct": self.direct,
+            "learned": self.learned,
+            "revalidated": self.revalidated,
+        }
+
+
+# Without enable() every connection starts with the default profile and nothing is remembered.
+store = None
+
+
+def enable(base_dir):
+    """
+    : Reads and updates base_dir's SSHProfiles.json, it is saved when the program ends
+    """
+    global store
+    store = ProfileStore(base_dir + "\\" + PROFILES_NAME)
+    atexit.register(store.save)
+    return store
+
+
+def profile(host):
+    if store is None:
+        return DEFAULT
+    return store.profile(host)
+
+
+def connected(host, profile, fingerprint, fallback):
+    if store is not None:
+        store.connected(host, profile, fingerprint, fallback)
+
+
+def summary():
+    return store.summary() if store is not None else None
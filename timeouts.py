@@ -0,0 +1,215 @@
+# ****************************************************************************
+# * powercollector.timeouts                                                  *
+# * Command timeouts learned from the durations of previous runs, per host   *
+# * and command, kept in TimeoutHistory.json next to powercollector          *
+# * Author: Roberto Etcheverry (retcheverry@roer.com.ar)                     *
+# * Ver: 1.0.19 2026/10/19                                                   *
+# ****************************************************************************
+
+# Import atexit to save the history when the program ends through sys.exit()
+import atexit
+
+# Import JSON to read and write the history
+import json
+
+# Import math to find the percentile
+import math
+
+# Import os to replace the history file
+import os
+
+# Import threading to record durations from several sessions
+import threading
+
+# Import date to forget hosts that are no longer collected
+from datetime import datetime, timedelta
+
+# Import logger for the main log file
+from loguru import logger
+
+HISTORY_NAME = "TimeoutHistory.json"
+# Durations kept per host and command, and per command across every host
+HOST_SAMPLES = 20
+FLEET_SAMPLES = 500
+# A command needs this many durations before its timeout is learned
+MIN_SAMPLES = 5
+PERCENTILE = 0.99
+FACTOR = 3
+# Learned timeouts stay between these bounds, in seconds
+FLOOR = 10
+CEILING = 3600
+# Hosts that were not collected for this long are removed from the history
+EXPIRE_DAYS = 90
+# A command that timed out gets this many times the timeout that fired on its next run
+RAISE_FACTOR = 2
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class TimeoutHistory:
+    # Durations of the commands that finished, by host and command with the quoted names and numbers removed.
+    # A command that timed out only says it needs more than its timeout, that timeout is kept until it finishes.
+
+    def __init__(self, history_file, apply=True):
+        self.history_file = history_file
+        self.apply = apply
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.seen = {}
+        self.fleet = {}
+        self.timed_out = {}
+        self.learned = 0
+        self.shorter = 0
+        self.longer = 0
+        self.raised = 0
+        self.recorded = 0
+        self.timeouts = 0
+        try:
+            with open(history_file, "r") as file:
+                history = json.load(file)
+            expired = (datetime.now() - timedelta(days=EXPIRE_DAYS)).isoformat()
+            for host, entry in history["hosts"].items():
+                if entry["seen"] < expired:
+                    continue
+                self.seen[host] = entry["seen"]
+                self.hosts[host] = entry["commands"]
+                if entry.get("timed_out"):
+                    self.timed_out[host] = entry["timed_out"]
+                for key, samples in entry["commands"].items():
+                    self.fleet.setdefault(key, []).extend(samples)
+            for key, samples in self.fleet.items():
+                self.fleet[key] = samples[-FLEET_SAMPLES:]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.info(f"Timeout history could not be read, starting a new one: {e}")
+            self.hosts = {}
+            self.seen = {}
+            self.fleet = {}
+            self.timed_out = {}
+
+    def timeout(self, host, key, default):
+        """
+        : Returns the timeout for a command on host: the 99th percentile of its durations on that host times
+        : FACTOR, or of its durations on every host if the host has too few, between FLOOR and CEILING.
+        : Commands without history, or without a timeout, keep the default.
+        : A command that timed out on host gets RAISE_FACTOR times the timeout that fired until it finishes again,
+        : up to the default or, once the default itself fired, up to CEILING.
+        """
+        if default is None or not self.apply:
+            return default
+        with self.lock:
+            fired = self.timed_out.get(host, {}).get(key)
+            samples = self.hosts.get(host, {}).get(key, [])
+            if len(samples) < MIN_SAMPLES:
+                samples = self.fleet.get(key, [])
+            if len(samples) < MIN_SAMPLES and fired is None:
+                return default
+            learned = default
+            if len(samples) >= MIN_SAMPLES:
+                learned = round(
+                    min(CEILING, max(FLOOR, percentile(samples, PERCENTILE) * FACTOR)),
+                    1,
+                )
+            if fired is not None:
+                # Only a lower bound of the command's duration is known
+                limit = CEILING if fired >= default else default
+                raised = round(max(learned, min(limit, fired * RAISE_FACTOR)), 1)
+                if raised > learned:
+                    self.raised += 1
+                learned = raised
+            self.learned += 1
+            if learned < default:
+                self.shorter += 1
+            elif learned > default:
+                self.longer += 1
+        return learned
+
+    def record(self, host, key, seconds):
+        with self.lock:
+            commands = self.hosts.setdefault(host, {})
+            commands[key] = commands.get(key, [])[-(HOST_SAMPLES - 1) :] + [
+                round(seconds, 3)
+            ]
+            self.fleet[key] = self.fleet.get(key, [])[-(FLEET_SAMPLES - 1) :] + [
+                round(seconds, 3)
+            ]
+            self.timed_out.get(host, {}).pop(key, None)
+            self.seen[host] = datetime.now().isoformat(timespec="seconds")
+            self.recorded += 1
+
+    def record_timeout(self, host, key, seconds):
+        with self.lock:
+            commands = self.timed_out.setdefault(host, {})
+            commands[key] = max(commands.get(key, 0), round(seconds, 3))
+            self.seen[host] = datetime.now().isoformat(timespec="seconds")
+            self.timeouts += 1
+
+    def save(self):
+        with self.lock:
+            history = {
+                "hosts": {
+                    host: {
+                        "seen": self.seen[host],
+                        "commands": self.hosts.get(host, {}),
+                        "timed_out": self.timed_out.get(host, {}),
+                    }
+                    for host in self.seen
+                }
+            }
+        try:
+            with open(self.history_file + ".tmp", "w") as file:
+                json.dump(history, file)
+            os.replace(self.history_file + ".tmp", self.history_file)
+        except OSError as e:
+            logger.info(f"Timeout history could not be saved: {e}")
+
+    def summary(self):
+        return {
+            "applied": self.apply,
+            "hosts": len(self.hosts),
+            "recorded": self.recorded,
+            "timed_out": self.timeouts,
+            "learned": self.learned,
+            "shorter": self.shorter,
+            "longer": self.longer,
+            "raised": self.raised,
+        }
+
+
+# Without enable() the timeouts given by the callers are used as they are and nothing is recorded.
+history = None
+
+
+def enable(base_dir, apply=True):
+    """
+    : Records the command durations in base_dir's TimeoutHistory.json, and with apply uses the timeouts learned
+    : from it. The history is saved when the program ends.
+    """
+    global history
+    history = TimeoutHistory(base_dir + "\\" + HISTORY_NAME, apply)
+    atexit.register(history.save)
+    return history
+
+
+def timeout(host, key, default):
+    if history is None:
+        return default
+    return history.timeout(host, key, default)
+
+
+def record(host, key, seconds):
+    if history is not None:
+        history.record(host, key, seconds)
+
+
+def record_timeout(host, key, seconds):
+    if history is not None:
+        history.record_timeout(host, key, seconds)
+
+
+def summary():
+    return history.summary() if history is not None else None